@@ -0,0 +1,63 @@
+"""Представление объектов в JSON с выбором полей (?fields=a,b)."""
+from posts.stats import stats_for
+
+
+class FieldsError(ValueError):
+    pass
+
+
+def _image(post):
+    return post.image.url if post.image else None
+
+
+POST_FIELDS = {
+    'id': lambda post: post.pk,
+    'text': lambda post: post.text,
+    'pub_date': lambda post: post.pub_date.isoformat(),
+    'author': lambda post: post.author.username,
+    'group': lambda post: post.group.slug if post.group_id else None,
+    'image': _image,
+    'comments_count': lambda post: post.comments_count,
+}
+
+GROUP_FIELDS = {
+    'id': lambda group: group.pk,
+    'title': lambda group: group.title,
+    'slug': lambda group: group.slug,
+    'description': lambda group: group.description,
+}
+
+PROFILE_FIELDS = {
+    'username': lambda author: author.username,
+    'full_name': lambda author: author.get_full_name(),
+    'posts_count': lambda author: stats_for(author).posts_count,
+    'followers_count': lambda author: stats_for(author).followers_count,
+    'following_count': lambda author: stats_for(author).following_count,
+}
+
+COMMENT_FIELDS = {
+    'id': lambda comment: comment.pk,
+    'text': lambda comment: comment.text,
+    'created': lambda comment: comment.created.isoformat(),
+    'author': lambda comment: comment.author.username,
+}
+
+
+def selected_fields(request, available):
+    """Поля из параметра fields; без него — все доступные."""
+    value = request.GET.get('fields')
+    if not value:
+        return list(available)
+    names = [name.strip() for name in value.split(',') if name.strip()]
+    unknown = [name for name in names if name not in available]
+    if unknown:
+        raise FieldsError(
+            'Неизвестные поля: {}. Доступны: {}.'.format(
+                ', '.join(unknown), ', '.join(available)
+            )
+        )
+    return names
+
+
+def serialize(obj, available, fields):
+    return {name: available[name](obj) for name in fields}
@@ -0,0 +1,112 @@
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+from django.utils.http import http_date
+
+from posts.models import Comment, Group, Post
+
+User = get_user_model()
+
+
+class ApiTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='author')
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание'
+        )
+        cls.posts = [
+            Post.objects.create(
+                author=cls.user, group=cls.group, text=f'Пост {num}'
+            )
+            for num in range(12)
+        ]
+        cls.post = cls.posts[-1]
+        Comment.objects.create(
+            author=cls.user, post=cls.post, text='Комментарий'
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+
+    def test_post_list_cursor_pages(self):
+        """Лента постов листается курсором, новые первыми."""
+        url = reverse('api:v1:post_list')
+        data = self.client.get(url).json()
+        self.assertEqual(len(data['results']), 10)
+        self.assertEqual(data['results'][0]['id'], self.post.pk)
+        self.assertIsNone(data['previous'])
+        data = self.client.get(data['next']).json()
+        self.assertEqual(
+            [post['id'] for post in data['results']],
+            [self.posts[1].pk, self.posts[0].pk],
+        )
+        self.assertIsNone(data['next'])
+
+    def test_sparse_fields(self):
+        """Параметр fields оставляет только перечисленные поля."""
+        response = self.client.get(
+            reverse('api:v1:post_detail', args=[self.post.pk]),
+            {'fields': 'id,author'},
+        )
+        self.assertEqual(
+            response.json(), {'id': self.post.pk, 'author': 'author'}
+        )
+        response = self.client.get(
+            reverse('api:v1:group_posts', args=['group']),
+            {'fields': 'id,password'},
+        )
+        self.assertEqual(response.status_code, 400)
+
+    def test_all_endpoints_respond(self):
+        """Остальные ресурсы отвечают 200, несуществующий пост — 404."""
+        urls = [
+            reverse('api:v1:post_comments', args=[self.post.pk]),
+            reverse('api:v1:group_list'),
+            reverse('api:v1:group_detail', args=['group']),
+            reverse('api:v1:profile_detail', args=['author']),
+            reverse('api:v1:profile_posts', args=['author']),
+        ]
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertEqual(self.client.get(url).status_code, 200)
+        profile = self.client.get(urls[3]).json()
+        self.assertEqual(profile['posts_count'], 12)
+        self.assertEqual(self.client.get(
+            reverse('api:v1:post_detail', args=[0])
+        ).status_code, 404)
+
+    def test_not_modified_until_content_changes(self):
+        """Повторный опрос с ETag получает 304 без выборки страницы."""
+        url = reverse('api:v1:group_posts', args=['group'])
+        response = self.client.get(url)
+        etag = response['ETag']
+        self.assertFalse(response.has_header('Last-Modified'))
+        # Группа, поколение из кэша и самая новая строка
+        with self.assertNumQueries(2):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.post.text = 'Изменённый пост'
+        self.post.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['results'][0]['text'],
+                         'Изменённый пост')
+
+    def test_if_modified_since_does_not_hide_edits(self):
+        """Правка поста не прячется за If-Modified-Since."""
+        url = reverse('api:v1:post_detail', args=[self.post.pk])
+        since = http_date(time.time() + 60)
+        self.assertEqual(
+            self.client.get(url, HTTP_IF_MODIFIED_SINCE=since).status_code,
+            200,
+        )
+        self.post.text = 'Изменённый пост'
+        self.post.save()
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=since)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['text'], 'Изменённый пост')
@@ -0,0 +1,169 @@
+"""Read-only JSON API над теми же querysets, что и HTML-страницы.
+
+Списки листаются курсором (?cursor=), состав полей задаётся
+параметром ``fields``. Каждый ответ несёт ETag (поколение содержимого,
+самая новая строка и адрес запроса), поэтому опрос без изменений стоит
+одного-двух запросов к кэшу и базе и заканчивается ответом 304.
+Last-Modified не отдаётся: правка или удаление не создают строки новее,
+и клиент с одним If-Modified-Since получал бы 304 со старыми данными.
+"""
+from functools import wraps
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.http import JsonResponse
+from django.shortcuts import get_object_or_404
+from django.views.decorators.http import require_safe
+
+from core.http import conditional, make_etag
+from posts import generations
+from posts.models import Group, Post
+from posts.utils import CURSOR_PARAM, DEFAULT_KEY, CursorPaginator, newest
+from posts.views import (COMMENTS_KEY, group_feed, index_posts,
+                         post_comment_list, profile_feed)
+
+from .serializers import (COMMENT_FIELDS, GROUP_FIELDS, POST_FIELDS,
+                          PROFILE_FIELDS, FieldsError, selected_fields,
+                          serialize)
+
+User = get_user_model()
+
+
+def json_response(data, status=200):
+    return JsonResponse(
+        data, status=status, json_dumps_params={'ensure_ascii': False}
+    )
+
+
+def api_view(view):
+    """Только GET/HEAD; ошибка в ?fields= — ответ 400 в JSON."""
+    @require_safe
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        try:
+            return view(request, *args, **kwargs)
+        except FieldsError as error:
+            return json_response({'error': str(error)}, status=400)
+    return wrapper
+
+
+def page_url(request, cursor):
+    if cursor is None:
+        return None
+    query = request.GET.copy()
+    query[CURSOR_PARAM] = cursor
+    return request.build_absolute_uri(f'{request.path}?{query.urlencode()}')
+
+
+def object_response(request, obj, available, version, last_modified=None):
+    fields = selected_fields(request, available)
+    etag = make_etag(version, last_modified, request.get_full_path())
+    return conditional(
+        request,
+        lambda: json_response(serialize(obj, available, fields)),
+        etag,
+    )
+
+
+def list_response(request, queryset, available, version, key=DEFAULT_KEY):
+    fields = selected_fields(request, available)
+    last_modified = newest(queryset, key[0])
+    etag = make_etag(version, last_modified, request.get_full_path())
+
+    def respond():
+        page = CursorPaginator(queryset, settings.PAGES, key).get_page(
+            request.GET.get(CURSOR_PARAM)
+        )
+        return json_response({
+            'results': [serialize(obj, available, fields) for obj in page],
+            'next': page_url(request, page.next_cursor),
+            'previous': page_url(request, page.previous_cursor),
+        })
+    return conditional(request, respond, etag)
+
+
+@api_view
+def post_list(request):
+    return list_response(
+        request, index_posts(), POST_FIELDS, generations.get('feed')
+    )
+
+
+@api_view
+def post_detail(request, post_id):
+    post = get_object_or_404(
+        Post.objects.select_related('author', 'group'), pk=post_id
+    )
+    version = [
+        generations.get('post', post.pk),
+        generations.get('author', post.author_id),
+    ]
+    if post.group_id:
+        version.append(generations.get('group', post.group_id))
+    last_modified = max(
+        filter(None, [post.pub_date, newest(post.comments, 'created')])
+    )
+    return object_response(request, post, POST_FIELDS, version, last_modified)
+
+
+@api_view
+def post_comments(request, post_id):
+    post = get_object_or_404(Post.objects.only('pk'), pk=post_id)
+    return list_response(
+        request,
+        post_comment_list(post.pk),
+        COMMENT_FIELDS,
+        generations.get('post', post.pk),
+        COMMENTS_KEY,
+    )
+
+
+@api_view
+def group_list(request):
+    fields = selected_fields(request, GROUP_FIELDS)
+    # Группы меняются редко, а их сохранение сдвигает поколение ленты
+    etag = make_etag(generations.get('feed'), request.get_full_path())
+    return conditional(
+        request,
+        lambda: json_response({'results': [
+            serialize(group, GROUP_FIELDS, fields)
+            for group in Group.objects.order_by('title')
+        ]}),
+        etag,
+    )
+
+
+@api_view
+def group_detail(request, slug):
+    group = get_object_or_404(Group, slug=slug)
+    return object_response(
+        request, group, GROUP_FIELDS, generations.get('group', group.pk)
+    )
+
+
+@api_view
+def group_posts(request, slug):
+    group = get_object_or_404(Group, slug=slug)
+    return list_response(
+        request, group_feed(group), POST_FIELDS,
+        generations.get('group', group.pk),
+    )
+
+
+@api_view
+def profile_detail(request, username):
+    author = get_object_or_404(
+        User.objects.select_related('stats'), username=username
+    )
+    return object_response(
+        request, author, PROFILE_FIELDS, generations.get('author', author.pk)
+    )
+
+
+@api_view
+def profile_posts(request, username):
+    author = get_object_or_404(User, username=username)
+    return list_response(
+        request, profile_feed(author), POST_FIELDS,
+        generations.get('author', author.pk),
+    )
@@ -1,5 +1,18 @@
 from django.apps import AppConfig
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models.signals import post_migrate
+
+
+def clear_caches(**kwargs):
+    # Общий кэш переживает перезапуск и пересоздание базы: после смены
+    # схемы в нём остались бы страницы и объекты со старыми данными
+    for alias in settings.CACHES:
+        caches[alias].clear()
 
 
 class CoreConfig(AppConfig):
     name = 'core'
+
+    def ready(self):
+        post_migrate.connect(clear_caches, dispatch_uid='core.clear_caches')
@@ -0,0 +1,31 @@
+"""Счётчики попаданий и промахов фрагментного кэша.
+
+Хранятся в core.metrics и видны на /metrics вместе с долей попаданий.
+"""
+from core import metrics
+
+FAMILY = 'yatube_fragment_cache_requests_total'
+
+
+def record(name, hit):
+    metrics.inc(FAMILY, fragment=name, result='hit' if hit else 'miss')
+
+
+def snapshot():
+    """Возвращает {имя фрагмента: (попадания, промахи)} этого процесса."""
+    result = {}
+    for (family, _, labels), value in metrics.local_samples().items():
+        if family != FAMILY:
+            continue
+        labels = dict(labels)
+        hits, misses = result.get(labels['fragment'], (0, 0))
+        if labels['result'] == 'hit':
+            hits += int(value)
+        else:
+            misses += int(value)
+        result[labels['fragment']] = (hits, misses)
+    return result
+
+
+def reset():
+    metrics.reset(FAMILY)
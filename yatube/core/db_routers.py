@@ -0,0 +1,96 @@
+"""Чтение с реплик для страниц-лент, запись — всегда в основную базу.
+
+Реплика выбирается, только если ReplicaMiddleware разрешил её для
+текущего запроса (флаг в threading.local). Вне запросов — в командах,
+миграциях, фоновых задачах — все запросы идут в основную базу.
+
+Страницы с реплики попадают в кэши под ключами текущих поколений. Чтобы
+отстающая реплика не сохранила там старые данные под новым ключом,
+сдвиг поколений отмечает время в общем кэше, и следующие
+REPLICA_MAX_LAG секунд ленты читаются из основной базы.
+"""
+import random
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+
+CHANGED_KEY = 'replicas:changed'
+
+_local = threading.local()
+
+
+def replica_allowed():
+    return getattr(_local, 'allowed', False)
+
+
+def wrote():
+    """Была ли запись в базу в текущем запросе."""
+    return getattr(_local, 'wrote', False)
+
+
+def data_changed():
+    """Отмечает время изменения, после которого реплики могут отставать."""
+    if settings.DATABASE_REPLICAS:
+        cache.set(CHANGED_KEY, time.time(), None)
+
+
+def replicas_behind():
+    """Могут ли реплики ещё не видеть последнего изменения."""
+    if not settings.DATABASE_REPLICAS:
+        return False
+    changed = cache.get(CHANGED_KEY)
+    return (
+        changed is not None
+        and time.time() - changed < settings.REPLICA_MAX_LAG
+    )
+
+
+def start(allowed):
+    """Начало запроса: можно ли читать с реплик, записей ещё не было."""
+    _local.allowed = allowed
+    _local.wrote = False
+
+
+def reset():
+    _local.allowed = False
+    _local.wrote = False
+
+
+class ReplicaRouter:
+    """Читает модели из REPLICA_APPS с DATABASE_REPLICAS, если можно.
+
+    После записи в этом же запросе (и после select_for_update, который
+    тоже идёт через db_for_write) чтение возвращается в основную базу:
+    реплика может ещё не видеть изменений.
+    """
+
+    def db_for_read(self, model, **hints):
+        replicas = settings.DATABASE_REPLICAS
+        if (
+            not replicas
+            or not replica_allowed()
+            or wrote()
+            or model._meta.app_label not in settings.REPLICA_APPS
+        ):
+            return DEFAULT_DB_ALIAS
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        _local.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Реплики — копии основной базы: связи между ними допустимы
+        databases = {DEFAULT_DB_ALIAS, *settings.DATABASE_REPLICAS}
+        if {obj1._state.db, obj2._state.db} <= databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Схема реплик приходит вместе с данными из основной базы
+        if db in settings.DATABASE_REPLICAS:
+            return False
+        return None
@@ -0,0 +1,122 @@
+import multiprocessing
+import os
+import random
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.module_loading import import_string
+
+BACKENDS = {
+    'locmem': 'django.core.cache.backends.locmem.LocMemCache',
+    'file': 'django.core.cache.backends.filebased.FileBasedCache',
+    'sqlite': 'core.sqlite_cache.SQLiteCache',
+}
+# Сколько ключей читается за раз: карточки одной страницы ленты
+BATCH = 10
+VERSION_KEY = 'bench:version'
+
+
+def make_cache(backend, directory):
+    location = {
+        'locmem': 'bench',
+        'file': os.path.join(directory, 'file'),
+        'sqlite': os.path.join(directory, 'cache.sqlite3'),
+    }[backend]
+    # MAX_ENTRIES выше числа ключей: сравниваем общий кэш, а не вытеснение
+    return import_string(BACKENDS[backend])(location, {
+        'OPTIONS': {'MAX_ENTRIES': 10 ** 6},
+    })
+
+
+def run_worker(backend, directory, options, seed, results):
+    """Читает пачки ключей с перекосом к популярным, промахи дописывает."""
+    cache = make_cache(backend, directory)
+    rng = random.Random(seed)
+    keys = [f'bench:card:{number}' for number in range(options['keys'])]
+    weights = [1 / (rank + 1) for rank in range(len(keys))]
+    payload = 'x' * options['size']
+    operations = lookups = hits = 0
+    deadline = time.perf_counter() + options['seconds']
+    while time.perf_counter() < deadline:
+        batch = set(rng.choices(keys, weights, k=BATCH))
+        found = cache.get_many(batch)
+        missing = batch - found.keys()
+        if missing:
+            cache.set_many({key: payload for key in missing})
+        lookups += len(batch)
+        hits += len(found)
+        operations += 2 if missing else 1
+        if rng.random() < options['writes']:
+            try:
+                cache.incr(VERSION_KEY)
+            except ValueError:
+                cache.add(VERSION_KEY, 1, None)
+            operations += 1
+    results.put((operations, lookups, hits))
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает бэкенды кэша под нагрузкой из нескольких процессов: '
+        'LocMemCache (свой у каждого процесса), файловый кэш Django и '
+        'общий SQLiteCache. Печатает операции в секунду и долю попаданий.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--backends', default=','.join(BACKENDS),
+            help='Бэкенды через запятую.'
+        )
+        parser.add_argument(
+            '--processes', type=int, default=4,
+            help='Число процессов, как воркеров сервера.'
+        )
+        parser.add_argument('--seconds', type=float, default=5)
+        parser.add_argument(
+            '--keys', type=int, default=5000,
+            help='Число разных ключей.'
+        )
+        parser.add_argument(
+            '--size', type=int, default=2000,
+            help='Размер значения в байтах.'
+        )
+        parser.add_argument(
+            '--writes', type=float, default=0.05,
+            help='Доля итераций со сдвигом версии через incr.'
+        )
+
+    def handle(self, *args, **options):
+        backends = options['backends'].split(',')
+        unknown = set(backends) - BACKENDS.keys()
+        if unknown:
+            raise CommandError(f'Неизвестные бэкенды: {", ".join(unknown)}.')
+        for backend in backends:
+            with tempfile.TemporaryDirectory() as directory:
+                self.report(backend, *self.measure(
+                    backend, directory, options
+                ))
+
+    def measure(self, backend, directory, options):
+        context = multiprocessing.get_context('fork')
+        results = context.Queue()
+        processes = [
+            context.Process(
+                target=run_worker,
+                args=(backend, directory, options, seed, results),
+            )
+            for seed in range(options['processes'])
+        ]
+        for process in processes:
+            process.start()
+        totals = [results.get() for _ in processes]
+        for process in processes:
+            process.join()
+        operations, lookups, hits = map(sum, zip(*totals))
+        return operations / options['seconds'], hits / max(lookups, 1)
+
+    def report(self, backend, rate, hit_ratio):
+        self.stdout.write(
+            f'{backend}: {rate:.0f} операций/с, '
+            f'попаданий {hit_ratio * 100:.1f}%'
+        )
@@ -0,0 +1,48 @@
+import sqlite3
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+class Command(BaseCommand):
+    help = (
+        'Копирует основную SQLite-базу в файлы реплик через backup API. '
+        'Заменяет репликацию при локальной проверке чтения с реплик.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'aliases', nargs='*',
+            help='Псевдонимы реплик; по умолчанию DATABASE_REPLICAS.'
+        )
+        parser.add_argument(
+            '--every', type=float, default=0,
+            help='Повторять копирование с этим интервалом в секундах.'
+        )
+
+    def handle(self, *args, **options):
+        aliases = options['aliases'] or settings.DATABASE_REPLICAS
+        if not aliases:
+            raise CommandError('Реплики не заданы: DATABASE_REPLICAS пуст.')
+        for alias in aliases:
+            if connections[alias].vendor != 'sqlite':
+                raise CommandError(f'{alias}: поддерживается только SQLite.')
+        while True:
+            for alias in aliases:
+                self.copy(alias)
+            if not options['every']:
+                break
+            time.sleep(options['every'])
+
+    def copy(self, alias):
+        source = connections[DEFAULT_DB_ALIAS]
+        source.ensure_connection()
+        target = sqlite3.connect(connections[alias].settings_dict['NAME'])
+        try:
+            # Копия согласована: backup читает один снимок базы
+            source.connection.backup(target)
+        finally:
+            target.close()
+        self.stdout.write(f'{alias}: скопирована основная база')
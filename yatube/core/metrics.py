@@ -0,0 +1,236 @@
+"""Метрики в текстовом формате Prometheus.
+
+Все метрики — счётчики (гистограмма — это набор счётчиков по корзинам),
+поэтому любые их части складываются. Каждый поток пишет в свой словарь
+без блокировок; блокировка берётся только при появлении нового потока.
+
+При нескольких процессах (prefork) задайте METRICS_DIR: каждый поток
+раз в METRICS_FLUSH_INTERVAL секунд сохраняет там свои счётчики в
+отдельный файл, а /metrics складывает файлы других процессов с живыми
+счётчиками своего. Файлы завершённых процессов остаются, чтобы счётчики
+не уменьшались; каталог очищают при перезапуске всего сервиса.
+"""
+import json
+import math
+import os
+import tempfile
+import threading
+import time
+import uuid
+from collections import defaultdict
+
+from django.conf import settings
+
+LATENCY_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10,
+)
+QUERY_BUCKETS = (1, 2, 5, 10, 20, 50, 100)
+FAMILIES = {
+    'yatube_http_requests_total': (
+        'counter', 'Запросы по имени адреса, методу и статусу.'
+    ),
+    'yatube_http_request_duration_seconds': (
+        'histogram', 'Время ответа по имени адреса.'
+    ),
+    'yatube_db_queries': (
+        'histogram', 'Запросов к базе на один ответ по имени адреса.'
+    ),
+    'yatube_fragment_cache_requests_total': (
+        'counter', 'Обращения к кэшу фрагментов шаблонов.'
+    ),
+    'yatube_fragment_cache_hit_ratio': (
+        'gauge', 'Доля попаданий в кэш фрагментов шаблонов.'
+    ),
+}
+
+
+def _process_name():
+    # Уникален для процесса: pid могут переиспользовать после перезапуска
+    return f'{os.getpid()}-{uuid.uuid4().hex[:8]}'
+
+
+PROCESS = _process_name()
+
+_local = threading.local()
+_shards = []
+_shards_lock = threading.Lock()
+
+
+def _after_fork():
+    # Воркер, созданный fork после импорта (gunicorn --preload, uWSGI),
+    # получает копию родителя: ему нужны своё имя файлов и пустые
+    # счётчики, иначе воркеры перезаписывают файлы друг друга
+    global PROCESS, _local, _shards, _shards_lock
+    PROCESS = _process_name()
+    _local = threading.local()
+    _shards = []
+    _shards_lock = threading.Lock()
+
+
+os.register_at_fork(after_in_child=_after_fork)
+
+
+class Shard:
+    """Счётчики одного потока: {(семейство, имя, метки): значение}."""
+
+    def __init__(self):
+        self.name = f'{PROCESS}-{threading.get_ident()}'
+        self.counters = defaultdict(float)
+        self.flushed = time.monotonic()
+
+    def flush(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        rows = [
+            [family, name, labels, value]
+            for (family, name, labels), value in self.counters.copy().items()
+        ]
+        fd, temp_path = tempfile.mkstemp(prefix='.', dir=directory)
+        with os.fdopen(fd, 'w') as stream:
+            json.dump(rows, stream)
+        # Читатель видит либо старый файл, либо новый целиком
+        os.replace(temp_path, os.path.join(directory, f'{self.name}.json'))
+        self.flushed = time.monotonic()
+
+
+def _shard():
+    shard = getattr(_local, 'shard', None)
+    if shard is None:
+        shard = _local.shard = Shard()
+        with _shards_lock:
+            _shards.append(shard)
+    return shard
+
+
+def _labels(labels):
+    return tuple(sorted(labels.items()))
+
+
+def inc(family, value=1, **labels):
+    _shard().counters[family, family, _labels(labels)] += value
+
+
+def observe(family, value, buckets, **labels):
+    """Добавляет значение в гистограмму family."""
+    counters = _shard().counters
+    for bound in buckets:
+        if value <= bound:
+            le = (('le', str(bound)),)
+            counters[family, f'{family}_bucket', _labels(labels) + le] += 1
+    counters[
+        family, f'{family}_bucket', _labels(labels) + (('le', '+Inf'),)
+    ] += 1
+    counters[family, f'{family}_sum', _labels(labels)] += value
+    counters[family, f'{family}_count', _labels(labels)] += 1
+
+
+def maybe_flush():
+    """Сохраняет счётчики потока в METRICS_DIR, если пора."""
+    directory = settings.METRICS_DIR
+    if not directory:
+        return
+    shard = _shard()
+    if time.monotonic() - shard.flushed >= settings.METRICS_FLUSH_INTERVAL:
+        shard.flush(directory)
+
+
+def local_samples():
+    """Сумма счётчиков всех потоков этого процесса."""
+    with _shards_lock:
+        shards = list(_shards)
+    total = defaultdict(float)
+    for shard in shards:
+        for key, value in shard.counters.copy().items():
+            total[key] += value
+    return total
+
+
+def _read_files(directory):
+    total = defaultdict(float)
+    if not os.path.isdir(directory):
+        return total
+    for filename in os.listdir(directory):
+        if not filename.endswith('.json') or filename.startswith(PROCESS):
+            continue
+        try:
+            with open(os.path.join(directory, filename)) as stream:
+                rows = json.load(stream)
+        except (OSError, ValueError):
+            continue
+        for family, name, labels, value in rows:
+            labels = tuple(tuple(pair) for pair in labels)
+            total[family, name, labels] += value
+    return total
+
+
+def collect():
+    """Счётчики всех процессов: свои — живые, чужие — из файлов."""
+    total = local_samples()
+    if settings.METRICS_DIR:
+        for key, value in _read_files(settings.METRICS_DIR).items():
+            total[key] += value
+    return total
+
+
+def reset(family=None):
+    """Обнуляет счётчики этого процесса (для тестов)."""
+    with _shards_lock:
+        for shard in _shards:
+            for key in list(shard.counters):
+                if family is None or key[0] == family:
+                    del shard.counters[key]
+
+
+def add_hit_ratios(samples):
+    """Доля попаданий по каждому фрагменту из счётчиков обращений."""
+    requests = defaultdict(lambda: [0, 0])
+    for (family, _, labels), value in list(samples.items()):
+        if family == 'yatube_fragment_cache_requests_total':
+            labels = dict(labels)
+            hit = labels.pop('result') == 'hit'
+            requests[_labels(labels)][0 if hit else 1] += value
+    for labels, (hits, misses) in requests.items():
+        family = 'yatube_fragment_cache_hit_ratio'
+        samples[family, family, labels] = hits / (hits + misses)
+    return samples
+
+
+def _escape(value):
+    return (str(value).replace('\\', r'\\').replace('"', r'\"')
+            .replace('\n', r'\n'))
+
+
+def _format_value(value):
+    if value == int(value):
+        return str(int(value))
+    return repr(value)
+
+
+def _sort_key(item):
+    (_, name, labels), _ = item
+    # Корзины по возрастанию границы, а не по строке
+    return name, [
+        (key, math.inf if value == '+Inf' else float(value))
+        if key == 'le' else (key, value)
+        for key, value in labels
+    ]
+
+
+def render(samples):
+    """Текстовый формат Prometheus 0.0.4."""
+    by_family = defaultdict(list)
+    for item in sorted(samples.items(), key=_sort_key):
+        by_family[item[0][0]].append(item)
+    lines = []
+    for family, (kind, help_text) in FAMILIES.items():
+        if family not in by_family:
+            continue
+        lines.append(f'# HELP {family} {help_text}')
+        lines.append(f'# TYPE {family} {kind}')
+        for (_, name, labels), value in by_family[family]:
+            label_text = ','.join(
+                f'{key}="{_escape(label)}"' for key, label in labels
+            )
+            if label_text:
+                name = f'{name}{{{label_text}}}'
+            lines.append(f'{name} {_format_value(value)}')
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,208 @@
+import json
+import logging
+import time
+from contextlib import nullcontext
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.urls import Resolver404, resolve
+
+from core import db_routers, metrics, page_cache, timing
+
+slow_log = logging.getLogger('yatube.slow_requests')
+
+# Части запроса в порядке вывода в Server-Timing
+PARTS = ('sql', 'template', 'thumbnail')
+
+
+def milliseconds(seconds):
+    return round(seconds * 1000, 2)
+
+
+def server_timing(timer):
+    """Значение заголовка Server-Timing по таймеру запроса."""
+    entries = [f'sql;dur={milliseconds(timer.durations["sql"])};'
+               f'desc="{timer.queries} queries"']
+    entries += [
+        f'{part};dur={milliseconds(timer.durations[part])}'
+        for part in PARTS[1:] if part in timer.durations
+    ]
+    entries.append(f'total;dur={milliseconds(timer.total)}')
+    return ', '.join(entries)
+
+
+def timing_record(request, response, timer):
+    """Запись медленного запроса для журнала, одной строкой JSON."""
+    match = request.resolver_match
+    record = {
+        'url_name': match.view_name if match else None,
+        'method': request.method,
+        'path': request.get_full_path(),
+        'status': response.status_code,
+        'queries': timer.queries,
+    }
+    for part in PARTS:
+        record[f'{part}_ms'] = milliseconds(timer.durations[part])
+    record['total_ms'] = milliseconds(timer.total)
+    return record
+
+
+class RequestTimingMiddleware:
+    """Число запросов к базе, время SQL, шаблонов и миниатюр.
+
+    Включается настройкой REQUEST_TIMING. Отдаёт заголовок Server-Timing
+    и пишет в журнал yatube.slow_requests запросы дольше
+    SLOW_REQUEST_MS миллисекунд.
+    """
+
+    def __init__(self, get_response):
+        if not settings.REQUEST_TIMING:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with timing.request_timer() as timer:
+            response = self.get_response(request)
+        response['Server-Timing'] = server_timing(timer)
+        if milliseconds(timer.total) >= settings.SLOW_REQUEST_MS:
+            slow_log.warning(
+                json.dumps(timing_record(request, response, timer))
+            )
+        return response
+
+
+def metrics_view_name(request):
+    """Метка адреса: имя из METRICS_NAMESPACES, иначе обобщённая."""
+    match = request.resolver_match
+    if match is None:
+        return 'unmatched'
+    namespaces = match.namespaces
+    if namespaces and namespaces[0] in settings.METRICS_NAMESPACES:
+        return match.view_name
+    return 'other'
+
+
+class MetricsMiddleware:
+    """Собирает для /metrics время ответа, статусы и число запросов к
+    базе по имени адреса. Если запрос уже замеряет
+    RequestTimingMiddleware, число запросов берётся из его таймера.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        timer = timing.current()
+        context = nullcontext(timer) if timer else timing.request_timer()
+        started = time.perf_counter()
+        with context as timer:
+            queries = timer.queries
+            response = self.get_response(request)
+            queries = timer.queries - queries
+        elapsed = time.perf_counter() - started
+        view = metrics_view_name(request)
+        metrics.inc(
+            'yatube_http_requests_total', view=view,
+            method=request.method, status=str(response.status_code),
+        )
+        metrics.observe(
+            'yatube_http_request_duration_seconds', elapsed,
+            metrics.LATENCY_BUCKETS, view=view,
+        )
+        metrics.observe(
+            'yatube_db_queries', queries, metrics.QUERY_BUCKETS, view=view
+        )
+        metrics.maybe_flush()
+        return response
+
+
+class ReplicaMiddleware:
+    """Разрешает чтение с реплик для GET-запросов к REPLICA_VIEWS.
+
+    После запроса, который писал в базу, ставит cookie: следующие
+    REPLICA_STICKY_SECONDS секунд этот пользователь читает из основной
+    базы и видит свои изменения, даже если реплика отстаёт. Пока реплики
+    могут не видеть последнего изменения, ленты тоже читаются из
+    основной базы: их рендер сохраняется в кэши под новыми ключами.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        try:
+            response = self.get_response(request)
+            # Анонимные запросы пишут только производные данные (счётчики,
+            # миниатюры): своих изменений у читателя нет
+            if db_routers.wrote() and request.user.is_authenticated:
+                response.set_cookie(
+                    settings.REPLICA_STICKY_COOKIE, '1',
+                    max_age=settings.REPLICA_STICKY_SECONDS,
+                    httponly=True, samesite='Lax',
+                )
+            return response
+        finally:
+            # Поток обслужит следующий запрос: флаги не должны остаться
+            db_routers.reset()
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        allowed = (
+            request.method in ('GET', 'HEAD')
+            and request.resolver_match.view_name in settings.REPLICA_VIEWS
+            and settings.REPLICA_STICKY_COOKIE not in request.COOKIES
+            and not db_routers.replicas_behind()
+        )
+        db_routers.start(allowed)
+
+
+class AnonymousPageCacheMiddleware:
+    """Отдаёт анонимным читателям страницы PAGE_CACHE_VIEWS из кэша.
+
+    Стоит до сессий и аутентификации: попадание в кэш обходится без
+    них, контекст-процессоров, запросов к базе и шаблонов. Включается
+    настройкой PAGE_CACHE.
+    """
+
+    def __init__(self, get_response):
+        if not settings.PAGE_CACHE:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        match = self.match(request)
+        if match is None:
+            return self.get_response(request)
+        # Попадание отдаётся до разрешения адреса в Django: без этого
+        # MetricsMiddleware записал бы его как unmatched
+        request.resolver_match = match
+        key, version, entry, state = page_cache.lookup(request)
+        if state == page_cache.FRESH:
+            return page_cache.serve(request, entry, state)
+        locked = state == page_cache.STALE and page_cache.acquire(key)
+        if state == page_cache.STALE and not locked:
+            # Страницу уже перерисовывает другой запрос
+            return page_cache.serve(request, entry, state)
+        try:
+            response = self.get_response(request)
+            if page_cache.cacheable(response):
+                page_cache.store(key, version, response)
+        finally:
+            if locked:
+                page_cache.release(key)
+        response['X-Page-Cache'] = page_cache.MISS
+        return response
+
+    @staticmethod
+    def match(request):
+        """Адрес запроса, если его страницу можно взять из кэша."""
+        if request.method not in ('GET', 'HEAD'):
+            return None
+        if not page_cache.is_anonymous(request):
+            return None
+        try:
+            match = resolve(request.path_info)
+        except Resolver404:
+            return None
+        if match.view_name not in settings.PAGE_CACHE_VIEWS:
+            return None
+        return match
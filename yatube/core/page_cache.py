@@ -0,0 +1,132 @@
+"""Кэш целых страниц для анонимных читателей.
+
+Ключ записи — путь и параметры запроса из PAGE_CACHE_PARAMS, в самой
+записи хранится номер версии пути. Запись в базу меняет версию путей, на
+которых она видна (``purge``), и запись становится устаревшей. Устаревшую
+страницу перерисовывает один запрос — тот, кому досталась блокировка, —
+а остальные тем временем получают старую копию.
+"""
+import hashlib
+import time
+from urllib.parse import unquote, urlencode
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.utils.cache import get_conditional_response
+
+PREFIX = 'page'
+
+FRESH, STALE, MISS = 'HIT', 'STALE', 'MISS'
+
+
+def page_cache():
+    return caches[settings.PAGE_CACHE_ALIAS]
+
+
+def _digest(value):
+    return hashlib.md5(value.encode()).hexdigest()
+
+
+def version_key(path):
+    # reverse() отдаёт путь в %-кодировке, request.path — раскодированным
+    return f'{PREFIX}:version:{_digest(unquote(path))}'
+
+
+def entry_key(request):
+    params = sorted(
+        (name, value)
+        for name, values in request.GET.lists()
+        if name in settings.PAGE_CACHE_PARAMS
+        for value in values
+    )
+    return f'{PREFIX}:entry:{_digest(request.path + "?" + urlencode(params))}'
+
+
+def lock_key(key):
+    return f'{key}:lock'
+
+
+def is_anonymous(request):
+    """Нет ни сессии, ни других cookie, от которых зависит страница."""
+    return not any(
+        name in request.COOKIES for name in settings.PAGE_CACHE_BYPASS_COOKIES
+    )
+
+
+def lookup(request):
+    """Запись страницы, текущая версия пути и состояние записи."""
+    key = entry_key(request)
+    path_key = version_key(request.path)
+    found = page_cache().get_many([key, path_key])
+    version = found.get(path_key, 0)
+    entry = found.get(key)
+    if entry is None:
+        return key, version, None, MISS
+    fresh = (
+        entry['version'] == version
+        and time.time() - entry['created'] < settings.PAGE_CACHE_TIMEOUT
+    )
+    return key, version, entry, FRESH if fresh else STALE
+
+
+def cacheable(response):
+    return (
+        response.status_code == 200
+        and not response.streaming
+        and not response.cookies
+        and 'private' not in response.get('Cache-Control', '')
+    )
+
+
+def store(key, version, response):
+    entry = {'version': version, 'created': time.time(), 'response': response}
+    # Дольше свежести: устаревшую копию ещё можно отдать, пока
+    # страница перерисовывается
+    page_cache().set(
+        key, entry,
+        settings.PAGE_CACHE_TIMEOUT + settings.PAGE_CACHE_STALE_TIMEOUT,
+    )
+
+
+def serve(request, entry, state):
+    response = entry['response']
+    conditional = get_conditional_response(
+        request, etag=response.get('ETag'), response=response
+    )
+    conditional['X-Page-Cache'] = state
+    return conditional
+
+
+def acquire(key):
+    """Блокировка перерисовки: достаётся одному запросу."""
+    return page_cache().add(
+        lock_key(key), 1, settings.PAGE_CACHE_LOCK_TIMEOUT
+    )
+
+
+def release(key):
+    page_cache().delete(lock_key(key))
+
+
+def purge(*paths):
+    """Меняет версии путей сейчас и ещё раз после коммита.
+
+    Второй раз — чтобы страница, отрисованная по старым данным между
+    первым сдвигом и коммитом, тоже считалась устаревшей.
+    """
+    keys = [version_key(path) for path in set(paths)]
+
+    def bump():
+        cache = page_cache()
+        for key in keys:
+            try:
+                cache.incr(key)
+            except ValueError:
+                # Версии нет в кэше: начинаем с времени, чтобы не совпасть
+                # с версией, записанной в старых копиях страниц
+                cache.set(key, time.time_ns(), None)
+
+    bump()
+    if transaction.get_connection().in_atomic_block:
+        transaction.on_commit(bump)
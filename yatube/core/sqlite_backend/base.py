@@ -0,0 +1,45 @@
+"""SQLite для рабочей нагрузки: PRAGMA на каждом соединении и
+транзакции, которые сразу берут блокировку записи.
+
+Параметры в OPTIONS базы:
+
+* ``pragmas`` — словарь PRAGMA, выполняется при открытии соединения;
+* ``transaction_mode`` — DEFERRED (как у Django), IMMEDIATE или
+  EXCLUSIVE. При DEFERRED транзакция, начавшая с чтения, не может
+  дождаться блокировки записи: SQLite сразу отвечает «database is
+  locked», не глядя на busy_timeout. IMMEDIATE ждёт блокировку в BEGIN.
+"""
+from django.core.exceptions import ImproperlyConfigured
+from django.db.backends.sqlite3 import base
+
+TRANSACTION_MODES = ('DEFERRED', 'IMMEDIATE', 'EXCLUSIVE')
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+
+    def get_connection_params(self):
+        params = super().get_connection_params()
+        params.pop('pragmas', None)
+        params.pop('transaction_mode', None)
+        return params
+
+    @property
+    def transaction_mode(self):
+        mode = self.settings_dict['OPTIONS'].get(
+            'transaction_mode', 'DEFERRED'
+        ).upper()
+        if mode not in TRANSACTION_MODES:
+            raise ImproperlyConfigured(
+                f'transaction_mode должен быть одним из {TRANSACTION_MODES}'
+            )
+        return mode
+
+    def get_new_connection(self, conn_params):
+        connection = super().get_new_connection(conn_params)
+        pragmas = self.settings_dict['OPTIONS'].get('pragmas', {})
+        for name, value in pragmas.items():
+            connection.execute(f'PRAGMA {name} = {value}')
+        return connection
+
+    def _start_transaction_under_autocommit(self):
+        self.cursor().execute(f'BEGIN {self.transaction_mode}')
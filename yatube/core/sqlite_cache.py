@@ -0,0 +1,313 @@
+"""Кэш в файле SQLite, общий для всех процессов одного сервера.
+
+LocMemCache у каждого воркера свой: память и промахи умножаются на
+число воркеров, а сброс поколения доходит только до одного процесса.
+Этот бэкенд хранит записи в одном файле в режиме WAL: читатели не ждут
+писателя, ``incr`` атомарен, ``get_many``/``set_many`` — один запрос.
+
+Размер ограничен OPTIONS['MAX_BYTES']: сумму размеров записей ведут
+триггеры, и при превышении удаляются сначала просроченные, а затем
+давно не читанные записи (LRU). Время чтения обновляется не чаще раза
+в ACCESS_RESOLUTION секунд, чтобы чтение почти никогда не писало.
+"""
+import os
+import pickle
+import sqlite3
+import threading
+import time
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+# Ограничение SQLite на число параметров запроса в старых версиях — 999
+CHUNK_SIZE = 500
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS cache_entries (
+    key TEXT PRIMARY KEY,
+    value BLOB,
+    expires REAL,
+    size INTEGER NOT NULL,
+    accessed REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS cache_entries_accessed
+    ON cache_entries (accessed);
+CREATE INDEX IF NOT EXISTS cache_entries_expires
+    ON cache_entries (expires);
+CREATE TABLE IF NOT EXISTS cache_usage (
+    id INTEGER PRIMARY KEY CHECK (id = 0),
+    bytes INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO cache_usage VALUES (0, 0);
+CREATE TRIGGER IF NOT EXISTS cache_entries_insert
+AFTER INSERT ON cache_entries BEGIN
+    UPDATE cache_usage SET bytes = bytes + NEW.size WHERE id = 0;
+END;
+CREATE TRIGGER IF NOT EXISTS cache_entries_update
+AFTER UPDATE OF size ON cache_entries BEGIN
+    UPDATE cache_usage SET bytes = bytes + NEW.size - OLD.size WHERE id = 0;
+END;
+CREATE TRIGGER IF NOT EXISTS cache_entries_delete
+AFTER DELETE ON cache_entries BEGIN
+    UPDATE cache_usage SET bytes = bytes - OLD.size WHERE id = 0;
+END;
+"""
+UPSERT = """
+INSERT INTO cache_entries (key, value, expires, size, accessed)
+VALUES (?, ?, ?, ?, ?)
+ON CONFLICT (key) DO UPDATE SET
+    value = excluded.value, expires = excluded.expires,
+    size = excluded.size, accessed = excluded.accessed
+"""
+LIVE = '(expires IS NULL OR expires > ?)'
+
+
+def _chunks(items):
+    items = list(items)
+    for start in range(0, len(items), CHUNK_SIZE):
+        yield items[start:start + CHUNK_SIZE]
+
+
+def _placeholders(items):
+    return ', '.join('?' * len(items))
+
+
+def encode(value):
+    """Целые числа хранятся как есть, чтобы incr работал в SQL."""
+    if type(value) is int:
+        return value
+    return pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+
+
+def decode(value):
+    if isinstance(value, int):
+        return value
+    return pickle.loads(value)
+
+
+class SQLiteCache(BaseCache):
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        self.path = location
+        options = params.get('OPTIONS', {})
+        self.max_bytes = int(options.get('MAX_BYTES', 64 * 1024 * 1024))
+        # Освобождаем с запасом, чтобы не чистить на каждой записи
+        self.cull_slack = float(options.get('CULL_SLACK', 0.1))
+        self.access_resolution = float(options.get('ACCESS_RESOLUTION', 1))
+        self.busy_timeout = float(options.get('BUSY_TIMEOUT', 5))
+        self._local = threading.local()
+
+    def _connection(self):
+        # Своё соединение у каждого потока; после fork — новое
+        state = getattr(self._local, 'state', None)
+        if state is not None and state[0] == os.getpid():
+            return state[1]
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        connection = sqlite3.connect(
+            self.path, timeout=self.busy_timeout, isolation_level=None,
+            check_same_thread=False,
+        )
+        connection.execute('PRAGMA journal_mode = WAL')
+        connection.execute('PRAGMA synchronous = NORMAL')
+        connection.executescript(SCHEMA)
+        self._local.state = (os.getpid(), connection)
+        return connection
+
+    def _write(self, action):
+        """Выполняет action(connection) в транзакции BEGIN IMMEDIATE."""
+        connection = self._connection()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            result = action(connection)
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+        connection.execute('COMMIT')
+        return result
+
+    def _key(self, key, version):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return key
+
+    def _expires(self, timeout):
+        return self.get_backend_timeout(timeout)
+
+    @staticmethod
+    def _row(key, value, expires, now):
+        stored = encode(value)
+        size = len(key) + (8 if isinstance(stored, int) else len(stored))
+        return key, stored, expires, size, now
+
+    def _fetch(self, keys):
+        connection = self._connection()
+        now = time.time()
+        found = {}
+        for chunk in _chunks(keys):
+            rows = connection.execute(
+                f'SELECT key, value, accessed FROM cache_entries '
+                f'WHERE key IN ({_placeholders(chunk)}) AND {LIVE}',
+                (*chunk, now),
+            ).fetchall()
+            stale = [
+                key for key, _, accessed in rows
+                if accessed < now - self.access_resolution
+            ]
+            found.update((key, value) for key, value, _ in rows)
+            if stale:
+                self._touch_accessed(connection, stale, now)
+        return found
+
+    @staticmethod
+    def _touch_accessed(connection, keys, now):
+        try:
+            connection.execute(
+                f'UPDATE cache_entries SET accessed = ? '
+                f'WHERE key IN ({_placeholders(keys)})',
+                (now, *keys),
+            )
+        except sqlite3.OperationalError:
+            # База занята писателем: LRU приблизительный, пропускаем
+            pass
+
+    def _evict(self, connection):
+        used, = connection.execute(
+            'SELECT bytes FROM cache_usage WHERE id = 0'
+        ).fetchone()
+        if used <= self.max_bytes:
+            return
+        connection.execute(
+            'DELETE FROM cache_entries WHERE expires <= ?', (time.time(),)
+        )
+        used, = connection.execute(
+            'SELECT bytes FROM cache_usage WHERE id = 0'
+        ).fetchone()
+        excess = used - self.max_bytes * (1 - self.cull_slack)
+        if excess <= 0:
+            return
+        victims = []
+        rows = connection.execute(
+            'SELECT key, size FROM cache_entries ORDER BY accessed'
+        )
+        for key, size in rows:
+            victims.append(key)
+            excess -= size
+            if excess <= 0:
+                break
+        for chunk in _chunks(victims):
+            connection.execute(
+                f'DELETE FROM cache_entries '
+                f'WHERE key IN ({_placeholders(chunk)})',
+                chunk,
+            )
+
+    def get(self, key, default=None, version=None):
+        key = self._key(key, version)
+        found = self._fetch([key])
+        if key not in found:
+            return default
+        return decode(found[key])
+
+    def get_many(self, keys, version=None):
+        keys = {self._key(key, version): key for key in keys}
+        found = self._fetch(keys)
+        return {keys[key]: decode(value) for key, value in found.items()}
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.set_many({key: value}, timeout, version)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        now = time.time()
+        expires = self._expires(timeout)
+        rows = [
+            self._row(self._key(key, version), value, expires, now)
+            for key, value in data.items()
+        ]
+
+        def action(connection):
+            connection.executemany(UPSERT, rows)
+            self._evict(connection)
+
+        self._write(action)
+        return []
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        now = time.time()
+        row = self._row(
+            self._key(key, version), value, self._expires(timeout), now
+        )
+
+        def action(connection):
+            # Заменяется только просроченная запись
+            added = connection.execute(
+                UPSERT + ' WHERE cache_entries.expires <= ?', (*row, now)
+            ).rowcount
+            if added:
+                self._evict(connection)
+            return bool(added)
+
+        return self._write(action)
+
+    def incr(self, key, delta=1, version=None):
+        key = self._key(key, version)
+
+        def action(connection):
+            now = time.time()
+            row = connection.execute(
+                f'SELECT value FROM cache_entries WHERE key = ? AND {LIVE}',
+                (key, now),
+            ).fetchone()
+            if row is None:
+                raise ValueError(f"Key '{key}' not found")
+            value = decode(row[0]) + delta
+            stored = encode(value)
+            size = len(key) + (
+                8 if isinstance(stored, int) else len(stored)
+            )
+            connection.execute(
+                'UPDATE cache_entries SET value = ?, size = ?, accessed = ? '
+                'WHERE key = ?',
+                (stored, size, now, key),
+            )
+            return value
+
+        return self._write(action)
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        return bool(self._write(lambda connection: connection.execute(
+            f'UPDATE cache_entries SET expires = ? WHERE key = ? AND {LIVE}',
+            (self._expires(timeout), key, time.time()),
+        ).rowcount))
+
+    def has_key(self, key, version=None):
+        key = self._key(key, version)
+        return key in self._fetch([key])
+
+    def delete(self, key, version=None):
+        self.delete_many([key], version)
+
+    def delete_many(self, keys, version=None):
+        keys = [self._key(key, version) for key in keys]
+
+        def action(connection):
+            for chunk in _chunks(keys):
+                connection.execute(
+                    f'DELETE FROM cache_entries '
+                    f'WHERE key IN ({_placeholders(chunk)})',
+                    chunk,
+                )
+
+        self._write(action)
+
+    def clear(self):
+        self._write(
+            lambda connection: connection.execute(
+                'DELETE FROM cache_entries'
+            )
+        )
+
+    def close(self, **kwargs):
+        # Соединения живут до конца потока: открывать файл на каждый
+        # запрос дороже, чем держать его
+        pass
@@ -0,0 +1,113 @@
+import os
+import shutil
+import tempfile
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connections
+from django.test import Client, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts.models import Post
+
+User = get_user_model()
+
+
+@override_settings(DATABASE_REPLICAS=['replica'], REPLICA_MAX_LAG=0)
+class ReplicaRoutingTests(TransactionTestCase):
+    databases = {'default', 'replica'}
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        # Реплика — отдельный файл, который наполняет sync_replica:
+        # записи после копирования видны только в основной базе
+        cls.directory = tempfile.mkdtemp()
+        replica = connections['replica']
+        cls.replica_name = replica.settings_dict['NAME']
+        replica.close()
+        replica.settings_dict['NAME'] = os.path.join(
+            cls.directory, 'replica.sqlite3'
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        replica = connections['replica']
+        replica.close()
+        replica.settings_dict['NAME'] = cls.replica_name
+        shutil.rmtree(cls.directory, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='author')
+        self.post = Post.objects.create(author=self.user, text='Пост')
+        self.sync()
+        self.client = Client()
+        self.client.force_login(self.user)
+
+    def sync(self):
+        call_command('sync_replica', stdout=StringIO())
+
+    def get(self, url):
+        with CaptureQueriesContext(connections['replica']) as replica:
+            response = self.client.get(url)
+        return response, len(replica)
+
+    def test_feeds_read_from_replica(self):
+        """Страницы-ленты читают посты с реплики."""
+        for url in (
+            reverse('posts:index'),
+            reverse('posts:profile', args=[self.user.username]),
+            reverse('posts:post_detail', args=[self.post.pk]),
+        ):
+            with self.subTest(url=url):
+                response, replica_queries = self.get(url)
+                self.assertEqual(response.status_code, 200)
+                self.assertGreater(replica_queries, 0)
+
+    def test_replica_lags_until_sync(self):
+        """Реплика не видит записей до следующего копирования."""
+        Post.objects.create(author=self.user, text='Свежий пост')
+        response, _ = self.get(reverse('posts:index'))
+        self.assertNotContains(response, 'Свежий пост')
+        cache.clear()
+        self.sync()
+        response, _ = self.get(reverse('posts:index'))
+        self.assertContains(response, 'Свежий пост')
+
+    @override_settings(REPLICA_MAX_LAG=60)
+    def test_cache_fills_from_primary_after_change(self):
+        """Пока реплика может отставать, ленты и их фрагменты в кэше
+        берутся из основной базы.
+        """
+        Post.objects.create(author=self.user, text='Свежий пост')
+        response, replica_queries = self.get(reverse('posts:index'))
+        self.assertEqual(replica_queries, 0)
+        self.assertContains(response, 'Свежий пост')
+        with override_settings(REPLICA_MAX_LAG=0):
+            self.sync()
+            response, replica_queries = self.get(reverse('posts:index'))
+        self.assertGreater(replica_queries, 0)
+        self.assertContains(response, 'Свежий пост')
+
+    def test_other_views_use_primary(self):
+        """Остальные страницы и сессии читают из основной базы."""
+        _, replica_queries = self.get(reverse('posts:post_create'))
+        self.assertEqual(replica_queries, 0)
+
+    def test_reads_stick_to_primary_after_write(self):
+        """После записи ленты читаются из основной базы по cookie."""
+        response = self.client.post(
+            reverse('posts:add_comment', args=[self.post.pk]),
+            {'text': 'Комментарий'},
+        )
+        self.assertIn('read_primary', response.cookies)
+        _, replica_queries = self.get(reverse('posts:index'))
+        self.assertEqual(replica_queries, 0)
+        del self.client.cookies['read_primary']
+        _, replica_queries = self.get(reverse('posts:index'))
+        self.assertGreater(replica_queries, 0)
@@ -0,0 +1,111 @@
+import os
+import tempfile
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from core import metrics
+from posts.models import Post
+
+User = get_user_model()
+
+
+class MetricsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='author')
+        Post.objects.create(author=cls.user, text='Пост')
+
+    def setUp(self):
+        cache.clear()
+        metrics.reset()
+        self.client = Client()
+
+    def test_requests_labelled_by_url_name(self):
+        """Запросы, время и число запросов к базе — по имени адреса."""
+        self.client.get(reverse('posts:index'))
+        self.client.get(reverse('about:author'))
+        self.client.get('/no-such-page/')
+        text = self.client.get(reverse('metrics')).content.decode()
+        self.assertIn(
+            'yatube_http_requests_total{method="GET",status="200",'
+            'view="posts:index"} 1', text
+        )
+        self.assertIn('view="about:author"', text)
+        self.assertIn('view="unmatched"', text)
+        self.assertIn(
+            'yatube_http_request_duration_seconds_bucket'
+            '{view="posts:index",le="+Inf"} 1', text
+        )
+        self.assertIn('yatube_db_queries_count{view="posts:index"} 1', text)
+
+    def test_page_cache_hit_labelled_by_url_name(self):
+        """Ответ из кэша страниц учитывается под именем адреса."""
+        url = reverse('posts:index')
+        self.client.get(url)
+        self.assertEqual(self.client.get(url)['X-Page-Cache'], 'HIT')
+        text = self.client.get(reverse('metrics')).content.decode()
+        self.assertIn(
+            'yatube_http_requests_total{method="GET",status="200",'
+            'view="posts:index"} 2', text
+        )
+        self.assertNotIn('view="unmatched"', text)
+
+    def test_fragment_cache_hit_ratio(self):
+        """Доля попаданий в кэш фрагментов считается по счётчикам."""
+        self.client.force_login(self.user)
+        url = reverse('posts:follow_index')
+        self.client.get(url)
+        self.client.get(url)
+        text = self.client.get(reverse('metrics')).content.decode()
+        self.assertIn(
+            'yatube_fragment_cache_hit_ratio{fragment="follow_index"} 0.5',
+            text
+        )
+
+    def test_processes_aggregated_through_files(self):
+        """Счётчики других процессов складываются из файлов METRICS_DIR."""
+        with tempfile.TemporaryDirectory() as directory, \
+                override_settings(METRICS_DIR=directory):
+            metrics.inc('yatube_http_requests_total', view='posts:index',
+                        method='GET', status='200')
+            shard = metrics.Shard()
+            shard.name = 'other-process'
+            shard.counters.update(metrics._shard().counters)
+            shard.flush(directory)
+            samples = metrics.collect()
+        key = (
+            'yatube_http_requests_total', 'yatube_http_requests_total',
+            (('method', 'GET'), ('status', '200'), ('view', 'posts:index')),
+        )
+        self.assertEqual(samples[key], 2)
+
+    def test_forked_workers_keep_own_files(self):
+        """Воркеры, созданные fork после импорта, пишут свои файлы и не
+        повторяют счётчики родителя.
+        """
+        with tempfile.TemporaryDirectory() as directory, \
+                override_settings(METRICS_DIR=directory):
+            metrics.inc('yatube_http_requests_total', view='posts:index',
+                        method='GET', status='200')
+            for _ in range(3):
+                pid = os.fork()
+                if pid == 0:
+                    try:
+                        metrics.inc(
+                            'yatube_http_requests_total', view='posts:index',
+                            method='GET', status='200',
+                        )
+                        metrics._shard().flush(directory)
+                    finally:
+                        os._exit(0)
+                os.waitpid(pid, 0)
+            samples = metrics.collect()
+            self.assertEqual(len(os.listdir(directory)), 3)
+        key = (
+            'yatube_http_requests_total', 'yatube_http_requests_total',
+            (('method', 'GET'), ('status', '200'), ('view', 'posts:index')),
+        )
+        self.assertEqual(samples[key], 4)
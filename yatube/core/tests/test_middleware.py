@@ -0,0 +1,48 @@
+import json
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from posts.models import Post
+
+User = get_user_model()
+
+
+class RequestTimingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='author')
+        Post.objects.create(author=cls.user, text='Пост')
+
+    def setUp(self):
+        cache.clear()
+
+    def test_disabled_by_default(self):
+        """Без REQUEST_TIMING заголовка нет."""
+        response = Client().get(reverse('posts:index'))
+        self.assertFalse(response.has_header('Server-Timing'))
+
+    @override_settings(REQUEST_TIMING=True, SLOW_REQUEST_MS=10 ** 6)
+    def test_server_timing_header(self):
+        """Server-Timing содержит SQL с числом запросов, шаблоны и итог."""
+        response = Client().get(reverse('posts:index'))
+        header = response['Server-Timing']
+        self.assertRegex(header, r'^sql;dur=[\d.]+;desc="[1-9]\d* queries"')
+        self.assertIn('template;dur=', header)
+        self.assertRegex(header, r'total;dur=[\d.]+$')
+
+    @override_settings(REQUEST_TIMING=True, SLOW_REQUEST_MS=0)
+    def test_slow_request_log(self):
+        """Медленный запрос попадает в журнал с именем адреса."""
+        url = reverse('posts:profile', args=[self.user.username])
+        with self.assertLogs('yatube.slow_requests', 'WARNING') as logs:
+            Client().get(url)
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual(record['url_name'], 'posts:profile')
+        self.assertEqual(record['status'], 200)
+        self.assertGreater(record['queries'], 0)
+        self.assertGreaterEqual(
+            record['total_ms'], record['sql_ms'] + record['template_ms']
+        )
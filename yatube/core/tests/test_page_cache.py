@@ -0,0 +1,75 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, RequestFactory, TestCase
+from django.urls import reverse
+
+from core import page_cache
+from posts.models import Comment, Post
+
+User = get_user_model()
+
+
+class AnonymousPageCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='author')
+        cls.post = Post.objects.create(author=cls.user, text='Пост')
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+
+    def test_anonymous_page_served_from_cache(self):
+        """Повторный анонимный запрос обходится без базы."""
+        url = reverse('posts:post_detail', args=[self.post.pk])
+        self.assertEqual(self.guest_client.get(url)['X-Page-Cache'], 'MISS')
+        with self.assertNumQueries(0):
+            response = self.guest_client.get(url)
+        self.assertEqual(response['X-Page-Cache'], 'HIT')
+        self.assertContains(response, 'Пост')
+
+    def test_query_params_vary_page(self):
+        """Страницы ленты различаются только значимыми параметрами."""
+        url = reverse('posts:index')
+        self.guest_client.get(url, {'page': 1})
+        response = self.guest_client.get(url, {'page': 1, 'utm': 'x'})
+        self.assertEqual(response['X-Page-Cache'], 'HIT')
+        response = self.guest_client.get(url, {'page': 2})
+        self.assertEqual(response['X-Page-Cache'], 'MISS')
+
+    def test_logged_in_users_bypass_cache(self):
+        client = Client()
+        client.force_login(self.user)
+        url = reverse('posts:index')
+        client.get(url)
+        self.assertFalse(client.get(url).has_header('X-Page-Cache'))
+
+    def test_writes_purge_affected_pages(self):
+        """Новый комментарий и пост сбрасывают страницы, где они видны."""
+        post_url = reverse('posts:post_detail', args=[self.post.pk])
+        profile_url = reverse('posts:profile', args=[self.user.username])
+        self.guest_client.get(post_url)
+        self.guest_client.get(profile_url)
+        Comment.objects.create(
+            author=self.user, post=self.post, text='Комментарий'
+        )
+        response = self.guest_client.get(post_url)
+        self.assertEqual(response['X-Page-Cache'], 'MISS')
+        self.assertContains(response, 'Комментарий')
+        Post.objects.create(author=self.user, text='Второй пост')
+        response = self.guest_client.get(profile_url)
+        self.assertContains(response, 'Второй пост')
+
+    def test_stale_page_served_while_rerendering(self):
+        """Пока страницу перерисовывает другой запрос, отдаётся старая."""
+        url = reverse('posts:index')
+        self.guest_client.get(url)
+        page_cache.purge(url)
+        key = page_cache.entry_key(RequestFactory().get(url))
+        self.assertTrue(page_cache.acquire(key))
+        with self.assertNumQueries(0):
+            response = self.guest_client.get(url)
+        self.assertEqual(response['X-Page-Cache'], 'STALE')
+        page_cache.release(key)
+        response = self.guest_client.get(url)
+        self.assertEqual(response['X-Page-Cache'], 'MISS')
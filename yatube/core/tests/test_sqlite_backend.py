@@ -0,0 +1,24 @@
+from django.db import connection
+from django.test import TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+
+from core.transactions import write_transaction
+
+
+class SqliteBackendTests(TransactionTestCase):
+    def test_pragmas_applied_to_new_connection(self):
+        """PRAGMA из OPTIONS выполняются при открытии соединения."""
+        connection.close()
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA busy_timeout')
+            self.assertEqual(cursor.fetchone()[0], 5000)
+            cursor.execute('PRAGMA synchronous')
+            # 1 — NORMAL
+            self.assertEqual(cursor.fetchone()[0], 1)
+
+    def test_write_transaction_begins_immediate(self):
+        """Транзакция записи сразу берёт блокировку: BEGIN IMMEDIATE."""
+        with CaptureQueriesContext(connection) as queries:
+            with write_transaction():
+                pass
+        self.assertEqual(queries[0]['sql'], 'BEGIN IMMEDIATE')
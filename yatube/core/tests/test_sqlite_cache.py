@@ -0,0 +1,87 @@
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+
+from django.test import SimpleTestCase
+
+from core.sqlite_cache import SQLiteCache
+
+
+def incr_many(path, times):
+    cache = SQLiteCache(path, {})
+    for _ in range(times):
+        cache.incr('counter')
+
+
+class SQLiteCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'cache.sqlite3')
+        self.cache = self.make_cache()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def make_cache(self, **options):
+        return SQLiteCache(self.path, {'OPTIONS': options})
+
+    def test_values_shared_between_instances(self):
+        """Запись одного экземпляра видна другому: общий файл."""
+        self.cache.set_many({'a': {'x': 1}, 'b': True, 'c': 3})
+        other = self.make_cache()
+        self.assertEqual(
+            other.get_many(['a', 'b', 'c', 'd']),
+            {'a': {'x': 1}, 'b': True, 'c': 3},
+        )
+        self.assertIs(other.get('b'), True)
+        other.delete('a')
+        self.assertIsNone(self.cache.get('a'))
+
+    def test_add_replaces_only_expired(self):
+        """add не трогает живую запись, но заменяет просроченную."""
+        self.assertTrue(self.cache.add('key', 'first'))
+        self.assertFalse(self.cache.add('key', 'second'))
+        self.cache.set('key', 'old', 0.01)
+        time.sleep(0.02)
+        self.assertFalse(self.cache.has_key('key'))
+        self.assertTrue(self.cache.add('key', 'new'))
+        self.assertEqual(self.cache.get('key'), 'new')
+
+    def test_incr(self):
+        """incr увеличивает число и требует существующий ключ."""
+        self.cache.set('counter', 10)
+        self.assertEqual(self.cache.incr('counter', 5), 15)
+        with self.assertRaises(ValueError):
+            self.cache.incr('missing')
+
+    def test_incr_atomic_across_processes(self):
+        """Параллельные incr из разных процессов не теряются."""
+        self.cache.set('counter', 0)
+        processes = [
+            multiprocessing.Process(target=incr_many, args=(self.path, 50))
+            for _ in range(4)
+        ]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+        self.assertEqual(self.cache.get('counter'), 200)
+
+    def test_evicts_least_recently_read(self):
+        """При превышении MAX_BYTES вытесняются давно не читанные."""
+        cache = self.make_cache(MAX_BYTES=10000, ACCESS_RESOLUTION=0)
+        for number in range(5):
+            cache.set(f'key{number}', 'x' * 1000)
+        cache.get('key0')
+        for number in range(5, 12):
+            cache.set(f'key{number}', 'x' * 1000)
+        self.assertIsNotNone(cache.get('key0'))
+        self.assertIsNone(cache.get('key1'))
+        usage = cache._connection().execute(
+            'SELECT bytes, (SELECT SUM(size) FROM cache_entries) '
+            'FROM cache_usage'
+        ).fetchone()
+        self.assertEqual(usage[0], usage[1])
+        self.assertLessEqual(usage[0], 10000)
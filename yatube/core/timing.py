@@ -0,0 +1,84 @@
+"""Замер запроса по частям: SQL, рендер шаблонов, миниатюры.
+
+Таймер запроса хранится в threading.local. Его включает
+MetricsMiddleware на каждый запрос ради числа SQL-запросов, а
+RequestTimingMiddleware, если он подключён, ставит свой таймер раньше, и
+MetricsMiddleware берёт его. Вне запроса, например в командах и
+фоновых потоках, таймера нет и ``measure`` ничего не делает. Время
+частей не пересекается: из рендера шаблона вычитаются выполненные в нём
+SQL-запросы и миниатюры, поэтому части складываются в общее время.
+"""
+import threading
+import time
+from collections import defaultdict
+from contextlib import ExitStack, contextmanager
+
+from django.db import connections
+
+_local = threading.local()
+
+
+class RequestTimer:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.finished = None
+        self.queries = 0
+        self.durations = defaultdict(float)
+        # [начало, время вложенных замеров] для открытых частей
+        self._stack = []
+
+    @contextmanager
+    def span(self, name):
+        frame = [time.perf_counter(), 0.0]
+        self._stack.append(frame)
+        try:
+            yield
+        finally:
+            self._stack.pop()
+            elapsed = time.perf_counter() - frame[0]
+            self.durations[name] += elapsed - frame[1]
+            if self._stack:
+                self._stack[-1][1] += elapsed
+
+    def __call__(self, execute, sql, params, many, context):
+        """Обёртка execute_wrapper для всех соединений с базой."""
+        self.queries += 1
+        with self.span('sql'):
+            return execute(sql, params, many, context)
+
+    def stop(self):
+        self.finished = time.perf_counter()
+
+    @property
+    def total(self):
+        return (self.finished or time.perf_counter()) - self.started
+
+
+def current():
+    return getattr(_local, 'timer', None)
+
+
+@contextmanager
+def measure(name):
+    """Относит время блока к части name, если запрос замеряется."""
+    timer = current()
+    if timer is None:
+        yield
+        return
+    with timer.span(name):
+        yield
+
+
+@contextmanager
+def request_timer():
+    """Замеряет блок: SQL всех соединений и части из ``measure``."""
+    timer = RequestTimer()
+    _local.timer = timer
+    try:
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(timer))
+            yield timer
+    finally:
+        timer.stop()
+        _local.timer = None
@@ -0,0 +1,35 @@
+"""Короткие транзакции записи.
+
+В SQLite пишет один процесс за раз, остальные ждут busy_timeout,
+опрашивая блокировку. Потоки одного процесса в этой гонке могут
+подолгу проигрывать друг другу, поэтому write_transaction сначала
+ставит их в очередь на блокировку процесса, а уже потом открывает
+транзакцию. В транзакции должны быть только запросы: файлы, картинки и
+прочие медленные операции выполняются до неё.
+"""
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+
+_locks = defaultdict(threading.RLock)
+_locks_lock = threading.Lock()
+
+
+def _lock(using):
+    with _locks_lock:
+        return _locks[using]
+
+
+@contextmanager
+def write_transaction(using=DEFAULT_DB_ALIAS):
+    """transaction.atomic, в котором потоки процесса пишут по очереди."""
+    connection = connections[using]
+    if connection.vendor != 'sqlite' or not settings.SQLITE_SERIALIZE_WRITES:
+        with transaction.atomic(using):
+            yield
+        return
+    with _lock(using), transaction.atomic(using):
+        yield
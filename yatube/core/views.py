@@ -1,4 +1,8 @@
-﻿from django.shortcuts import render
+﻿from django.http import HttpResponse
+from django.shortcuts import render
+from django.views.decorators.cache import never_cache
+
+from core import metrics
 
 
 def page_not_found(request, exception):
@@ -17,3 +21,13 @@ def permission_denied(request, exception):
 
 def csrf_failure(request, reason=''):
     return render(request, 'core/403csrf.html')
+
+
+@never_cache
+def metrics_view(request):
+    """Метрики всех процессов в текстовом формате Prometheus."""
+    samples = metrics.add_hit_ratios(metrics.collect())
+    return HttpResponse(
+        metrics.render(samples),
+        content_type='text/plain; version=0.0.4; charset=utf-8',
+    )
@@ -1,6 +1,8 @@
-from django.contrib import admin
+from django.conf import settings
+from django.contrib import admin, messages
 
 from .models import Group, Post
+from .search import search_ids
 
 
 class PostAdmin(admin.ModelAdmin):
@@ -10,6 +12,19 @@ class PostAdmin(admin.ModelAdmin):
     list_editable = ('group',)
     empty_value_display = '-пусто-'
 
+    def get_search_results(self, request, queryset, search_term):
+        # Ищем по полнотекстовому индексу, а не LIKE '%...%' по таблице
+        if not search_term.strip():
+            return queryset, False
+        limit = settings.SEARCH_ADMIN_LIMIT
+        ids = search_ids(search_term, limit)
+        if len(ids) >= limit:
+            messages.warning(
+                request,
+                f'Показаны {limit} самых релевантных постов: уточните запрос.',
+            )
+        return queryset.filter(pk__in=ids), False
+
 
 admin.site.register(Post, PostAdmin)
 admin.site.register(Group)
@@ -0,0 +1,107 @@
+"""Поколения (версии) содержимого для ключей фрагментного кэша.
+
+Номер поколения входит в ключ фрагмента, поэтому фрагмент можно хранить
+долго: при изменении содержимого сигналы увеличивают номер, и следующий
+рендер просто попадает в новый ключ. Старые фрагменты вытесняются сами.
+
+Области: ``feed`` — общая лента, ``group``/``author``/``post`` —
+страницы конкретной группы, автора и поста, ``timeline`` — лента
+подписок пользователя, ``following`` — его подписки в графе подписок,
+``suggestions`` — расчёт подсказок «на кого подписаться».
+"""
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+
+from core import db_routers
+
+PREFIX = 'generation'
+TIMEOUT = None
+
+
+def make_key(scope, pk=None):
+    if pk is None:
+        return f'{PREFIX}:{scope}'
+    return f'{PREFIX}:{scope}:{pk}'
+
+
+def _initial():
+    # Если номер вытеснен из кэша, новый начинается с текущего времени,
+    # чтобы не совпасть с номером уже закэшированного старого фрагмента
+    return time.time_ns()
+
+
+def get(scope, pk=None):
+    key = make_key(scope, pk)
+    value = cache.get(key)
+    if value is None:
+        value = _initial()
+        if not cache.add(key, value, TIMEOUT):
+            value = cache.get(key, value)
+    return value
+
+
+def get_many(scope, pks):
+    """Номера поколений для нескольких объектов за один запрос к кэшу."""
+    keys = {pk: make_key(scope, pk) for pk in pks}
+    found = cache.get_many(keys.values())
+    values = {}
+    for pk, key in keys.items():
+        if key not in found:
+            found[key] = get(scope, pk)
+        values[pk] = found[key]
+    return values
+
+
+def bump(scope, pk=None):
+    key = make_key(scope, pk)
+    try:
+        return cache.incr(key)
+    except ValueError:
+        value = _initial()
+        cache.set(key, value, TIMEOUT)
+        return value
+
+
+def invalidate(*scopes):
+    """Увеличивает поколения сейчас и ещё раз после коммита транзакции.
+
+    Второй сдвиг нужен, чтобы рендер, успевший между первым сдвигом и
+    коммитом прочитать старые данные, не остался в кэше под новым ключом.
+    """
+    def bump_all():
+        for scope in scopes:
+            bump(*scope)
+        db_routers.data_changed()
+
+    bump_all()
+    if transaction.get_connection().in_atomic_block:
+        transaction.on_commit(bump_all)
+
+
+def invalidate_many(scope, pks):
+    """Сбрасывает поколения многих объектов одним delete_many.
+
+    После удаления номер начнётся заново со значения текущего времени,
+    то есть ключи всех прежних фрагментов перестанут совпадать.
+    """
+    keys = [make_key(scope, pk) for pk in pks]
+    if not keys:
+        return
+
+    def delete_all():
+        cache.delete_many(keys)
+        db_routers.data_changed()
+
+    delete_all()
+    if transaction.get_connection().in_atomic_block:
+        transaction.on_commit(delete_all)
+
+
+def post_scopes(post, old_group_id=None):
+    """Области, в которых показан пост."""
+    scopes = [('feed',), ('author', post.author_id), ('post', post.pk)]
+    for group_id in {post.group_id, old_group_id} - {None}:
+        scopes.append(('group', group_id))
+    return scopes
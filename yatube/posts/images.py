@@ -0,0 +1,198 @@
+"""Фоновая нарезка картинок постов на варианты для srcset.
+
+После сохранения поста с новой картинкой задача уходит в пул процессов:
+воркер читает исходник, уменьшает его до ширин из
+settings.IMAGE_VARIANT_WIDTHS в каждом формате из
+settings.IMAGE_VARIANT_FORMATS и возвращает размеры и имена файлов.
+Основной процесс записывает их в ImageVariant, и шаблоны строят
+srcset/width/height из базы, не открывая картинку в запросе.
+Пока вариантов нет, шаблон по-старому показывает миниатюру sorl.
+"""
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+from PIL import Image, features
+
+from . import generations
+from .models import ImageVariant, Post
+
+VARIANTS_DIR = 'posts/variants'
+EXTENSIONS = {'JPEG': 'jpg', 'WEBP': 'webp', 'PNG': 'png'}
+MIME_TYPES = {'JPEG': 'image/jpeg', 'WEBP': 'image/webp', 'PNG': 'image/png'}
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def supported_formats():
+    formats = settings.IMAGE_VARIANT_FORMATS
+    if not features.check('webp'):
+        formats = [fmt for fmt in formats if fmt != 'WEBP']
+    return formats
+
+
+def fit(size, width):
+    """Размер картинки, вписанной в рамку IMAGE_VARIANT_BOX ширины width.
+
+    Рамка та же, что у миниатюры «960x339» в шаблонах, только
+    пропорционально уменьшенная; картинка при этом может увеличиться.
+    """
+    box_width, box_height = settings.IMAGE_VARIANT_BOX
+    box = (width, box_height * width / box_width)
+    ratio = min(box[0] / size[0], box[1] / size[1])
+    return max(1, round(size[0] * ratio)), max(1, round(size[1] * ratio))
+
+
+def variant_name(name, width, fmt):
+    stem = os.path.splitext(os.path.basename(name))[0]
+    return f'{VARIANTS_DIR}/{stem}_{width}.{EXTENSIONS[fmt]}'
+
+
+def _encode(image, fmt):
+    if fmt == 'JPEG' and image.mode != 'RGB':
+        image = image.convert('RGB')
+    buffer = BytesIO()
+    image.save(buffer, fmt, quality=settings.IMAGE_VARIANT_QUALITY)
+    return buffer.getvalue()
+
+
+def render_variants(name):
+    """Нарезает картинку name на варианты. Выполняется в воркере пула.
+
+    Воркер только читает исходник и кодирует варианты: файлы и строки
+    базы записывает основной процесс (хранилище ведёт счётчики ссылок
+    в базе, а соединения родителя в дочернем процессе трогать нельзя).
+    Возвращает список словарей с полями ImageVariant и содержимым файла;
+    если исходник не читается как картинка, список пустой.
+    """
+    try:
+        with default_storage.open(name) as source:
+            image = Image.open(source)
+            image.load()
+    except (OSError, ValueError):
+        return []
+    if image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA' if 'transparency' in image.info
+                              else 'RGB')
+    variants = {}
+    for width in settings.IMAGE_VARIANT_WIDTHS:
+        size = fit(image.size, width)
+        resized = image.resize(size, Image.LANCZOS)
+        for fmt in supported_formats():
+            # У крошечных исходников разные ширины рамки могут дать после
+            # округления один и тот же размер: такие дубли отбрасываем
+            variants[fmt, size[0]] = {
+                'file': variant_name(name, width, fmt),
+                'content': _encode(resized, fmt),
+                'format': fmt,
+                'width': size[0],
+                'height': size[1],
+            }
+    return list(variants.values())
+
+
+def store_variants(post_id, name, variants):
+    """Записывает варианты, если у поста всё ещё та же картинка."""
+    with transaction.atomic():
+        post = (
+            Post.objects.select_for_update()
+            .filter(pk=post_id, image=name).first()
+        )
+        if post is None:
+            return
+        ImageVariant.objects.filter(post_id=post_id).delete()
+        rows = []
+        for row in variants:
+            row = dict(row)
+            content = ContentFile(row.pop('content'))
+            row['file'] = default_storage.save(row['file'], content)
+            rows.append(ImageVariant(post_id=post_id, **row))
+        ImageVariant.objects.bulk_create(rows)
+        # Сдвиг поколений до записи в posts_post: обращения к общему
+        # кэшу не должны удлинять блокировку таблицы постов
+        generations.invalidate(*generations.post_scopes(post))
+        # Картинка в карточке поста сменилась на <picture> с вариантами
+        Post.objects.filter(pk=post_id).update(updated_at=timezone.now())
+
+
+def _init_worker():
+    # При запуске воркера через spawn Django ещё не настроен
+    import django
+    django.setup()
+
+
+def executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(
+                max_workers=settings.IMAGE_VARIANT_WORKERS,
+                initializer=_init_worker,
+            )
+        return _executor
+
+
+def _job_done(post_id, name, future):
+    # Колбэк выполняется в служебном потоке пула, у него своё соединение
+    try:
+        if future.exception() is None:
+            store_variants(post_id, name, future.result())
+    finally:
+        close_old_connections()
+
+
+def process(post_id, name):
+    """Нарезает картинку сразу или отдаёт задачу пулу процессов."""
+    if not settings.IMAGE_VARIANT_WORKERS:
+        store_variants(post_id, name, render_variants(name))
+        return
+    future = executor().submit(render_variants, name)
+    future.add_done_callback(partial(_job_done, post_id, name))
+
+
+def enqueue(post):
+    """Ставит нарезку картинки поста в очередь после коммита."""
+    if not post.image:
+        ImageVariant.objects.filter(post_id=post.pk).delete()
+        return
+    transaction.on_commit(partial(process, post.pk, post.image.name))
+
+
+def srcset(variants):
+    return ', '.join(f'{variant.file.url} {variant.width}w'
+                     for variant in variants)
+
+
+def picture(post):
+    """Данные для <picture>: источники по форматам и запасной <img>.
+
+    Читает post.image_variants.all(), поэтому при prefetch_related
+    обходится без запросов.
+    """
+    by_format = {}
+    for variant in post.image_variants.all():
+        by_format.setdefault(variant.format, []).append(variant)
+    if not by_format:
+        return None
+    fallback_format = next(
+        (fmt for fmt in ('JPEG', 'PNG') if fmt in by_format),
+        next(iter(by_format)),
+    )
+    fallback = by_format.pop(fallback_format)
+    return {
+        'sources': [
+            {'type': MIME_TYPES[fmt], 'srcset': srcset(variants)}
+            for fmt, variants in by_format.items()
+        ],
+        'img': fallback[-1],
+        'srcset': srcset(fallback),
+        'sizes': settings.IMAGE_VARIANT_SIZES,
+    }
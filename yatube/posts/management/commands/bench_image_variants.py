@@ -0,0 +1,82 @@
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+from django.core.management.base import BaseCommand, CommandError
+from django.test import override_settings
+from PIL import Image
+
+from posts.images import render_variants, supported_formats
+
+
+def synthetic_image(size, seed):
+    """JPEG с шумом: сжимается и уменьшается как настоящая фотография."""
+    image = Image.effect_noise(size, 40 + seed % 40).convert('RGB')
+    buffer = BytesIO()
+    image.save(buffer, 'JPEG', quality=90)
+    return ContentFile(buffer.getvalue())
+
+
+class Command(BaseCommand):
+    help = (
+        'Измеряет пропускную способность нарезки вариантов картинок '
+        'на синтетических изображениях при разном размере пула.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--images', type=int, default=50)
+        parser.add_argument(
+            '--size', default='1920x1080',
+            help='Размер исходников, ШИРИНАxВЫСОТА.'
+        )
+        parser.add_argument(
+            '--workers', default='0,1,2,4',
+            help='Размеры пула через запятую; 0 — в текущем процессе.'
+        )
+
+    def handle(self, *args, **options):
+        try:
+            size = tuple(int(side) for side in options['size'].split('x'))
+            workers = [int(count) for count in options['workers'].split(',')]
+        except ValueError:
+            raise CommandError('Неверный формат --size или --workers.')
+        # Исходники пишет обычное файловое хранилище: основное ведёт
+        # строки StoredFile в базе, и замер оставил бы их в рабочей базе.
+        # Воркеры читают их через MEDIA_ROOT, унаследованный при fork
+        with tempfile.TemporaryDirectory() as media_root, \
+                override_settings(MEDIA_ROOT=media_root):
+            storage = FileSystemStorage(location=media_root)
+            names = [
+                storage.save(
+                    f'posts/bench_{number}.jpg',
+                    synthetic_image(size, number),
+                )
+                for number in range(options['images'])
+            ]
+            per_image = (len(settings.IMAGE_VARIANT_WIDTHS)
+                         * len(supported_formats()))
+            self.stdout.write(
+                f'{len(names)} картинок {size[0]}x{size[1]}, '
+                f'вариантов на картинку: {per_image}'
+            )
+            for count in workers:
+                elapsed = self.run(names, count)
+                self.stdout.write(
+                    f'workers={count}: {elapsed:.2f} с, '
+                    f'{len(names) / elapsed:.1f} картинок/с, '
+                    f'{len(names) * per_image / elapsed:.1f} вариантов/с'
+                )
+
+    @staticmethod
+    def run(names, workers):
+        started = time.perf_counter()
+        if workers:
+            with ProcessPoolExecutor(workers) as pool:
+                list(pool.map(render_variants, names))
+        else:
+            list(map(render_variants, names))
+        return time.perf_counter() - started
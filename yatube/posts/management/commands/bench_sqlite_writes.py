@@ -0,0 +1,170 @@
+import os
+import random
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, OperationalError, connection
+from django.test import override_settings
+
+from core.transactions import write_transaction
+from posts.management.commands.bench_views import (percentile,
+                                                   temporary_caches)
+from posts.models import Comment, Post, User
+from posts.synthetic import generate
+from posts.views import index_posts, post_comment_list
+
+# Как жила база до настройки: журнал отката, BEGIN DEFERRED и гонка
+# потоков за блокировку записи
+BASELINE = {
+    'options': {
+        'pragmas': {'journal_mode': 'DELETE', 'busy_timeout': 5000},
+        'transaction_mode': 'DEFERRED',
+    },
+    'serialize': False,
+}
+
+
+class Worker(threading.Thread):
+    """Поток, который повторяет действие до сигнала остановки."""
+
+    def __init__(self, action, stop):
+        super().__init__(daemon=True)
+        self.action = action
+        self.stop = stop
+        self.latencies = []
+        self.errors = 0
+
+    def run(self):
+        try:
+            while not self.stop.is_set():
+                started = time.perf_counter()
+                try:
+                    self.action()
+                except OperationalError:
+                    self.errors += 1
+                    continue
+                self.latencies.append(time.perf_counter() - started)
+        finally:
+            connection.close()
+
+
+class Command(BaseCommand):
+    help = (
+        'Нагружает файл SQLite записью комментариев из нескольких потоков '
+        'при разном числе читающих потоков. Печатает записи и чтения в '
+        'секунду, задержку записи и число ошибок «database is locked» '
+        'для настроенного профиля и, с --baseline, для исходного.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--readers', default='0,4,16',
+            help='Числа читающих потоков через запятую.'
+        )
+        parser.add_argument('--writers', type=int, default=4)
+        parser.add_argument(
+            '--seconds', type=float, default=5,
+            help='Длительность каждого замера.'
+        )
+        parser.add_argument('--posts', type=int, default=2000)
+        parser.add_argument(
+            '--baseline', action='store_true',
+            help='Повторить замер без WAL, PRAGMA и очереди записи.'
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('Замер только для SQLite.')
+        try:
+            readers = [int(count) for count in options['readers'].split(',')]
+        except ValueError:
+            raise CommandError('Неверный формат --readers.')
+        profiles = {'tuned': {
+            'options': dict(connection.settings_dict['OPTIONS']),
+            'serialize': settings.SQLITE_SERIALIZE_WRITES,
+        }}
+        if options['baseline']:
+            profiles['baseline'] = BASELINE
+        with tempfile.TemporaryDirectory() as directory, temporary_caches():
+            # Тестовая база в файле: WAL и блокировки работают как в бою
+            settings_dict = connection.settings_dict
+            settings_dict['TEST']['NAME'] = os.path.join(directory, 'bench.db')
+            old_name = settings_dict['NAME']
+            old_options = settings_dict['OPTIONS']
+            connection.creation.create_test_db(verbosity=0, autoclobber=True)
+            try:
+                generate(users=100, groups=5, posts=options['posts'],
+                         follows=500, comments=options['posts'])
+                for name, profile in profiles.items():
+                    settings_dict['OPTIONS'] = profile['options']
+                    with override_settings(
+                        SQLITE_SERIALIZE_WRITES=profile['serialize']
+                    ):
+                        for count in readers:
+                            self.report(name, count, self.measure(
+                                count, options['writers'], options['seconds']
+                            ))
+            finally:
+                settings_dict['OPTIONS'] = old_options
+                connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    def measure(self, readers, writers, seconds):
+        # Новые PRAGMA применяются к новым соединениям
+        connection.close()
+        post_ids = list(Post.objects.values_list('pk', flat=True))
+        user_ids = list(User.objects.values_list('pk', flat=True))
+        connection.close()
+        rng = random.Random(0)
+
+        def write():
+            with write_transaction(DEFAULT_DB_ALIAS):
+                Comment.objects.create(
+                    post_id=rng.choice(post_ids),
+                    author_id=rng.choice(user_ids),
+                    text='Комментарий под нагрузкой',
+                )
+
+        def read():
+            list(index_posts()[:settings.PAGES])
+            list(post_comment_list(rng.choice(post_ids))[:20])
+
+        stop = threading.Event()
+        threads = (
+            [Worker(write, stop) for _ in range(writers)]
+            + [Worker(read, stop) for _ in range(readers)]
+        )
+        for thread in threads:
+            thread.start()
+        time.sleep(seconds)
+        stop.set()
+        for thread in threads:
+            thread.join()
+        write_latencies = [
+            value for thread in threads[:writers]
+            for value in thread.latencies
+        ]
+        return {
+            'writes': len(write_latencies) / seconds,
+            'reads': sum(
+                len(thread.latencies) for thread in threads[writers:]
+            ) / seconds,
+            'p50': percentile(write_latencies, 50),
+            'p99': percentile(write_latencies, 99),
+            'errors': sum(thread.errors for thread in threads),
+        }
+
+    def report(self, profile, readers, result):
+        if result['p50'] is None:
+            latency = 'записей нет'
+        else:
+            latency = (f'запись p50 {result["p50"] * 1000:.1f} мс, '
+                       f'p99 {result["p99"] * 1000:.1f} мс')
+        self.stdout.write(
+            f'{profile}, читателей {readers}: '
+            f'{result["writes"]:.0f} записей/с, '
+            f'{result["reads"]:.0f} чтений/с, {latency}, '
+            f'ошибок блокировки {result["errors"]}'
+        )
@@ -0,0 +1,233 @@
+import json
+import os
+import random
+import tempfile
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from posts.models import Group, Post
+from posts.synthetic import generate
+
+User = get_user_model()
+
+VIEWS = (
+    'posts:index', 'posts:group_list', 'posts:profile',
+    'posts:post_detail', 'posts:follow_index',
+)
+PERCENTILES = (50, 95, 99)
+
+
+def percentile(values, rank):
+    """Процентиль по ближайшему рангу."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = max(0, -(-rank * len(ordered) // 100) - 1)
+    return ordered[index]
+
+
+class QueryTimer:
+    """Обёртка execute: число запросов и время в SQL."""
+
+    def __init__(self):
+        self.count = 0
+        self.time = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.time += time.perf_counter() - started
+
+
+@contextmanager
+def temporary_caches():
+    """Кэши из CACHES во временном каталоге на время замера.
+
+    Замер очищает и заполняет кэши своей тестовой базы; кэш работающего
+    сервера он не трогает.
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        relocated = {
+            alias: {
+                **config,
+                'LOCATION': os.path.join(
+                    directory, os.path.basename(config.get('LOCATION', alias))
+                ),
+            }
+            for alias, config in settings.CACHES.items()
+        }
+        with override_settings(CACHES=relocated):
+            yield
+
+
+def summary(samples):
+    result = {'requests': len(samples)}
+    for name in ('total_ms', 'sql_ms', 'queries'):
+        values = [sample[name] for sample in samples]
+        for rank in PERCENTILES:
+            result[f'{name}_p{rank}'] = round(percentile(values, rank), 3)
+        result[f'{name}_mean'] = round(sum(values) / len(values), 3)
+    result['errors'] = sum(sample['status'] >= 400 for sample in samples)
+    return result
+
+
+class Command(BaseCommand):
+    help = (
+        'Создаёт синтетические данные в отдельной тестовой базе и '
+        'прогоняет через тестовый клиент смесь запросов к страницам '
+        'posts, с кэшами во временном каталоге. Печатает JSON с '
+        'p50/p95/p99 времени, числа запросов и времени SQL по каждому '
+        'представлению.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--groups', type=int, default=20)
+        parser.add_argument('--posts', type=int, default=20000)
+        parser.add_argument('--follows', type=int, default=20000)
+        parser.add_argument('--comments', type=int, default=20000)
+        parser.add_argument(
+            '--requests', type=int, default=200,
+            help='Запросов на каждое представление.'
+        )
+        parser.add_argument(
+            '--anonymous', type=float, default=0.5,
+            help='Доля анонимных запросов (follow_index — всегда с входом).'
+        )
+        parser.add_argument(
+            '--cold', action='store_true',
+            help='Очищать кэши перед каждым запросом.'
+        )
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--output', help='Файл для JSON-отчёта; по умолчанию stdout.'
+        )
+        parser.add_argument(
+            '--keepdb', action='store_true',
+            help='Не удалять тестовую базу после замера.'
+        )
+
+    def handle(self, *args, **options):
+        creation = connection.creation
+        old_name = connection.settings_dict['NAME']
+        with temporary_caches():
+            creation.create_test_db(
+                verbosity=0, autoclobber=True, keepdb=options['keepdb']
+            )
+            try:
+                report = self.run(options)
+            finally:
+                creation.destroy_test_db(
+                    old_name, verbosity=0, keepdb=options['keepdb']
+                )
+        data = json.dumps(report, ensure_ascii=False, indent=2)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as stream:
+                stream.write(data + '\n')
+        else:
+            self.stdout.write(data)
+
+    def run(self, options):
+        timings = {}
+        if not Post.objects.exists():
+            timings = generate(
+                users=options['users'],
+                groups=options['groups'],
+                posts=options['posts'],
+                follows=options['follows'],
+                comments=options['comments'],
+                seed=options['seed'],
+                log=self.stderr.write,
+            )
+        rng = random.Random(options['seed'])
+        targets = self.targets(rng)
+        self.clients = {}
+        samples = defaultdict(list)
+        for _ in range(options['requests']):
+            for view in VIEWS:
+                anonymous = (view != 'posts:follow_index'
+                             and rng.random() < options['anonymous'])
+                client = self.client(rng, targets['users'], anonymous)
+                url = self.url(rng, view, targets)
+                if options['cold']:
+                    for cache in caches.all():
+                        cache.clear()
+                samples[view].append(self.measure(client, url))
+        return {
+            'dataset': {
+                'users': User.objects.count(),
+                'groups': Group.objects.count(),
+                'posts': Post.objects.count(),
+                'generation_s': timings,
+            },
+            'options': {
+                key: options[key]
+                for key in ('requests', 'anonymous', 'cold', 'seed')
+            },
+            'views': {view: summary(samples[view]) for view in VIEWS},
+        }
+
+    @staticmethod
+    def targets(rng, size=200):
+        """Случайные, но воспроизводимые объекты для адресов страниц."""
+        def sample(queryset, *fields):
+            pks = queryset.order_by('pk').values_list('pk', flat=True)
+            first, last = pks.first(), pks.last()
+            if first is None:
+                return []
+            span = range(first, last + 1)
+            chosen = rng.sample(span, min(size, len(span)))
+            return list(queryset.filter(pk__in=chosen).values_list(*fields))
+        return {
+            'users': sample(User.objects.all(), 'pk', 'username'),
+            'groups': sample(Group.objects.all(), 'slug'),
+            'posts': sample(Post.objects.all(), 'pk'),
+        }
+
+    def client(self, rng, users, anonymous):
+        if anonymous:
+            return Client()
+        user_id, _ = rng.choice(users)
+        if user_id not in self.clients:
+            client = Client()
+            client.force_login(User.objects.get(pk=user_id))
+            self.clients[user_id] = client
+        return self.clients[user_id]
+
+    @staticmethod
+    def url(rng, view, targets):
+        page = rng.choice((1, 1, 1, 2, 3))
+        if view == 'posts:group_list':
+            url = reverse(view, args=[rng.choice(targets['groups'])[0]])
+        elif view == 'posts:profile':
+            url = reverse(view, args=[rng.choice(targets['users'])[1]])
+        elif view == 'posts:post_detail':
+            return reverse(view, args=[rng.choice(targets['posts'])[0]])
+        else:
+            url = reverse(view)
+        return f'{url}?page={page}'
+
+    @staticmethod
+    def measure(client, url):
+        timer = QueryTimer()
+        started = time.perf_counter()
+        with connection.execute_wrapper(timer):
+            response = client.get(url)
+        return {
+            'total_ms': (time.perf_counter() - started) * 1000,
+            'sql_ms': timer.time * 1000,
+            'queries': timer.count,
+            'status': response.status_code,
+        }
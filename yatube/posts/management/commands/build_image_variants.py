@@ -0,0 +1,46 @@
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from posts.images import render_variants, store_variants
+from posts.management.commands.recount_stats import chunks
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = 'Нарезает варианты картинок для постов, у которых их ещё нет.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size', type=int, default=100,
+            help='Сколько постов обрабатывать за один проход.'
+        )
+        parser.add_argument(
+            '--workers', type=int, default=settings.IMAGE_VARIANT_WORKERS,
+            help='Размер пула процессов; 0 — в текущем процессе.'
+        )
+
+    def handle(self, *args, **options):
+        posts = Post.objects.exclude(image='').exclude(image=None).filter(
+            image_variants=None
+        )
+        workers = options['workers']
+        pool = ProcessPoolExecutor(workers) if workers else None
+        done = 0
+        try:
+            for batch in chunks(posts, options['chunk_size']):
+                rows = list(
+                    Post.objects.filter(pk__in=batch)
+                    .values_list('pk', 'image')
+                )
+                names = [name for _, name in rows]
+                results = (pool.map(render_variants, names) if pool
+                           else map(render_variants, names))
+                for (pk, name), variants in zip(rows, results):
+                    store_variants(pk, name, variants)
+                done += len(rows)
+        finally:
+            if pool:
+                pool.shutdown()
+        self.stdout.write(f'Обработано постов: {done}')
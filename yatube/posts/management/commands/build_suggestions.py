@@ -0,0 +1,32 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from posts.suggestions import build
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересчитывает подсказки «на кого подписаться» по графу подписок '
+        'и печатает время расчёта на миллион подписок.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--top', type=int, default=None,
+            help='Сколько подсказок хранить на пользователя.'
+        )
+        parser.add_argument(
+            '--days', type=int, default=None,
+            help='За сколько дней считать активность автора.'
+        )
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        graph = build(options['top'], options['days'])
+        elapsed = time.perf_counter() - started
+        per_million = elapsed / graph.edges * 10 ** 6 if graph.edges else 0
+        self.stdout.write(
+            f'Пользователей: {len(graph)}, подписок: {graph.edges}, '
+            f'время {elapsed:.2f} с, {per_million:.1f} с на миллион подписок'
+        )
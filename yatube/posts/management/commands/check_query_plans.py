@@ -0,0 +1,129 @@
+import re
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+
+from posts import trending
+from posts.models import Comment, Follow, FollowSuggestion, Group, Post
+from posts.timeline import follow_feed, merged_feed
+from posts.utils import DEFAULT_KEY, CursorPaginator
+
+User = get_user_model()
+
+# «SCAN posts_post» без индекса — полный проход по таблице
+FULL_SCAN = re.compile(r'^SCAN (TABLE )?\S+$')
+# Любой SCAN, в том числе по индексу: читает его от начала
+SCAN = re.compile(r'^SCAN ')
+# Страница после курсора — диапазон в индексе: «SEARCH ... (pub_date<?)»
+RANGE_SEARCH = {
+    'next': re.compile(r'^SEARCH .*\(.*\w+<\?\)'),
+    'previous': re.compile(r'^SEARCH .*\(.*\w+>\?\)'),
+}
+TEMP_SORT = 'USE TEMP B-TREE'
+
+
+def feed_queries(queryset, key=DEFAULT_KEY):
+    """Запросы ленты: первая страница и страницы вперёд/назад курсором."""
+    paginator = CursorPaginator(queryset, settings.PAGES, key)
+    position = (timezone.now(), 1)
+    return [
+        ('page', queryset[:settings.PAGES]),
+        ('cursor', paginator.window()),
+        ('next', paginator.window(position)),
+        ('previous', paginator.window(position, backwards=True)),
+    ]
+
+
+def view_queries():
+    """Те же запросы, что выполняют представления posts."""
+    viewer = User(pk=1)
+    timeline, key = follow_feed(viewer, [])
+    feeds = {
+        'posts:index': (Post.objects.select_related('author', 'group'),),
+        'posts:group_list': (
+            Post.objects.filter(group_id=1).select_related('author'),
+        ),
+        'posts:profile': (
+            Post.objects.filter(author_id=1).select_related('group'),
+        ),
+        'posts:follow_index': (timeline, key),
+        'posts:follow_index celebrities': (merged_feed(viewer, [1]), key),
+    }
+    for name, args in feeds.items():
+        for variant, queryset in feed_queries(*args):
+            # Слитая лента — несколько запросов, проверяется каждый
+            for source in getattr(queryset, 'sources', [queryset]):
+                yield f'{name} [{variant}]', source
+    comments = Comment.objects.filter(post_id=1).select_related('author')
+    for variant, queryset in feed_queries(comments, ('created', 'pk')):
+        yield f'posts:post_comments [{variant}]', queryset
+    yield 'posts:profile [following]', Follow.objects.filter(
+        user_id__in=[1]
+    ).order_by('user_id', 'author_id').values_list('user_id', 'author_id')
+    yield 'posts:hot_index', trending.hot()
+    yield 'posts:group_hot', trending.hot(Group(pk=1))
+    yield 'posts:profile [suggestions]', FollowSuggestion.objects.filter(
+        user_id=1
+    ).select_related('author')[:settings.SUGGESTIONS_TOP]
+
+
+def query_plan(queryset):
+    sql, params = queryset.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+        return [row[-1] for row in cursor.fetchall()]
+
+
+def variant(name):
+    """Вариант запроса ленты из имени «адрес [вариант]»."""
+    return name.rpartition('[')[2].rstrip(']')
+
+
+def problems(name, plan):
+    bad = [
+        step for step in plan
+        if FULL_SCAN.match(step) or step.startswith(TEMP_SORT)
+    ]
+    range_search = RANGE_SEARCH.get(variant(name))
+    if range_search:
+        # SCAN ... USING INDEX без границы проходит индекс от самой
+        # новой записи до курсора: цена страницы растёт с глубиной
+        bad += [
+            step for step in plan if SCAN.match(step) and step not in bad
+        ]
+        if not any(range_search.match(step) for step in plan):
+            bad.append('нет SEARCH с границей диапазона после курсора')
+    return bad
+
+
+class Command(BaseCommand):
+    help = (
+        'Проверяет планы запросов лент: ни один не должен читать таблицу '
+        'целиком или сортировать во временном B-дереве, а страницы после '
+        'курсора должны искать диапазон в индексе, а не проходить его.'
+    )
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('EXPLAIN QUERY PLAN есть только в SQLite.')
+        failed = []
+        for name, queryset in view_queries():
+            plan = query_plan(queryset)
+            bad = problems(name, plan)
+            status = 'FAIL' if bad else 'ok'
+            self.stdout.write(f'{status:4} {name}')
+            for step in plan:
+                self.stdout.write(f'       {step}')
+            for problem in bad:
+                if problem not in plan:
+                    self.stdout.write(f'     ! {problem}')
+            if bad:
+                failed.append(name)
+        if failed:
+            raise CommandError(
+                'Полный проход или временная сортировка: '
+                + ', '.join(failed)
+            )
@@ -0,0 +1,43 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from posts import trending
+
+
+class Command(BaseCommand):
+    help = (
+        'Затухание оценок вкладки «Популярное»: умножает их на множитель '
+        'за интервал запуска. Запускается по расписанию раз в --interval '
+        'секунд или сама повторяется с --loop.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--interval', type=float,
+            default=settings.TRENDING_DECAY_INTERVAL,
+            help='Интервал между запусками в секундах.'
+        )
+        parser.add_argument(
+            '--loop', action='store_true',
+            help='Не выходить, а повторять затухание каждые --interval.'
+        )
+        parser.add_argument(
+            '--rebuild', type=float, metavar='SECONDS',
+            help='Пересчитать оценки по постам и комментариям за период.'
+        )
+
+    def handle(self, *args, **options):
+        if options['rebuild']:
+            count = trending.rebuild(options['rebuild'])
+            self.stdout.write(f'Пересчитано оценок: {count}')
+            return
+        interval = options['interval']
+        while True:
+            started = time.monotonic()
+            deleted = trending.decay(trending.decay_factor(interval))
+            self.stdout.write(f'Затухание выполнено, удалено: {deleted}')
+            if not options['loop']:
+                break
+            time.sleep(max(0, interval - (time.monotonic() - started)))
@@ -0,0 +1,82 @@
+import csv
+import os
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from posts.transfer import TYPES, JsonLinesWriter, csv_path, export_rows
+
+
+class Command(BaseCommand):
+    help = (
+        'Выгружает группы, посты, комментарии и подписки в JSON Lines '
+        'или CSV, не загружая таблицы в память.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'output',
+            help='Файл .jsonl («-» — stdout) или каталог для CSV.'
+        )
+        parser.add_argument(
+            '--format', choices=('jsonl', 'csv'), default='jsonl'
+        )
+        parser.add_argument(
+            '--types', default=','.join(TYPES),
+            help='Какие записи выгружать, через запятую.'
+        )
+
+    def handle(self, *args, **options):
+        kinds = [kind for kind in options['types'].split(',') if kind]
+        unknown = set(kinds) - TYPES.keys()
+        if unknown:
+            raise CommandError(
+                'Неизвестные типы: ' + ', '.join(sorted(unknown))
+            )
+        kinds = [kind for kind in TYPES if kind in kinds]
+        if options['format'] == 'csv':
+            export = self.export_csv
+        else:
+            export = self.export_json_lines
+        for kind, count, elapsed in export(options['output'], kinds):
+            self.stderr.write(
+                f'{kind}: {count} строк за {elapsed:.1f} с '
+                f'({count / max(elapsed, 1e-9):.0f} строк/с)'
+            )
+
+    @staticmethod
+    def _timed(rows, write):
+        started = time.perf_counter()
+        count = 0
+        for row in rows:
+            write(row)
+            count += 1
+        return count, time.perf_counter() - started
+
+    def export_json_lines(self, output, kinds):
+        stream = (sys.stdout if output == '-'
+                  else open(output, 'w', encoding='utf-8'))
+        try:
+            writer = JsonLinesWriter(stream)
+            for kind in kinds:
+                count, elapsed = self._timed(
+                    export_rows(kind),
+                    lambda row, kind=kind: writer.write(kind, row),
+                )
+                yield kind, count, elapsed
+        finally:
+            if stream is not sys.stdout:
+                stream.close()
+
+    def export_csv(self, output, kinds):
+        os.makedirs(output, exist_ok=True)
+        for kind in kinds:
+            with open(csv_path(output, kind), 'w', newline='',
+                      encoding='utf-8') as stream:
+                writer = csv.DictWriter(stream, TYPES[kind][1])
+                writer.writeheader()
+                count, elapsed = self._timed(
+                    export_rows(kind), writer.writerow
+                )
+            yield kind, count, elapsed
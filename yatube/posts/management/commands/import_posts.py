@@ -0,0 +1,81 @@
+import os
+import sys
+import time
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import IntegrityError
+
+from posts import trending
+from posts.transfer import Importer, read_csv_dir, read_json_lines
+
+
+class Command(BaseCommand):
+    help = (
+        'Загружает группы, посты, комментарии и подписки из JSON Lines '
+        'или каталога CSV пачками через bulk_create.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'input',
+            help='Файл .jsonl («-» — stdin) или каталог с CSV.'
+        )
+        parser.add_argument('--batch-size', type=int, default=2000)
+        parser.add_argument(
+            '--skip-derived', action='store_true',
+            help='Не пересчитывать ленты, счётчики, поисковый индекс и '
+                 'оценки «Популярного».'
+        )
+
+    def records(self, path):
+        if os.path.isdir(path):
+            yield from read_csv_dir(path)
+        elif path == '-':
+            yield from read_json_lines(sys.stdin)
+        elif os.path.exists(path):
+            with open(path, encoding='utf-8') as stream:
+                yield from read_json_lines(stream, path)
+        else:
+            raise CommandError(f'Нет файла или каталога {path}')
+
+    def handle(self, *args, **options):
+        importer = Importer(
+            options['batch_size'],
+            fill_timelines=not options['skip_derived'],
+        )
+        started = time.perf_counter()
+        try:
+            for kind, row, place in self.records(options['input']):
+                importer.add(kind, row, place)
+            importer.finish()
+        except (ValueError, KeyError) as error:
+            raise CommandError(f'Неверная запись: {error}')
+        except IntegrityError as error:
+            # Пачка вставляется одним запросом: известны только её границы
+            first, last = importer.batch_places
+            where = first if first == last else f'{first} — {last}'
+            raise CommandError(
+                f'Запись нарушает ограничение базы ({error}) '
+                f'в пачке {where}'
+            )
+        if not options['skip_derived']:
+            call_command('recount_stats', stdout=self.stderr)
+            call_command('rebuild_search_index', stdout=self.stderr)
+            # Посты и комментарии вставлены в обход сигналов
+            call_command(
+                'decay_trending', rebuild=trending.horizon(),
+                stdout=self.stderr,
+            )
+        total = time.perf_counter() - started
+        for kind, count in importer.counts.items():
+            elapsed = importer.elapsed[kind]
+            self.stdout.write(
+                f'{kind}: {count} строк, '
+                f'{count / max(elapsed, 1e-9):.0f} строк/с'
+            )
+        rows = sum(importer.counts.values())
+        self.stdout.write(
+            f'Всего: {rows} строк за {total:.1f} с '
+            f'({rows / max(total, 1e-9):.0f} строк/с)'
+        )
@@ -0,0 +1,109 @@
+import time
+
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files.storage import FileSystemStorage, default_storage
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import generations
+from posts.management.commands.recount_stats import chunks
+from posts.models import ImageVariant, Post
+from posts.storage import is_hashed
+
+FIELDS = (
+    (Post, 'image', 'pk'),
+    (ImageVariant, 'file', 'post_id'),
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Переносит загруженные ранее файлы в хранилище по содержимому. '
+        'Работает пачками: старый файл удаляется только после того, как '
+        'строка в базе указывает на новый, так что сайт не простаивает.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size', type=int, default=200,
+            help='Сколько строк переносить за один проход.'
+        )
+        parser.add_argument(
+            '--pause', type=float, default=0,
+            help='Пауза между пачками в секундах, чтобы не нагружать диск.'
+        )
+        parser.add_argument(
+            '--keep-old', action='store_true',
+            help='Не удалять старые файлы после переноса.'
+        )
+
+    def handle(self, *args, **options):
+        if not hasattr(default_storage, 'release'):
+            raise CommandError(
+                'DEFAULT_FILE_STORAGE не адресуется по содержимому.'
+            )
+        # Старые файлы лежат по тем же путям в MEDIA_ROOT
+        self.legacy = FileSystemStorage(location=default_storage.location)
+        moved = missing = 0
+        for model, field, post_field in FIELDS:
+            rows = model.objects.exclude(**{field: ''}).exclude(
+                **{f'{field}__isnull': True}
+            )
+            for batch in chunks(rows, options['chunk_size']):
+                result = self.move_batch(
+                    model, field, post_field, batch, options['keep_old']
+                )
+                moved += result[0]
+                missing += result[1]
+                if options['pause']:
+                    time.sleep(options['pause'])
+        self.stdout.write(
+            f'Перенесено файлов: {moved}, не найдено: {missing}'
+        )
+
+    def move_file(self, model, field, pk, name):
+        """Копирует файл строки в новое хранилище; True, если перенесён."""
+        with self.legacy.open(name) as source:
+            new_name = default_storage.save(name, source)
+        # Условие на старое имя: строку могли изменить, пока
+        # копировался файл
+        if model.objects.filter(pk=pk, **{field: name}).update(
+            **{field: new_name}
+        ):
+            return True
+        default_storage.release(new_name)
+        return False
+
+    def legacy_exists(self, name):
+        try:
+            return self.legacy.exists(name)
+        except SuspiciousFileOperation:
+            # Путь вне MEDIA_ROOT
+            return False
+
+    def move_batch(self, model, field, post_field, batch, keep_old):
+        moved = missing = 0
+        old_names = set()
+        post_ids = set()
+        rows = model.objects.filter(pk__in=batch).values_list(
+            'pk', field, post_field
+        )
+        for pk, name, post_id in rows:
+            if is_hashed(name):
+                continue
+            if not self.legacy_exists(name):
+                missing += 1
+            elif self.move_file(model, field, pk, name):
+                moved += 1
+                old_names.add(name)
+                post_ids.add(post_id)
+        for post in Post.objects.filter(pk__in=post_ids):
+            generations.invalidate(*generations.post_scopes(post))
+        if not keep_old:
+            for name in old_names:
+                still_used = any(
+                    other.objects.filter(**{other_field: name}).exists()
+                    for other, other_field, _ in FIELDS
+                )
+                if not still_used:
+                    self.legacy.delete(name)
+        return moved, missing
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from posts import search
+
+
+class Command(BaseCommand):
+    help = 'Перестраивает поисковый индекс по текстам постов.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size', type=int, default=1000,
+            help='Сколько постов индексировать за один проход.'
+        )
+
+    def handle(self, *args, **options):
+        total = search.rebuild(options['chunk_size'])
+        self.stdout.write(
+            f'Проиндексировано постов: {total} ({search.backend()})'
+        )
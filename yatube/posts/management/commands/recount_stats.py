@@ -0,0 +1,46 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+
+from posts.models import Post
+from posts.stats import recount, recount_comments
+
+User = get_user_model()
+
+
+def chunks(queryset, size):
+    """Отдаёт первичные ключи пачками, не загружая таблицу целиком."""
+    last_pk = 0
+    while True:
+        batch = list(
+            queryset.filter(pk__gt=last_pk)
+            .order_by('pk')
+            .values_list('pk', flat=True)[:size]
+        )
+        if not batch:
+            return
+        yield batch
+        last_pk = batch[-1]
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает счётчики постов, подписок и комментариев.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size', type=int, default=1000,
+            help='Сколько строк пересчитывать за один проход.'
+        )
+
+    def handle(self, *args, **options):
+        size = options['chunk_size']
+        users = 0
+        for batch in chunks(User.objects.all(), size):
+            recount(batch)
+            users += len(batch)
+        posts = 0
+        for batch in chunks(Post.objects.all(), size):
+            recount_comments(batch)
+            posts += len(batch)
+        self.stdout.write(
+            f'Пересчитано пользователей: {users}, постов: {posts}'
+        )
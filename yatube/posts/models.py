@@ -53,6 +53,16 @@ class Post(models.Model):
         null=True,
         help_text='Загрузите картинку'
     )
+    comments_count = models.PositiveIntegerField(
+        verbose_name='Количество комментариев',
+        default=0,
+        editable=False,
+    )
+    # Входит в ключ закэшированной карточки поста
+    updated_at = models.DateTimeField(
+        verbose_name='Дата изменения',
+        auto_now=True,
+    )
 
     def __str__(self):
         return self.text[:15]
@@ -61,6 +71,19 @@ class Post(models.Model):
         ordering = ('-pub_date',)
         verbose_name = 'Пост'
         verbose_name_plural = 'Посты'
+        # Индексы по возрастанию: SQLite читает их в обратном порядке,
+        # и хвост rowid даёт сортировку (pub_date, id) без temp B-tree
+        indexes = [
+            models.Index(fields=['pub_date'], name='post_date_idx'),
+            models.Index(
+                fields=['author', 'pub_date'],
+                name='post_author_date_idx',
+            ),
+            models.Index(
+                fields=['group', 'pub_date'],
+                name='post_group_date_idx',
+            ),
+        ]
 
 
 class Comment(models.Model):
@@ -85,6 +108,14 @@ class Comment(models.Model):
         auto_now_add=True
     )
 
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['post', 'created'],
+                name='comment_post_created_idx',
+            ),
+        ]
+
     def __str__(self):
         return self.text
 
@@ -104,7 +135,241 @@ class Follow(models.Model):
     )
 
     class Meta:
-        UniqueConstraint(
-            fields=["user", "author"],
-            name="unique_follow"
-        )
+        constraints = [
+            UniqueConstraint(
+                fields=["user", "author"],
+                name="unique_follow"
+            ),
+        ]
+
+
+class TimelineEntry(models.Model):
+    """Материализованная лента подписок: пост, разосланный подписчику."""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='timeline',
+        verbose_name='Подписчик',
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='timeline_entries',
+        verbose_name='Пост',
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Автор поста',
+    )
+    pub_date = models.DateTimeField(verbose_name='Дата публикации')
+
+    class Meta:
+        ordering = ('-pub_date',)
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Записи ленты'
+        indexes = [
+            models.Index(
+                fields=['user', 'pub_date', 'post'],
+                name='timeline_user_date_idx',
+            ),
+            models.Index(
+                fields=['user', 'author'],
+                name='timeline_user_author_idx',
+            ),
+        ]
+        constraints = [
+            UniqueConstraint(
+                fields=['user', 'post'],
+                name='unique_timeline_entry',
+            ),
+        ]
+
+
+class ProfileStats(models.Model):
+    """Денормализованные счётчики автора, обновляются сигналами."""
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats',
+        verbose_name='Пользователь',
+    )
+    posts_count = models.PositiveIntegerField(
+        verbose_name='Количество постов',
+        default=0,
+    )
+    followers_count = models.PositiveIntegerField(
+        verbose_name='Количество подписчиков',
+        default=0,
+    )
+    following_count = models.PositiveIntegerField(
+        verbose_name='Количество подписок',
+        default=0,
+    )
+
+    class Meta:
+        verbose_name = 'Статистика автора'
+        verbose_name_plural = 'Статистика авторов'
+
+    def __str__(self):
+        return f'{self.user_id}: {self.posts_count}'
+
+
+class SearchDocument(models.Model):
+    """Длина текста поста для BM25 во встроенном обратном индексе."""
+    post = models.OneToOneField(
+        Post,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='search_document',
+    )
+    length = models.PositiveIntegerField(default=0)
+
+
+class SearchPosting(models.Model):
+    """Вхождение слова в пост во встроенном обратном индексе."""
+    term = models.CharField(max_length=64)
+    document = models.ForeignKey(
+        SearchDocument,
+        on_delete=models.CASCADE,
+        related_name='postings',
+    )
+    frequency = models.PositiveIntegerField(default=1)
+
+    class Meta:
+        # Уникальный индекс (term, document) заодно служит поиску по слову
+        constraints = [
+            UniqueConstraint(
+                fields=['term', 'document'],
+                name='unique_search_posting',
+            ),
+        ]
+
+
+class ImageVariant(models.Model):
+    """Заранее нарезанная копия картинки поста для srcset."""
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='image_variants',
+        verbose_name='Пост',
+    )
+    file = models.FileField(verbose_name='Файл', max_length=255)
+    format = models.CharField(verbose_name='Формат', max_length=10)
+    width = models.PositiveIntegerField(verbose_name='Ширина')
+    height = models.PositiveIntegerField(verbose_name='Высота')
+
+    class Meta:
+        ordering = ('width',)
+        verbose_name = 'Вариант картинки'
+        verbose_name_plural = 'Варианты картинок'
+        constraints = [
+            UniqueConstraint(
+                fields=['post', 'format', 'width'],
+                name='unique_image_variant',
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.post_id}: {self.format} {self.width}w'
+
+
+class StoredFile(models.Model):
+    """Файл в хранилище по содержимому и число ссылок на него."""
+    name = models.CharField(
+        verbose_name='Имя файла',
+        max_length=255,
+        primary_key=True,
+    )
+    refcount = models.PositiveIntegerField(
+        verbose_name='Число ссылок',
+        default=1,
+    )
+    created = models.DateTimeField(
+        verbose_name='Дата загрузки',
+        auto_now_add=True,
+    )
+
+    class Meta:
+        verbose_name = 'Файл хранилища'
+        verbose_name_plural = 'Файлы хранилища'
+
+    def __str__(self):
+        return f'{self.name} ({self.refcount})'
+
+
+class FollowSuggestion(models.Model):
+    """Автор, которого стоит предложить пользователю.
+
+    Таблицу целиком пересобирает команда build_suggestions; страница
+    читает подсказки одним проходом по индексу (user, rank).
+    """
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='follow_suggestions',
+        verbose_name='Пользователь',
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Предлагаемый автор',
+    )
+    rank = models.PositiveSmallIntegerField(verbose_name='Место')
+    score = models.FloatField(verbose_name='Оценка')
+
+    class Meta:
+        ordering = ('rank',)
+        verbose_name = 'Подсказка подписки'
+        verbose_name_plural = 'Подсказки подписок'
+        constraints = [
+            UniqueConstraint(
+                fields=['user', 'rank'],
+                name='unique_suggestion_rank',
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.user_id} -> {self.author_id}'
+
+
+class TrendingScore(models.Model):
+    """Оценка «горячести» поста для вкладки «Популярное».
+
+    Растёт при публикации и комментариях, периодически умножается на
+    множитель затухания командой decay_trending. Индексы по оценке
+    отдают топ ленты и группы без сортировки.
+    """
+    post = models.OneToOneField(
+        Post,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='trending',
+        verbose_name='Пост',
+    )
+    group = models.ForeignKey(
+        Group,
+        on_delete=models.SET_NULL,
+        blank=True,
+        null=True,
+        related_name='+',
+        verbose_name='Группа поста',
+    )
+    score = models.FloatField(verbose_name='Оценка', default=0)
+
+    class Meta:
+        verbose_name = 'Оценка популярности'
+        verbose_name_plural = 'Оценки популярности'
+        indexes = [
+            models.Index(fields=['score'], name='trending_score_idx'),
+            models.Index(
+                fields=['group', 'score'],
+                name='trending_group_score_idx',
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.post_id}: {self.score:.2f}'
@@ -0,0 +1,200 @@
+"""Полнотекстовый поиск по тексту постов с ранжированием BM25.
+
+Если SQLite собран с FTS5, используется виртуальная таблица
+``posts_post_fts`` (её создаёт миграция). Иначе работает встроенный
+обратный индекс на моделях SearchDocument и SearchPosting. Индекс
+обновляется сигналами при сохранении и удалении поста, команда
+``rebuild_search_index`` перестраивает его целиком.
+"""
+import math
+import re
+from collections import Counter
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Avg, Count
+
+from .models import Post, SearchDocument, SearchPosting
+
+FTS_TABLE = 'posts_post_fts'
+TERM_LENGTH = SearchPosting._meta.get_field('term').max_length
+# Параметры BM25, те же, что по умолчанию у FTS5
+K1 = 1.2
+B = 0.75
+
+WORD = re.compile(r'\w+')
+
+
+def tokenize(text):
+    return [word[:TERM_LENGTH] for word in WORD.findall(text.lower())]
+
+
+_fts_tables = {}
+
+
+def fts_available():
+    if connection.vendor != 'sqlite':
+        return False
+    name = connection.settings_dict['NAME']
+    if name not in _fts_tables:
+        _fts_tables[name] = (
+            FTS_TABLE in connection.introspection.table_names()
+        )
+    return _fts_tables[name]
+
+
+def backend():
+    """Возвращает имя активного движка: 'fts5' или 'inverted'."""
+    name = settings.SEARCH_BACKEND
+    if name == 'auto':
+        return 'fts5' if fts_available() else 'inverted'
+    return name
+
+
+class FTS5Index:
+    def add(self, post_id, text):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [post_id]
+            )
+            cursor.execute(
+                f'INSERT INTO {FTS_TABLE}(rowid, text) VALUES (%s, %s)',
+                [post_id, text],
+            )
+
+    def remove(self, post_id):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [post_id]
+            )
+
+    def clear(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE}')
+
+    def add_many(self, rows):
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f'INSERT INTO {FTS_TABLE}(rowid, text) VALUES (%s, %s)',
+                list(rows),
+            )
+
+    def search(self, terms, limit):
+        # Каждое слово в кавычках: пользовательский ввод не станет
+        # синтаксисом запроса FTS5
+        match = ' '.join('"{}"'.format(term.replace('"', '""'))
+                         for term in terms)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT rowid FROM {FTS_TABLE} '
+                f'WHERE {FTS_TABLE} MATCH %s '
+                f'ORDER BY bm25({FTS_TABLE}) LIMIT %s',
+                [match, limit],
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+
+class InvertedIndex:
+    def add(self, post_id, text):
+        self.remove(post_id)
+        self.add_many([(post_id, text)])
+
+    def remove(self, post_id):
+        SearchDocument.objects.filter(post_id=post_id).delete()
+
+    def clear(self):
+        SearchDocument.objects.all().delete()
+
+    def add_many(self, rows):
+        documents, postings = [], []
+        for post_id, text in rows:
+            terms = Counter(tokenize(text))
+            documents.append(
+                SearchDocument(post_id=post_id, length=sum(terms.values()))
+            )
+            postings.extend(
+                SearchPosting(
+                    term=term, document_id=post_id, frequency=frequency
+                )
+                for term, frequency in terms.items()
+            )
+        SearchDocument.objects.bulk_create(documents)
+        SearchPosting.objects.bulk_create(postings, batch_size=500)
+
+    def search(self, terms, limit):
+        terms = set(terms)
+        total = SearchDocument.objects.count()
+        if not total:
+            return []
+        average = SearchDocument.objects.aggregate(
+            value=Avg('length')
+        )['value'] or 1
+        frequencies = dict(
+            SearchPosting.objects.filter(term__in=terms)
+            .order_by().values_list('term').annotate(Count('pk'))
+        )
+        if len(frequencies) < len(terms):
+            # Поиск по всем словам сразу, как и в FTS5
+            return []
+        postings = SearchPosting.objects.filter(term__in=terms).values_list(
+            'document_id', 'term', 'frequency', 'document__length'
+        )
+        scores = Counter()
+        matched = Counter()
+        for post_id, term, frequency, length in postings.iterator():
+            df = frequencies[term]
+            idf = math.log((total - df + 0.5) / (df + 0.5) + 1)
+            norm = K1 * (1 - B + B * length / average)
+            scores[post_id] += idf * frequency * (K1 + 1) / (frequency + norm)
+            matched[post_id] += 1
+        ranked = sorted(
+            (post_id for post_id in scores if matched[post_id] == len(terms)),
+            key=lambda post_id: (-scores[post_id], -post_id),
+        )
+        return ranked[:limit]
+
+
+def get_index():
+    return FTS5Index() if backend() == 'fts5' else InvertedIndex()
+
+
+def index_post(post):
+    get_index().add(post.pk, post.text)
+
+
+def remove_post(post_id):
+    get_index().remove(post_id)
+
+
+def rebuild(chunk_size=1000):
+    """Перестраивает индекс целиком, читая посты пачками."""
+    index = get_index()
+    total = 0
+    with transaction.atomic():
+        index.clear()
+        last_pk = 0
+        while True:
+            rows = list(
+                Post.objects.filter(pk__gt=last_pk).order_by('pk')
+                .values_list('pk', 'text')[:chunk_size]
+            )
+            if not rows:
+                break
+            index.add_many(rows)
+            total += len(rows)
+            last_pk = rows[-1][0]
+    return total
+
+
+def search_ids(query, limit=None):
+    """Возвращает id постов по запросу, от самых релевантных."""
+    terms = tokenize(query)
+    if not terms:
+        return []
+    return get_index().search(terms, limit or settings.SEARCH_LIMIT)
+
+
+def load_posts(ids):
+    """Посты с заданными id в том же порядке, одним запросом к базе."""
+    posts = Post.objects.select_related('author', 'group').in_bulk(ids)
+    return [posts[pk] for pk in ids if pk in posts]
@@ -0,0 +1,273 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db.models.signals import (post_delete, post_save, pre_delete,
+                                      pre_save)
+from django.dispatch import receiver
+from django.urls import NoReverseMatch, reverse
+
+from core import page_cache
+
+from . import generations, images, search, stats, timeline, trending
+from .models import (Comment, Follow, Group, ImageVariant, Post,
+                     TimelineEntry)
+from .storage import release_on_commit
+
+User = get_user_model()
+
+
+def page_path(view_name, *args):
+    """Адрес страницы или None, если у объекта нет своей страницы."""
+    try:
+        return reverse(view_name, args=args)
+    except NoReverseMatch:
+        return None
+
+
+def profile_path(user_id):
+    username = User.objects.filter(pk=user_id).values_list(
+        'username', flat=True
+    ).first()
+    return page_path('posts:profile', username) if username else None
+
+
+def post_paths(post_ids):
+    return [reverse('posts:post_detail', args=[pk]) for pk in post_ids]
+
+
+def purge_post_pages(post, old_group_id=None):
+    """Сбрасывает кэш страниц, на которых виден пост."""
+    paths = [
+        reverse('posts:index'),
+        reverse('posts:post_detail', args=[post.pk]),
+        profile_path(post.author_id),
+    ]
+    slugs = Group.objects.filter(
+        pk__in={post.group_id, old_group_id} - {None}
+    ).values_list('slug', flat=True)
+    paths += [page_path('posts:group_list', slug) for slug in slugs]
+    page_cache.purge(*filter(None, paths))
+
+
+@receiver(pre_save, sender=Post)
+def post_saving(sender, instance, raw=False, **kwargs):
+    # Запоминаем прежнюю группу: её страница тоже должна обновиться;
+    # и прежнюю картинку: при замене её варианты нарезаются заново
+    instance._old_group_id = instance._old_image = None
+    if not raw and not instance._state.adding:
+        instance._old_group_id, instance._old_image = Post.objects.filter(
+            pk=instance.pk
+        ).values_list('group_id', 'image').first() or (None, None)
+
+
+@receiver(post_save, sender=Post)
+def post_saved(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    search.index_post(instance)
+    if created:
+        stats.change(instance.author_id, 1, 'posts_count')
+        timeline.fan_out_post(instance)
+        trending.bump(
+            instance.pk, instance.group_id, settings.TRENDING_POST_WEIGHT
+        )
+    else:
+        timeline.touch_followers(instance.author_id)
+        if instance.group_id != getattr(instance, '_old_group_id', None):
+            trending.move(instance.pk, instance.group_id)
+    old_image = getattr(instance, '_old_image', None)
+    if (instance.image.name or None) != (old_image or None):
+        images.enqueue(instance)
+        release_on_commit(old_image)
+    generations.invalidate(*generations.post_scopes(
+        instance, getattr(instance, '_old_group_id', None)
+    ))
+    purge_post_pages(instance, getattr(instance, '_old_group_id', None))
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    stats.change(instance.author_id, -1, 'posts_count')
+    release_on_commit(instance.image.name)
+    search.remove_post(instance.pk)
+    timeline.touch_followers(instance.author_id)
+    generations.invalidate(*generations.post_scopes(instance))
+    purge_post_pages(instance)
+
+
+@receiver(post_delete, sender=ImageVariant)
+def image_variant_deleted(sender, instance, **kwargs):
+    release_on_commit(instance.file.name)
+
+
+@receiver(post_save, sender=Comment)
+def comment_saved(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        stats.change_comments(instance.post_id, 1)
+        trending.bump(
+            instance.post_id, instance.post.group_id,
+            settings.TRENDING_COMMENT_WEIGHT,
+        )
+    generations.invalidate(('post', instance.post_id))
+    page_cache.purge(reverse('posts:post_detail', args=[instance.post_id]))
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    stats.change_comments(instance.post_id, -1)
+    generations.invalidate(('post', instance.post_id))
+    page_cache.purge(reverse('posts:post_detail', args=[instance.post_id]))
+
+
+@receiver(post_save, sender=Follow)
+def follow_saved(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        stats.change(instance.user_id, 1, 'following_count')
+        stats.change(instance.author_id, 1, 'followers_count')
+        timeline.backfill(instance.user_id, instance.author_id)
+    # Профиль подписчика показывает число его подписок
+    generations.invalidate(
+        ('author', instance.author_id),
+        ('author', instance.user_id),
+        ('following', instance.user_id),
+    )
+    # Счётчики подписчиков и подписок на страницах обоих
+    page_cache.purge(*filter(None, (
+        profile_path(instance.author_id), profile_path(instance.user_id)
+    )))
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    stats.change(instance.user_id, -1, 'following_count')
+    stats.change(instance.author_id, -1, 'followers_count')
+    timeline.remove_author(instance.user_id, instance.author_id)
+    timeline.follower_lost(instance.author_id)
+    # Профиль подписчика показывает число его подписок
+    generations.invalidate(
+        ('author', instance.author_id),
+        ('author', instance.user_id),
+        ('following', instance.user_id),
+    )
+    # Счётчики подписчиков и подписок на страницах обоих
+    page_cache.purge(*filter(None, (
+        profile_path(instance.author_id), profile_path(instance.user_id)
+    )))
+
+
+def group_audience(group_id):
+    """Где видны посты группы: посты, их авторы и читатели лент."""
+    posts = Post.objects.filter(group_id=group_id).order_by()
+    return {
+        'posts': list(posts.values_list('pk', flat=True)),
+        'authors': set(posts.values_list('author_id', flat=True).distinct()),
+        'readers': set(
+            TimelineEntry.objects.filter(post__group_id=group_id)
+            .order_by().values_list('user_id', flat=True).distinct()
+        ),
+    }
+
+
+def group_changed(group_id, slugs, audience):
+    """Название группы выводится в карточках её постов на всех лентах:
+    общей, группы, профилей авторов и лент подписок читателей.
+    """
+    generations.invalidate(
+        ('feed',), ('group', group_id),
+        *[('author', author_id) for author_id in audience['authors']],
+    )
+    generations.invalidate_many('timeline', audience['readers'])
+    usernames = User.objects.filter(
+        pk__in=audience['authors']
+    ).values_list('username', flat=True)
+    page_cache.purge(*filter(None, (
+        reverse('posts:index'),
+        *[page_path('posts:group_list', slug) for slug in slugs],
+        *[page_path('posts:profile', username) for username in usernames],
+        *post_paths(audience['posts']),
+    )))
+
+
+@receiver(pre_save, sender=Group)
+def group_saving(sender, instance, raw=False, **kwargs):
+    # Страница группы под прежним адресом тоже должна обновиться
+    instance._old_slug = None
+    if not raw and not instance._state.adding:
+        instance._old_slug = Group.objects.filter(
+            pk=instance.pk
+        ).values_list('slug', flat=True).first()
+
+
+@receiver(post_save, sender=Group)
+def group_saved(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    slugs = {instance.slug, getattr(instance, '_old_slug', None)} - {None}
+    group_changed(instance.pk, slugs, group_audience(instance.pk))
+
+
+@receiver(pre_delete, sender=Group)
+def group_deleting(sender, instance, **kwargs):
+    # После удаления у постов group_id уже NULL: их ищем заранее
+    instance._audience = group_audience(instance.pk)
+
+
+@receiver(post_delete, sender=Group)
+def group_deleted(sender, instance, **kwargs):
+    audience = getattr(instance, '_audience', None)
+    if audience is None:
+        audience = {'posts': [], 'authors': set(), 'readers': set()}
+    group_changed(instance.pk, [instance.slug], audience)
+
+
+def is_login(update_fields):
+    # Вход пользователя обновляет только last_login: ленты не меняются
+    return bool(update_fields) and set(update_fields) <= {'last_login'}
+
+
+@receiver(pre_save, sender=User)
+def user_saving(sender, instance, raw=False, update_fields=None, **kwargs):
+    # Профиль под прежним именем тоже должен обновиться
+    instance._old_username = None
+    if raw or is_login(update_fields) or instance._state.adding:
+        return
+    instance._old_username = User.objects.filter(
+        pk=instance.pk
+    ).values_list('username', flat=True).first()
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, raw=False, update_fields=None, **kwargs):
+    """Имя автора выводится в карточках его постов на всех лентах и в
+    комментариях на страницах постов.
+    """
+    if raw or is_login(update_fields):
+        return
+    posts = Post.objects.filter(author_id=instance.pk).order_by()
+    group_ids = set(
+        posts.exclude(group=None).values_list('group_id', flat=True)
+        .distinct()
+    )
+    commented = set(
+        Comment.objects.filter(author_id=instance.pk).order_by()
+        .values_list('post_id', flat=True).distinct()
+    )
+    generations.invalidate(
+        ('feed',), ('author', instance.pk),
+        *[('group', group_id) for group_id in group_ids],
+    )
+    generations.invalidate_many('post', commented)
+    timeline.touch_followers(instance.pk)
+    slugs = Group.objects.filter(pk__in=group_ids).values_list(
+        'slug', flat=True
+    )
+    usernames = {instance.username, getattr(instance, '_old_username', None)}
+    page_cache.purge(*filter(None, (
+        reverse('posts:index'),
+        *[page_path('posts:profile', name) for name in usernames if name],
+        *[page_path('posts:group_list', slug) for slug in slugs],
+        *post_paths(commented | set(posts.values_list('pk', flat=True))),
+    )))
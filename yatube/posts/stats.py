@@ -0,0 +1,112 @@
+"""Денормализованные счётчики постов, комментариев и подписок.
+
+Счётчики меняются атомарным UPDATE ... SET x = x + 1 в той же
+транзакции, что и сама запись. Если строки статистики ещё нет, она
+создаётся полным пересчётом при первом чтении.
+Команда ``recount_stats`` пересчитывает всё заново пачками.
+"""
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Greatest
+
+from .models import Comment, Follow, Post, ProfileStats
+
+
+def recount(user_ids):
+    """Пересчитывает счётчики пользователей по исходным таблицам."""
+    user_ids = list(user_ids)
+    posts = dict(
+        Post.objects.filter(author_id__in=user_ids)
+        .order_by().values_list('author_id').annotate(Count('pk'))
+    )
+    followers = dict(
+        Follow.objects.filter(author_id__in=user_ids)
+        .order_by().values_list('author_id').annotate(Count('pk'))
+    )
+    following = dict(
+        Follow.objects.filter(user_id__in=user_ids)
+        .order_by().values_list('user_id').annotate(Count('pk'))
+    )
+    stats = [
+        ProfileStats(
+            user_id=user_id,
+            posts_count=posts.get(user_id, 0),
+            followers_count=followers.get(user_id, 0),
+            following_count=following.get(user_id, 0),
+        )
+        for user_id in user_ids
+    ]
+    with transaction.atomic():
+        ProfileStats.objects.filter(user_id__in=user_ids).delete()
+        ProfileStats.objects.bulk_create(stats)
+    return stats
+
+
+def comments_subquery(comment_model):
+    return Subquery(
+        comment_model.objects.filter(post=OuterRef('pk'))
+        .order_by().values('post').annotate(total=Count('pk'))
+        .values('total')
+    )
+
+
+def recount_comments(post_ids):
+    """Пересчитывает счётчики комментариев у постов одним UPDATE."""
+    Post.objects.filter(pk__in=post_ids).update(
+        comments_count=Coalesce(comments_subquery(Comment), 0)
+    )
+
+
+def stats_for(user):
+    """Возвращает счётчики пользователя, создавая их при необходимости."""
+    try:
+        return user.stats
+    except ProfileStats.DoesNotExist:
+        try:
+            return recount([user.pk])[0]
+        except IntegrityError:
+            return ProfileStats.objects.get(user_id=user.pk)
+
+
+def followers_count(user_id):
+    counters = ProfileStats.objects.filter(user_id=user_id).values_list(
+        'followers_count', flat=True
+    ).first()
+    if counters is None:
+        counters = recount([user_id])[0].followers_count
+    return counters
+
+
+def followers_counts(user_ids):
+    """Числа подписчиков нескольких пользователей одним запросом."""
+    user_ids = set(user_ids)
+    counters = dict(
+        ProfileStats.objects.filter(user_id__in=user_ids)
+        .values_list('user_id', 'followers_count')
+    )
+    missing = user_ids - counters.keys()
+    if not missing:
+        return counters
+    try:
+        rows = recount(missing)
+    except IntegrityError:
+        # Строки уже создал параллельный запрос
+        rows = ProfileStats.objects.filter(user_id__in=missing)
+    counters.update((row.user_id, row.followers_count) for row in rows)
+    return counters
+
+
+def change(user_id, delta, *fields):
+    """Сдвигает счётчики пользователя на delta.
+
+    Если строки статистики ещё нет, ничего не делает: она будет
+    посчитана целиком при первом чтении в ``stats_for``.
+    """
+    updates = {field: Greatest(F(field) + delta, 0) for field in fields}
+    ProfileStats.objects.filter(user_id=user_id).update(**updates)
+
+
+def change_comments(post_id, delta):
+    Post.objects.filter(pk=post_id).update(
+        comments_count=Greatest(F('comments_count') + delta, 0)
+    )
@@ -0,0 +1,140 @@
+"""Хранилище медиафайлов, адресуемое по содержимому.
+
+Имя файла — SHA-256 его содержимого, разложенный по двум уровням
+каталогов: ``posts/ab/cd/abcd….jpg``. В одном каталоге не скапливаются
+сотни тысяч файлов, а одинаковые загрузки хранятся один раз. Число
+ссылок на файл ведёт модель StoredFile: ``save`` увеличивает его,
+``release`` уменьшает и удаляет файл, когда ссылок не осталось.
+"""
+import hashlib
+import os
+import posixpath
+import re
+import tempfile
+from functools import partial
+
+from django.core.files.storage import FileSystemStorage, default_storage
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils.deconstruct import deconstructible
+
+HASHED_NAME = re.compile(
+    r'(^|/)[0-9a-f]{2}/[0-9a-f]{2}/[0-9a-f]{64}(\.\w+)?$'
+)
+CHUNK_SIZE = 64 * 1024
+
+
+def is_hashed(name):
+    return bool(HASHED_NAME.search(name))
+
+
+def release_on_commit(name):
+    """Отпускает файл после коммита, если хранилище считает ссылки."""
+    if name and hasattr(default_storage, 'release'):
+        transaction.on_commit(partial(default_storage.release, name))
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+
+    def get_available_name(self, name, max_length=None):
+        # Итоговое имя определяется содержимым уже в _save
+        return name
+
+    @staticmethod
+    def hashed_name(name, digest):
+        """Имя в каталоге из upload_to: ``<каталог>/ab/cd/<хэш><расш>``."""
+        directory, basename = posixpath.split(name)
+        extension = os.path.splitext(basename)[1].lower()
+        return posixpath.join(
+            directory, digest[:2], digest[2:4], digest + extension
+        )
+
+    def _spool(self, content):
+        """Пишет поток во временный файл, заодно считая хэш."""
+        os.makedirs(self.location, exist_ok=True)
+        digest = hashlib.sha256()
+        fd, temp_path = tempfile.mkstemp(prefix='.upload-', dir=self.location)
+        try:
+            with os.fdopen(fd, 'wb') as temp:
+                if hasattr(content, 'seek'):
+                    content.seek(0)
+                for chunk in content.chunks(CHUNK_SIZE):
+                    if isinstance(chunk, str):
+                        chunk = chunk.encode()
+                    digest.update(chunk)
+                    temp.write(chunk)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+        return digest.hexdigest(), temp_path
+
+    def _save(self, name, content):
+        digest, temp_path = self._spool(content)
+        name = self.hashed_name(name, digest)
+        full_path = self.path(name)
+        try:
+            # Ссылка добавляется до проверки файла и в той же транзакции:
+            # параллельный release держит блокировку строки, пока удаляет
+            # файл, и не удалит его после нашей проверки
+            with transaction.atomic():
+                self.track(name)
+                if os.path.exists(full_path):
+                    os.unlink(temp_path)
+                else:
+                    os.makedirs(os.path.dirname(full_path), exist_ok=True)
+                    # Переименование атомарно: читатели не увидят
+                    # недописанный файл
+                    os.replace(temp_path, full_path)
+                    if self.file_permissions_mode is not None:
+                        os.chmod(full_path, self.file_permissions_mode)
+        finally:
+            if os.path.exists(temp_path):
+                os.unlink(temp_path)
+        return name
+
+    @staticmethod
+    def track(name):
+        """Добавляет ссылку на файл."""
+        from .models import StoredFile
+
+        stored = StoredFile.objects.filter(name=name)
+        if stored.update(refcount=F('refcount') + 1):
+            return
+        try:
+            with transaction.atomic():
+                StoredFile.objects.create(name=name)
+        except IntegrityError:
+            # Такой же файл только что загрузили параллельно
+            stored.update(refcount=F('refcount') + 1)
+
+    def release(self, name):
+        """Убирает ссылку на файл и удаляет его, если ссылок не осталось.
+
+        Файлы, которых нет в StoredFile (загруженные до перехода на это
+        хранилище), не трогает: их переносит команда migrate_media_storage.
+        """
+        from .models import StoredFile
+
+        with transaction.atomic():
+            stored = (
+                StoredFile.objects.select_for_update()
+                .filter(name=name).first()
+            )
+            if stored is None:
+                return
+            if stored.refcount > 1:
+                StoredFile.objects.filter(name=name).update(
+                    refcount=F('refcount') - 1
+                )
+                return
+            stored.delete()
+            super().delete(name)
+
+    def delete(self, name):
+        from .models import StoredFile
+
+        if StoredFile.objects.filter(name=name).exists():
+            self.release(name)
+        else:
+            super().delete(name)
@@ -0,0 +1,163 @@
+"""Подсказки «на кого подписаться», считаются офлайн.
+
+Граф подписок загружается из Follow в разреженном виде (CSR): массив
+смещений по пользователям и общий массив авторов, на которых они
+подписаны. Кандидаты — авторы второго круга: на них подписаны те, на
+кого подписан пользователь. Оценка — число таких путей, умноженное на
+активность автора за последние SUGGESTIONS_ACTIVITY_DAYS дней.
+Лучшие SUGGESTIONS_TOP кандидатов сохраняются в FollowSuggestion, после
+чего сдвигается поколение ``suggestions``: страницы с подсказками в
+кэше браузера перестают совпадать по ETag.
+"""
+import heapq
+import math
+from array import array
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db.models import Count
+from django.utils import timezone
+
+from core.transactions import write_transaction
+
+from . import follow_graph, generations
+from .models import Follow, FollowSuggestion, Post
+
+User = get_user_model()
+
+BATCH_SIZE = 1000
+
+
+class SparseGraph:
+    """Подписки в CSR: авторы пользователя i — targets[offsets[i]:
+    offsets[i + 1]]. Пользователи пронумерованы плотно по порядку pk.
+    """
+
+    def __init__(self, ids, offsets, targets):
+        self.ids = ids
+        self.index = {pk: position for position, pk in enumerate(ids)}
+        self.offsets = offsets
+        self.targets = targets
+
+    def __len__(self):
+        return len(self.ids)
+
+    @property
+    def edges(self):
+        return len(self.targets)
+
+    def following(self, position):
+        return self.targets[
+            self.offsets[position]:self.offsets[position + 1]
+        ]
+
+
+def load_graph():
+    ids = array('q', User.objects.order_by('pk').values_list(
+        'pk', flat=True
+    ).iterator())
+    index = {pk: position for position, pk in enumerate(ids)}
+    offsets = array('q', [0]) * (len(ids) + 1)
+    targets = array('q')
+    # Подписки в порядке user_id, как и пользователи: у каждого
+    # пользователя его авторы идут в targets подряд
+    rows = Follow.objects.order_by('user_id', 'author_id').values_list(
+        'user_id', 'author_id'
+    ).iterator(chunk_size=10000)
+    for user_id, author_id in rows:
+        if user_id not in index or author_id not in index:
+            # Пользователь зарегистрировался уже после чтения списка
+            continue
+        offsets[index[user_id] + 1] += 1
+        targets.append(index[author_id])
+    for position in range(len(ids)):
+        offsets[position + 1] += offsets[position]
+    return SparseGraph(ids, offsets, targets)
+
+
+def activity_weights(graph, days):
+    """Вес автора: 1 + log(1 + число постов за последние days дней)."""
+    weights = array('d', [1.0]) * len(graph)
+    since = timezone.now() - timedelta(days=days)
+    counts = (
+        Post.objects.filter(pub_date__gte=since).order_by()
+        .values_list('author_id').annotate(Count('pk'))
+    )
+    for author_id, count in counts:
+        if author_id in graph.index:
+            weights[graph.index[author_id]] = 1 + math.log1p(count)
+    return weights
+
+
+def top_candidates(graph, weights, position, top):
+    """Лучшие авторы второго круга: [(оценка, позиция автора)]."""
+    following = graph.following(position)
+    paths = Counter()
+    for author in following:
+        paths.update(graph.following(author))
+    for known in (*following, position):
+        paths.pop(known, None)
+    return heapq.nlargest(
+        top,
+        ((count * weights[author], author) for author, count in
+         paths.items()),
+    )
+
+
+def store(graph, batch):
+    """Заменяет подсказки пользователей пачки: {позиция: кандидаты}."""
+    rows = [
+        FollowSuggestion(
+            user_id=graph.ids[position],
+            author_id=graph.ids[author],
+            rank=rank,
+            score=score,
+        )
+        for position, candidates in batch.items()
+        for rank, (score, author) in enumerate(candidates)
+    ]
+    with write_transaction():
+        FollowSuggestion.objects.filter(
+            user_id__in=[graph.ids[position] for position in batch]
+        ).delete()
+        FollowSuggestion.objects.bulk_create(rows)
+
+
+def build(top=None, days=None):
+    """Пересчитывает подсказки всех пользователей; возвращает граф."""
+    top = top or settings.SUGGESTIONS_TOP
+    days = days or settings.SUGGESTIONS_ACTIVITY_DAYS
+    graph = load_graph()
+    weights = activity_weights(graph, days)
+    batch = {}
+    for position in range(len(graph)):
+        batch[position] = top_candidates(graph, weights, position, top)
+        if len(batch) >= BATCH_SIZE:
+            store(graph, batch)
+            batch = {}
+    if batch:
+        store(graph, batch)
+    generations.invalidate(('suggestions',))
+    return graph
+
+
+def suggestions_for(user, limit=None):
+    """Предлагаемые авторы: одно чтение по индексу (user, rank).
+
+    Авторы, на которых пользователь подписался после расчёта,
+    отбрасываются по графу подписок в памяти.
+    """
+    if not user.is_authenticated:
+        return []
+    limit = limit or settings.SUGGESTIONS_SHOWN
+    authors = [
+        suggestion.author for suggestion in
+        FollowSuggestion.objects.filter(user=user)
+        .select_related('author')[:settings.SUGGESTIONS_TOP]
+    ]
+    following = follow_graph.is_following(user, authors)
+    return [
+        author for author in authors if not following[author.pk]
+    ][:limit]
@@ -0,0 +1,190 @@
+"""Синтетические данные для нагрузочных замеров.
+
+Всё создаётся пачками через bulk_create, без сигналов; производные
+таблицы (счётчики, ленты подписок, число комментариев) заполняются
+в конце набором запросов, а не построчно. Популярность авторов
+распределена по закону Ципфа: у немногих авторов много подписчиков.
+"""
+import itertools
+import random
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.db import connection
+from django.db.models import Max
+from django.utils import timezone
+
+from .management.commands.recount_stats import chunks
+from .models import (Comment, Follow, Group, Post, ProfileStats,
+                     TimelineEntry)
+from .stats import recount, recount_comments
+from .transfer import bulk_create_dated, reset_sequences
+
+User = get_user_model()
+
+BATCH_SIZE = 5000
+WORDS = (
+    'лето', 'город', 'книга', 'река', 'поезд', 'утро', 'музыка', 'кофе',
+    'дорога', 'море', 'снег', 'друг', 'работа', 'вечер', 'сад', 'окно',
+)
+PERIOD = timedelta(days=365)
+
+
+def _batches(total):
+    """Диапазоны номеров по BATCH_SIZE: данные не копятся в памяти."""
+    for start in range(0, total, BATCH_SIZE):
+        yield range(start, min(start + BATCH_SIZE, total))
+
+
+def _text(rng, words=12):
+    return ' '.join(rng.choice(WORDS) for _ in range(words))
+
+
+def zipf_weights(count):
+    """Накопленные веса 1/rank для random.choices(cum_weights=...)."""
+    return list(itertools.accumulate(1 / rank for rank in
+                                     range(1, count + 1)))
+
+
+def next_id(model):
+    """Первый свободный id: bulk_create_dated нужны заданные id."""
+    return (model.objects.aggregate(last=Max('pk'))['last'] or 0) + 1
+
+
+def fill_timelines():
+    """Раскладывает посты по лентам подписчиков одним INSERT ... SELECT.
+
+    Посты популярных авторов, как и при обычной публикации, не
+    рассылаются: они подмешиваются при чтении ленты.
+    """
+    timeline = TimelineEntry._meta.db_table
+    follow = Follow._meta.db_table
+    post = Post._meta.db_table
+    stats = ProfileStats._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {timeline} (user_id, post_id, author_id, pub_date) '
+            f'SELECT f.user_id, p.id, p.author_id, p.pub_date '
+            f'FROM {follow} f JOIN {post} p ON p.author_id = f.author_id '
+            f'WHERE f.author_id NOT IN ('
+            f'SELECT user_id FROM {stats} '
+            f'WHERE followers_count >= %s)',
+            [settings.TIMELINE_FANOUT_LIMIT],
+        )
+
+
+class Generator:
+    """Шаги создания набора данных; каждый пишет пачками по BATCH_SIZE."""
+
+    def __init__(self, seed=0):
+        self.rng = random.Random(seed)
+        self.now = timezone.now()
+        self.user_ids = []
+        self.weights = []
+
+    def _date(self):
+        return self.now - PERIOD * self.rng.random()
+
+    def users(self, total):
+        password = make_password(None)
+        for batch in _batches(total):
+            User.objects.bulk_create(
+                User(username=f'bench{number}', password=password)
+                for number in batch
+            )
+        self.user_ids = list(User.objects.values_list('pk', flat=True))
+        self.weights = zipf_weights(len(self.user_ids))
+
+    def groups(self, total):
+        Group.objects.bulk_create(
+            Group(title=f'Группа {number}', slug=f'bench-{number}',
+                  description=_text(self.rng))
+            for number in range(total)
+        )
+
+    def posts(self, total):
+        group_ids = [None] + list(Group.objects.values_list('pk', flat=True))
+        first = next_id(Post)
+        for batch in _batches(total):
+            authors = self.rng.choices(
+                self.user_ids, cum_weights=self.weights, k=len(batch)
+            )
+            bulk_create_dated(Post, [
+                Post(
+                    id=first + number,
+                    author_id=author_id,
+                    group_id=self.rng.choice(group_ids),
+                    text=_text(self.rng),
+                    pub_date=self._date(),
+                )
+                for number, author_id in zip(batch, authors)
+            ], 'pub_date')
+        reset_sequences(Post)
+
+    def follows(self, total):
+        for batch in _batches(total):
+            pairs = zip(
+                self.rng.choices(self.user_ids, k=len(batch)),
+                self.rng.choices(
+                    self.user_ids, cum_weights=self.weights, k=len(batch)
+                ),
+            )
+            Follow.objects.bulk_create(
+                (
+                    Follow(user_id=user_id, author_id=author_id)
+                    for user_id, author_id in pairs if user_id != author_id
+                ),
+                ignore_conflicts=True,
+            )
+
+    def comments(self, total):
+        post_ids = Post.objects.values_list('pk', flat=True)
+        first = post_ids.order_by('pk').first()
+        last = post_ids.order_by('-pk').first()
+        if first is None:
+            return
+        first_comment = next_id(Comment)
+        for batch in _batches(total):
+            bulk_create_dated(Comment, [
+                Comment(
+                    id=first_comment + number,
+                    post_id=self.rng.randint(first, last),
+                    author_id=self.rng.choice(self.user_ids),
+                    text=_text(self.rng, 6),
+                    created=self._date(),
+                )
+                for number in batch
+            ], 'created')
+        reset_sequences(Comment)
+
+    def counters(self):
+        for batch in chunks(User.objects.all(), BATCH_SIZE):
+            recount(batch)
+        for batch in chunks(Post.objects.all(), BATCH_SIZE):
+            recount_comments(batch)
+
+
+def generate(users=1000, groups=20, posts=20000, follows=20000,
+             comments=20000, seed=0, log=None):
+    """Создаёт набор данных и возвращает время каждого шага в секундах."""
+    generator = Generator(seed)
+    steps = (
+        ('users', generator.users, users),
+        ('groups', generator.groups, groups),
+        ('posts', generator.posts, posts),
+        ('follows', generator.follows, follows),
+        ('comments', generator.comments, comments),
+        ('counters', generator.counters),
+        ('timelines', fill_timelines),
+    )
+    timings = {}
+    for name, action, *args in steps:
+        started = time.perf_counter()
+        action(*args)
+        timings[name] = round(time.perf_counter() - started, 3)
+        if log:
+            log(f'{name}: {timings[name]} с')
+    return timings
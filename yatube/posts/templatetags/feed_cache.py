@@ -0,0 +1,62 @@
+from django import template
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.utils import make_template_fragment_key
+from django.template import TemplateSyntaxError
+from django.templatetags.cache import CacheNode
+
+from core import cache_stats
+from posts import generations
+
+register = template.Library()
+
+
+class CountedCacheNode(CacheNode):
+    """{% cache %}, который считает попадания и промахи по фрагменту."""
+
+    def render(self, context):
+        expire_time = self.expire_time_var.resolve(context)
+        if self.cache_name:
+            fragment_cache = caches[self.cache_name.resolve(context)]
+        else:
+            fragment_cache = caches['default']
+        vary_on = [var.resolve(context) for var in self.vary_on]
+        cache_key = make_template_fragment_key(self.fragment_name, vary_on)
+        value = fragment_cache.get(cache_key)
+        cache_stats.record(self.fragment_name, value is not None)
+        if value is None:
+            value = self.nodelist.render(context)
+            fragment_cache.set(cache_key, value, expire_time)
+        return value
+
+
+@register.tag('counted_cache')
+def do_counted_cache(parser, token):
+    """Синтаксис как у {% cache %}, закрывается {% endcounted_cache %}."""
+    nodelist = parser.parse(('endcounted_cache',))
+    parser.delete_first_token()
+    tokens = token.split_contents()
+    if len(tokens) < 3:
+        raise TemplateSyntaxError(
+            f'{tokens[0]!r} tag requires at least 2 arguments.'
+        )
+    cache_name = None
+    if len(tokens) > 3 and tokens[-1].startswith('using='):
+        cache_name = parser.compile_filter(tokens[-1][len('using='):])
+        tokens = tokens[:-1]
+    return CountedCacheNode(
+        nodelist, parser.compile_filter(tokens[1]), tokens[2],
+        [parser.compile_filter(bit) for bit in tokens[3:]],
+        cache_name,
+    )
+
+
+@register.simple_tag
+def generation(scope, pk=None):
+    """Номер поколения для ключа {% cache %}: меняется вместе с лентой."""
+    return generations.get(scope, pk)
+
+
+@register.simple_tag
+def feed_cache_timeout():
+    return settings.FEED_CACHE_TIMEOUT
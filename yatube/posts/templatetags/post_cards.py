@@ -0,0 +1,76 @@
+"""Карточки постов, закэшированные по одной («матрёшка»).
+
+Страница ленты кэшируется целиком, но при смене поколения ленты
+рендерится заново. Карточки при этом не меняются: каждая хранится под
+ключом из id поста, updated_at и видимых в ней данных автора и группы.
+Все карточки страницы читаются одним get_many, рендерятся только
+недостающие, и они же сохраняются одним set_many.
+"""
+import hashlib
+
+from django import template
+from django.conf import settings
+from django.core.cache import caches
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+from core import cache_stats
+from posts.templatetags.post_thumbnails import prefetch_images
+
+register = template.Library()
+
+TEMPLATE = 'posts/includes/post_card.html'
+# Чем отличаются карточки на разных страницах
+LAYOUTS = {
+    'index': {'image': True},
+    'group': {'image': True, 'detail_link': True, 'hide_group': True},
+    'profile': {'truncate': True, 'detail_link': True},
+    'follow': {},
+}
+
+
+def card_key(post, layout):
+    """Ключ карточки: меняется вместе со всем, что в ней выводится."""
+    author = post.author
+    group = post.group
+    parts = [
+        layout, post.pk, post.updated_at.isoformat(),
+        author.username, author.get_full_name(),
+        group.slug if group else '', group.title if group else '',
+    ]
+    digest = hashlib.md5('|'.join(map(str, parts)).encode()).hexdigest()
+    return f'post_card:{layout}:{post.pk}:{digest}'
+
+
+@register.simple_tag
+def post_cards(posts, layout):
+    """Список HTML карточек постов страницы в том же порядке:
+    из кэша, недостающие — рендером.
+    """
+    if layout not in LAYOUTS:
+        raise template.TemplateSyntaxError(
+            f'Неизвестный вид карточки: {layout}'
+        )
+    posts = list(posts)
+    card_cache = caches[settings.POST_CARD_CACHE]
+    keys = [card_key(post, layout) for post in posts]
+    cards = card_cache.get_many(keys)
+    missing = [
+        (key, post) for key, post in zip(keys, posts) if key not in cards
+    ]
+    for key in keys:
+        cache_stats.record('post_card', key in cards)
+    if missing:
+        if LAYOUTS[layout].get('image'):
+            prefetch_images(
+                [post for _, post in missing], '960x339', upscale=True
+            )
+        rendered = {
+            key: render_to_string(
+                TEMPLATE, {'post': post, 'layout': LAYOUTS[layout]}
+            )
+            for key, post in missing
+        }
+        card_cache.set_many(rendered, settings.POST_CARD_TIMEOUT)
+        cards.update(rendered)
+    return [mark_safe(cards[key]) for key in keys]
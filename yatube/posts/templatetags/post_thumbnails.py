@@ -0,0 +1,34 @@
+from django import template
+from django.db.models import prefetch_related_objects
+
+from core import timing
+
+from posts.images import picture
+from posts.thumbnails import prefetch_thumbnails
+
+register = template.Library()
+
+
+@register.simple_tag
+def prefetch_images(posts, geometry_string, **options):
+    """Готовит картинки страницы: варианты одним запросом к базе,
+    миниатюры для {% thumbnail %} с теми же параметрами — для постов,
+    у которых вариантов ещё нет.
+    """
+    posts = [post for post in posts if post.image]
+    with timing.measure('thumbnail'):
+        prefetch_related_objects(posts, 'image_variants')
+        prefetch_thumbnails(
+            [post for post in posts if not post.image_variants.all()],
+            geometry_string, **options
+        )
+    return ''
+
+
+@register.inclusion_tag('posts/includes/post_image.html')
+def post_image(post):
+    """Картинка поста: srcset из готовых вариантов или миниатюра sorl."""
+    return {
+        'post': post,
+        'picture': picture(post) if post.image else None,
+    }
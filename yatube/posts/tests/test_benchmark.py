@@ -0,0 +1,77 @@
+import os
+from datetime import timedelta
+from io import StringIO
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+
+from posts.management.commands.bench_views import (percentile,
+                                                   temporary_caches)
+from posts.models import (Comment, Follow, Post, ProfileStats, StoredFile,
+                          TimelineEntry)
+from posts.synthetic import generate
+
+
+class SyntheticDataTest(TestCase):
+    def test_generate_fills_derived_tables(self):
+        """Набор данных создаётся вместе со счётчиками и лентами."""
+        timings = generate(
+            users=30, groups=3, posts=200, follows=100, comments=50
+        )
+        self.assertIn('timelines', timings)
+        self.assertEqual(Post.objects.count(), 200)
+        self.assertEqual(Comment.objects.count(), 50)
+        self.assertEqual(ProfileStats.objects.count(), 30)
+        follow = Follow.objects.first()
+        self.assertEqual(
+            TimelineEntry.objects.filter(user=follow.user).count(),
+            Post.objects.filter(
+                author__following__user=follow.user
+            ).count(),
+        )
+        self.assertEqual(
+            sum(Post.objects.values_list('comments_count', flat=True)), 50
+        )
+        # Даты разбросаны по году, а не проставлены auto_now_add
+        self.assertGreater(
+            Post.objects.values('pub_date').distinct().count(), 100
+        )
+        self.assertLess(
+            Comment.objects.earliest('created').created,
+            timezone.now() - timedelta(days=1),
+        )
+
+    def test_percentile_nearest_rank(self):
+        values = list(range(1, 101))
+        self.assertEqual(percentile(values, 50), 50)
+        self.assertEqual(percentile(values, 99), 99)
+        self.assertEqual(percentile([7], 95), 7)
+
+    def test_temporary_caches_leave_shared_cache(self):
+        """Замер очищает свой кэш, а не общий кэш сервера."""
+        cache.set('bench:kept', 1)
+        with temporary_caches():
+            self.assertIsNone(cache.get('bench:kept'))
+            cache.set('bench:temporary', 1)
+            cache.clear()
+        self.assertEqual(cache.get('bench:kept'), 1)
+        self.assertIsNone(cache.get('bench:temporary'))
+
+    def test_tests_use_own_cache_dir(self):
+        """Тесты не работают с каталогом кэша сервера."""
+        self.assertNotEqual(
+            settings.CACHE_DIR, os.path.join(settings.BASE_DIR, 'cache')
+        )
+
+    def test_image_bench_leaves_no_stored_files(self):
+        """Замер нарезки картинок не пишет строки хранилища в базу."""
+        out = StringIO()
+        call_command(
+            'bench_image_variants', images=2, size='64x48', workers='0',
+            stdout=out,
+        )
+        self.assertIn('workers=0', out.getvalue())
+        self.assertFalse(StoredFile.objects.exists())
@@ -0,0 +1,67 @@
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.test import TestCase
+
+from posts import follow_graph
+from posts.models import Follow
+
+User = get_user_model()
+
+
+class FollowGraphTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.reader = User.objects.create_user(username='reader')
+        cls.authors = [
+            User.objects.create_user(username=f'author{num}')
+            for num in range(3)
+        ]
+        Follow.objects.create(user=cls.reader, author=cls.authors[0])
+        Follow.objects.create(user=cls.reader, author=cls.authors[1])
+        Follow.objects.create(user=cls.authors[0], author=cls.reader)
+
+    def setUp(self):
+        # Поколения в кэше переживают откат базы между тестами
+        cache.clear()
+        follow_graph.graph.clear()
+
+    def test_page_answered_with_one_query(self):
+        """Подписки на всех авторов страницы — одним запросом к базе."""
+        with self.assertNumQueries(1):
+            following = follow_graph.is_following(self.reader, self.authors)
+        self.assertEqual(following, {
+            self.authors[0].pk: True,
+            self.authors[1].pk: True,
+            self.authors[2].pk: False,
+        })
+        with self.assertNumQueries(0):
+            follow_graph.is_following(self.reader, self.authors)
+
+    def test_mutual(self):
+        mutual = follow_graph.mutual(self.reader, self.authors)
+        self.assertEqual(
+            [mutual[author.pk] for author in self.authors],
+            [True, False, False],
+        )
+
+    def test_anonymous_follows_nobody(self):
+        following = follow_graph.is_following(AnonymousUser(), self.authors)
+        self.assertFalse(any(following.values()))
+
+    def test_follow_signals_refresh_graph(self):
+        """Новая подписка и отписка видны без ручного сброса графа."""
+        follow_graph.is_following(self.reader, self.authors)
+        Follow.objects.create(user=self.reader, author=self.authors[2])
+        Follow.objects.filter(
+            user=self.reader, author=self.authors[0]
+        ).delete()
+        following = follow_graph.is_following(self.reader, self.authors)
+        self.assertFalse(following[self.authors[0].pk])
+        self.assertTrue(following[self.authors[2].pk])
+
+    def test_follower_counts(self):
+        counts = follow_graph.follower_counts(self.authors)
+        self.assertEqual(
+            [counts[author.pk] for author in self.authors], [1, 1, 0]
+        )
@@ -1,15 +1,23 @@
+import hashlib
 from http import HTTPStatus
+import os
 import shutil
 import tempfile
+from unittest import mock
 
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage, default_storage
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
 from django.test import Client, TestCase, override_settings
 from django.urls import reverse
 
-from posts.models import Group, Post
+from posts import views
+from posts.models import Group, Post, StoredFile
+from posts.storage import ContentAddressedStorage
 
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
 
@@ -61,6 +69,9 @@ class PostsFormsTestCase(TestCase):
             slug='posts_test_two_slug',
             description='Тестовое описание с изображением',
         )
+        cls.gif_name = ContentAddressedStorage.hashed_name(
+            'posts/small.gif', hashlib.sha256(small_gif).hexdigest()
+        )
         cls.post = Post.objects.create(
             text='Test post 1 text.',
             author=cls.user,
@@ -104,7 +115,7 @@ class PostsFormsTestCase(TestCase):
         self.assertEqual(latest.text, form_data['text'])
         self.assertEqual(latest.group, self.group)
         self.assertEqual(response.status_code, HTTPStatus.OK)
-        self.assertEqual(latest.image.name, 'posts/small2.gif')
+        self.assertEqual(latest.image.name, self.gif_name)
 
     def test_edit_valid_post(self):
         """Проверка редактирования поста с новым текстом и группой."""
@@ -122,5 +133,56 @@ class PostsFormsTestCase(TestCase):
         self.assertEqual(latest.text, form_data['text'])
         self.assertEqual(latest.group, self.group)
         self.assertEqual(response.status_code, HTTPStatus.OK)
-        self.assertEqual(latest.image.name, 'posts/small.gif')
+        self.assertEqual(latest.image.name, self.gif_name)
         self.assertEqual(response.status_code, HTTPStatus.OK)
+
+    def test_edit_keeps_comment_counter(self):
+        """Правка поста не затирает счётчик комментариев, выросший,
+        пока открыта форма.
+        """
+        save_post = views.save_post
+
+        def save_after_comment(post, *args):
+            Post.objects.filter(pk=post.pk).update(comments_count=5)
+            save_post(post, *args)
+
+        with mock.patch.object(views, 'save_post', save_after_comment):
+            self.authorized_client.post(
+                reverse('posts:post_edit', args=[self.post.id]),
+                data={'text': 'Новый текст'},
+            )
+        post = Post.objects.get(pk=self.post.pk)
+        self.assertEqual(post.text, 'Новый текст')
+        self.assertEqual(post.comments_count, 5)
+
+    def test_identical_uploads_share_one_file(self):
+        """Одинаковое содержимое хранится одним файлом со счётчиком."""
+        name = default_storage.save('posts/copy.gif', self.uploaded2)
+        self.assertEqual(name, self.gif_name)
+        self.assertRegex(
+            name, r'^posts/([0-9a-f]{2})/([0-9a-f]{2})/\1\2[0-9a-f]{60}\.gif$'
+        )
+        self.assertEqual(StoredFile.objects.get(name=name).refcount, 2)
+        default_storage.release(name)
+        self.assertTrue(default_storage.exists(name))
+        default_storage.release(name)
+        self.assertFalse(default_storage.exists(name))
+        self.assertFalse(StoredFile.objects.filter(name=name).exists())
+
+    def test_migrate_media_storage_moves_legacy_files(self):
+        """Команда переносит старые файлы в хранилище по содержимому."""
+        legacy = FileSystemStorage()
+        old_name = legacy.save('posts/legacy.gif', ContentFile(b'legacy'))
+        post = Post.objects.create(
+            text='Старый пост', author=self.user, image=old_name
+        )
+        call_command('migrate_media_storage', stdout=open(os.devnull, 'w'))
+        post.refresh_from_db()
+        self.assertEqual(
+            post.image.name,
+            ContentAddressedStorage.hashed_name(
+                old_name, hashlib.sha256(b'legacy').hexdigest()
+            ),
+        )
+        self.assertEqual(post.image.read(), b'legacy')
+        self.assertFalse(legacy.exists(old_name))
@@ -3,7 +3,9 @@ from django.test import Client, TestCase
 from django.urls import reverse
 from django.conf import settings
 
+from posts.management.commands.check_query_plans import query_plan
 from posts.models import Post, Group
+from posts.utils import CursorPaginator
 
 User = get_user_model()
 
@@ -64,3 +66,78 @@ class PaginatorTest(TestCase):
             with self.subTest(reverse_name=reverse_name):
                 response = self.authorized_client.get(reverse_name)
                 self.assertEqual(len(response.context[obj]), QUANTITY_PAGES_2)
+
+
+class CursorPaginatorTest(TestCase):
+    """Класс тестирования курсорной пагинации."""
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='cursor')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='cursor_test_slug',
+            description='Тестовое описание',
+        )
+        Post.objects.bulk_create(
+            [
+                Post(
+                    text=f'{i} - Тестовый пост с группой.',
+                    author=cls.user,
+                    group=cls.group,
+                )
+                for i in range(QUANTITY_POSTS)]
+        )
+
+    def setUp(self) -> None:
+        self.authorized_client = Client()
+        self.authorized_client.force_login(CursorPaginatorTest.user)
+
+    def test_cursor_pages(self):
+        """Курсор листает ленты вперёд и назад без пропусков."""
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:group_list',
+                    kwargs={'slug': 'cursor_test_slug'}),
+            reverse('posts:profile', kwargs={'username': 'cursor'}),
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                first = self.authorized_client.get(url + '?cursor=')
+                first_page = first.context['page_obj']
+                self.assertEqual(len(first_page), settings.PAGES)
+                self.assertFalse(first_page.has_previous())
+                second = self.authorized_client.get(
+                    url + '?cursor=' + first_page.next_cursor)
+                second_page = second.context['page_obj']
+                self.assertEqual(len(second_page), QUANTITY_PAGES_2)
+                self.assertFalse(second_page.has_next())
+                self.assertEqual(
+                    len(set(first_page) | set(second_page)),
+                    QUANTITY_POSTS
+                )
+                back = self.authorized_client.get(
+                    url + '?cursor=' + second_page.previous_cursor)
+                self.assertEqual(
+                    list(back.context['page_obj']), list(first_page))
+
+    def test_cursor_page_without_count(self):
+        """Курсорная страница не выполняет COUNT(*)."""
+        # Первый запрос — дата самой новой записи для ETag
+        with self.assertNumQueries(2):
+            response = self.client.get(
+                reverse('posts:index') + '?cursor=broken')
+        self.assertEqual(len(response.context['page_obj']), settings.PAGES)
+
+    def test_cursor_window_is_index_range(self):
+        """Страница после курсора — диапазон в индексе даты, а не проход
+        индекса от самой новой записи.
+        """
+        paginator = CursorPaginator(Post.objects.all(), settings.PAGES)
+        key = (Post.objects.earliest('pub_date').pub_date, 1)
+        for backwards, bound in ((False, '(pub_date<?)'),
+                                 (True, '(pub_date>?)')):
+            with self.subTest(backwards=backwards):
+                plan = query_plan(paginator.window(key, backwards))
+                self.assertTrue(plan[0].startswith('SEARCH'), plan)
+                self.assertIn(bound, plan[0])
@@ -0,0 +1,71 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+
+from posts import follow_graph
+from posts.models import Follow, FollowSuggestion, Post
+
+User = get_user_model()
+
+
+class SuggestionsTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.reader, cls.friend, cls.active, cls.quiet = [
+            User.objects.create_user(username=name)
+            for name in ('reader', 'friend', 'active', 'quiet')
+        ]
+        Follow.objects.create(user=cls.reader, author=cls.friend)
+        Follow.objects.create(user=cls.friend, author=cls.active)
+        Follow.objects.create(user=cls.friend, author=cls.quiet)
+        Follow.objects.create(user=cls.friend, author=cls.reader)
+        Post.objects.create(author=cls.active, text='Свежий пост')
+
+    def setUp(self):
+        cache.clear()
+        follow_graph.graph.clear()
+        self.output = StringIO()
+        call_command('build_suggestions', stdout=self.output)
+
+    def test_second_degree_ranked_by_activity(self):
+        """Авторы второго круга, активные выше; свои подписки и сам
+        пользователь не предлагаются.
+        """
+        suggested = list(
+            FollowSuggestion.objects.filter(user=self.reader)
+            .values_list('author__username', flat=True)
+        )
+        self.assertEqual(suggested, ['active', 'quiet'])
+        self.assertIn('на миллион подписок', self.output.getvalue())
+
+    def test_follow_page_hides_followed_suggestions(self):
+        self.client.force_login(self.reader)
+        response = self.client.get(reverse('posts:follow_index'))
+        self.assertEqual(
+            response.context['suggestions'], [self.active, self.quiet]
+        )
+        Follow.objects.create(user=self.reader, author=self.active)
+        response = self.client.get(reverse('posts:follow_index'))
+        self.assertEqual(response.context['suggestions'], [self.quiet])
+
+    def test_profile_etag_follows_suggestions(self):
+        """ETag профиля меняется вместе с подсказками зрителя."""
+        self.client.force_login(self.reader)
+        url = reverse('posts:profile', args=[self.friend.username])
+        response = self.client.get(url)
+        self.assertEqual(
+            response.context['suggestions'], [self.active, self.quiet]
+        )
+        etag = response['ETag']
+        call_command('build_suggestions', stdout=StringIO())
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+        Follow.objects.create(user=self.reader, author=self.quiet)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['suggestions'], [self.active])
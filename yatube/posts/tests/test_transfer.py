@@ -0,0 +1,160 @@
+import json
+import os
+import shutil
+import tempfile
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase
+
+from posts import follow_graph
+from posts.models import Comment, Follow, Group, Post, TrendingScore
+from posts.transfer import Importer
+
+User = get_user_model()
+
+
+class TransferCommandsTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание'
+        )
+        cls.posts = [
+            Post.objects.create(
+                author=cls.author,
+                group=cls.group if num % 2 else None,
+                text=f'Пост {num}',
+            )
+            for num in range(5)
+        ]
+        Comment.objects.create(
+            author=cls.reader, post=cls.posts[0], text='Комментарий'
+        )
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def snapshot(self):
+        return (
+            list(Post.objects.order_by('pk').values_list(
+                'pk', 'author__username', 'group__slug', 'text', 'pub_date'
+            )),
+            list(Comment.objects.values_list(
+                'pk', 'post_id', 'author__username', 'text', 'created'
+            )),
+            list(Follow.objects.values_list(
+                'user__username', 'author__username'
+            )),
+            list(Group.objects.values_list('slug', 'title')),
+        )
+
+    def test_export_import_round_trip(self):
+        """Выгрузка и загрузка обратно сохраняют данные и даты."""
+        expected = self.snapshot()
+        outputs = {
+            'jsonl': os.path.join(self.directory, 'dump.jsonl'),
+            'csv': os.path.join(self.directory, 'csv'),
+        }
+        for fmt, path in outputs.items():
+            with self.subTest(format=fmt):
+                call_command(
+                    'export_posts', path, format=fmt, stderr=StringIO()
+                )
+                Group.objects.all().delete()
+                Post.objects.all().delete()
+                Follow.objects.all().delete()
+                out = StringIO()
+                call_command(
+                    'import_posts', path, batch_size=2,
+                    stdout=out, stderr=StringIO(),
+                )
+                self.assertEqual(self.snapshot(), expected)
+                self.assertIn('строк/с', out.getvalue())
+                self.assertEqual(
+                    Post.objects.get(pk=self.posts[0].pk).comments_count, 1
+                )
+                self.assertTrue(
+                    self.reader.timeline.filter(
+                        post=self.posts[-1].pk
+                    ).exists()
+                )
+
+    def test_import_fails_on_taken_ids(self):
+        """Занятые id постов прерывают загрузку: комментарии не
+        привязываются к чужим постам.
+        """
+        path = os.path.join(self.directory, 'dump.jsonl')
+        call_command('export_posts', path, stderr=StringIO())
+        Comment.objects.all().delete()
+        with self.assertRaisesMessage(CommandError, 'уже заняты'):
+            call_command(
+                'import_posts', path, stdout=StringIO(), stderr=StringIO()
+            )
+        self.assertFalse(Comment.objects.exists())
+
+    def test_import_reports_constraint_violation(self):
+        """Нарушение ограничения базы называет файл и строки пачки."""
+        path = os.path.join(self.directory, 'broken.jsonl')
+        with open(path, 'w', encoding='utf-8') as stream:
+            for num, text in enumerate(('Пост', None), 100):
+                stream.write(json.dumps({
+                    'type': 'post', 'id': num, 'author': 'author',
+                    'group': None, 'text': text,
+                    'pub_date': '2020-01-01T00:00:00+00:00', 'image': '',
+                }) + '\n')
+        with self.assertRaisesMessage(CommandError, f'{path}:1 — {path}:2'):
+            call_command(
+                'import_posts', path, stdout=StringIO(), stderr=StringIO()
+            )
+        self.assertFalse(Post.objects.filter(pk=100).exists())
+
+    def test_import_rebuilds_trending(self):
+        """Загруженные посты попадают во вкладку «Популярное»."""
+        path = os.path.join(self.directory, 'dump.jsonl')
+        call_command('export_posts', path, stderr=StringIO())
+        Post.objects.all().delete()
+        call_command(
+            'import_posts', path, stdout=StringIO(), stderr=StringIO()
+        )
+        self.assertEqual(
+            set(TrendingScore.objects.values_list('post_id', flat=True)),
+            {post.pk for post in self.posts},
+        )
+
+    def test_import_keeps_auto_now_add(self):
+        """Даты из файла не отключают auto_now_add для новых записей."""
+        path = os.path.join(self.directory, 'dump.jsonl')
+        call_command('export_posts', path, stderr=StringIO())
+        Post.objects.all().delete()
+        call_command(
+            'import_posts', path, stdout=StringIO(), stderr=StringIO()
+        )
+        post = Post(author=self.author, text='Новый пост')
+        post.save()
+        self.assertGreater(post.pub_date, self.posts[-1].pub_date)
+
+    def test_import_refreshes_follow_graph(self):
+        """Загруженные подписки видны графу подписок в памяти."""
+        Follow.objects.all().delete()
+        self.assertFalse(
+            follow_graph.is_following(self.reader, [self.author])[
+                self.author.pk
+            ]
+        )
+        importer = Importer()
+        importer.add('follow', {'user': 'reader', 'author': 'author'})
+        importer.finish()
+        self.assertTrue(
+            follow_graph.is_following(self.reader, [self.author])[
+                self.author.pk
+            ]
+        )
@@ -0,0 +1,83 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from posts.models import Comment, Group, Post, TrendingScore
+
+User = get_user_model()
+
+
+@override_settings(
+    TRENDING_POST_WEIGHT=1.0,
+    TRENDING_COMMENT_WEIGHT=2.0,
+    TRENDING_HALF_LIFE=3600,
+    TRENDING_MIN_SCORE=0.5,
+)
+class TrendingTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание'
+        )
+        cls.quiet = Post.objects.create(author=cls.author, text='Тихий')
+        cls.busy = Post.objects.create(
+            author=cls.author, group=cls.group, text='Обсуждаемый'
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def score(self, post):
+        return TrendingScore.objects.get(post=post).score
+
+    def test_scores_grow_on_post_and_comment(self):
+        Comment.objects.create(
+            author=self.author, post=self.busy, text='Комментарий'
+        )
+        self.assertEqual(self.score(self.quiet), 1.0)
+        self.assertEqual(self.score(self.busy), 3.0)
+
+    def test_hot_pages_ordered_by_score(self):
+        Comment.objects.create(
+            author=self.author, post=self.busy, text='Комментарий'
+        )
+        response = self.client.get(reverse('posts:hot_index'))
+        self.assertEqual(
+            list(response.context['page_obj']), [self.busy, self.quiet]
+        )
+        response = self.client.get(
+            reverse('posts:group_hot', args=[self.group.slug])
+        )
+        self.assertEqual(list(response.context['page_obj']), [self.busy])
+
+    def test_group_change_moves_score(self):
+        self.quiet.group = self.group
+        self.quiet.save()
+        self.assertEqual(
+            TrendingScore.objects.get(post=self.quiet).group, self.group
+        )
+
+    def test_decay_halves_and_drops_cold_scores(self):
+        """За период полураспада оценки вдвое меньше; ниже порога —
+        удаляются.
+        """
+        call_command('decay_trending', interval=3600, stdout=StringIO())
+        self.assertEqual(self.score(self.busy), 0.5)
+        call_command('decay_trending', interval=3600, stdout=StringIO())
+        self.assertFalse(TrendingScore.objects.exists())
+
+    def test_rebuild_from_history(self):
+        TrendingScore.objects.all().delete()
+        Comment.objects.create(
+            author=self.author, post=self.busy, text='Комментарий'
+        )
+        call_command('decay_trending', rebuild=3600, stdout=StringIO())
+        self.assertAlmostEqual(self.score(self.busy), 3.0, places=3)
+        self.assertEqual(
+            TrendingScore.objects.get(post=self.busy).group, self.group
+        )
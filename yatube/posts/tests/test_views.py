@@ -1,17 +1,28 @@
 import shutil
+from io import StringIO
 import tempfile
+import time
 
 from django.contrib.auth import get_user_model
 from django.test import Client, TestCase, override_settings
 from django.urls import reverse
+from django.utils.http import http_date
 from django.conf import settings
 from django.core.cache import cache
 from django.core.files.uploadedfile import SimpleUploadedFile
+from posts import follow_graph, images
+from posts.management.commands import check_query_plans
 from posts.forms import PostForm
 from django.core.paginator import Page
 from django.conf import settings
 
-from posts.models import Comment, Follow, Group, Post
+from core import cache_stats
+from django.core.management import call_command
+from django.db import IntegrityError, connection, transaction
+from django.test.utils import CaptureQueriesContext
+from sorl.thumbnail import default as thumbnail_default
+from posts.models import (Comment, Follow, Group, ImageVariant, Post,
+                          ProfileStats, TimelineEntry)
 
 User = get_user_model()
 
@@ -66,6 +77,8 @@ class PostsPagesTests(TestCase):
         shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
 
     def setUp(self):
+        # Кэш страниц переживает откат базы между тестами
+        cache.clear()
         # Создаем неавторизованный клиент
         self.guest_client = Client()
         # Создаем автора
@@ -240,6 +253,20 @@ class PostsPagesTests(TestCase):
             Follow.objects.filter(
                 user=self.user, author=user_temp).exists())
 
+    def test_follow_twice_with_stale_graph(self):
+        """Повторная подписка при устаревшем графе не падает."""
+        user_temp = User.objects.create(username='Петр')
+        url = reverse('posts:profile_follow', args=[user_temp.username])
+        # bulk_create не шлёт сигналов: граф в памяти не знает о подписке
+        follow_graph.is_following(self.user, [user_temp])
+        Follow.objects.bulk_create([Follow(user=self.user, author=user_temp)])
+        for _ in range(2):
+            response = self.authorized_client.get(url)
+            self.assertEqual(response.status_code, 302)
+        self.assertEqual(
+            Follow.objects.filter(user=self.user, author=user_temp).count(), 1
+        )
+
     def test_unfollow_destroy_subscribe_on_user(self):
         """Новая запись пользователя не появляется в ленте
            тех, кто на него не подписан.
@@ -268,3 +295,479 @@ class PostsPagesTests(TestCase):
         response = self.authorized_client.get(reverse('posts:follow_index'))
         self.assertNotIn(
             test_post, list(response.context['page_obj'].object_list))
+
+    def test_follow_feed_uses_timeline(self):
+        """Пост подписки раскладывается в ленту при публикации."""
+        user_temp = User.objects.create(username='Петр')
+        Follow.objects.create(user=self.user, author=user_temp)
+        test_post = Post.objects.create(text='fan-out', author=user_temp)
+        self.assertTrue(
+            TimelineEntry.objects.filter(
+                user=self.user, post=test_post).exists())
+        response = self.authorized_client.get(reverse('posts:follow_index'))
+        self.assertEqual(
+            list(response.context['page_obj'].object_list), [test_post])
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=1)
+    def test_follow_feed_reads_celebrity_posts(self):
+        """Посты популярных авторов подмешиваются при чтении ленты."""
+        user_temp = User.objects.create(username='Петр')
+        Follow.objects.create(user=self.user, author=user_temp)
+        test_post = Post.objects.create(text='fan-out', author=user_temp)
+        self.assertFalse(TimelineEntry.objects.exists())
+        response = self.authorized_client.get(reverse('posts:follow_index'))
+        self.assertEqual(
+            list(response.context['page_obj'].object_list), [test_post])
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=2)
+    def test_merged_feed_pages_without_sort(self):
+        """Лента с популярным автором листается страницами и курсором
+        без пропусков, а каждый её запрос — диапазон в индексе.
+        """
+        star = User.objects.create(username='Петр')
+        plain = User.objects.create(username='Мария')
+        other = User.objects.create(username='Олег')
+        Follow.objects.create(user=self.user, author=star)
+        Follow.objects.create(user=other, author=star)
+        Follow.objects.create(user=self.user, author=plain)
+        for num in range(settings.PAGES + 3):
+            Post.objects.create(text=f'Звезда {num}', author=star)
+            Post.objects.create(text=f'Автор {num}', author=plain)
+        expected = list(
+            Post.objects.filter(author__in=[star, plain])
+            .order_by('-pub_date', '-pk')
+        )
+        url = reverse('posts:follow_index')
+        pages = [
+            list(self.authorized_client.get(url, {'page': number})
+                 .context['page_obj'])
+            for number in (1, 2, 3)
+        ]
+        self.assertEqual(sum(pages, []), expected)
+        first = self.authorized_client.get(url, {'cursor': ''})
+        first_page = first.context['page_obj']
+        second = self.authorized_client.get(
+            url, {'cursor': first_page.next_cursor})
+        back = self.authorized_client.get(
+            url, {'cursor': second.context['page_obj'].previous_cursor})
+        self.assertEqual(
+            list(first_page) + list(second.context['page_obj']),
+            expected[:2 * settings.PAGES])
+        self.assertEqual(list(back.context['page_obj']), list(first_page))
+        for name, queryset in check_query_plans.view_queries():
+            if name.startswith('posts:follow_index celebrities'):
+                with self.subTest(name=name):
+                    plan = check_query_plans.query_plan(queryset)
+                    self.assertFalse(
+                        check_query_plans.problems(name, plan))
+
+    @override_settings(TIMELINE_LENGTH=2, TIMELINE_TRIM_SLACK=1)
+    def test_fan_out_trims_timeline(self):
+        """Рассылка постов не даёт ленте расти сверх длины с запасом."""
+        user_temp = User.objects.create(username='Петр')
+        Follow.objects.create(user=self.user, author=user_temp)
+        for num in range(5):
+            Post.objects.create(text=f'Пост {num}', author=user_temp)
+        self.assertLessEqual(
+            TimelineEntry.objects.filter(user=self.user).count(), 3)
+
+    def test_former_celebrity_posts_stay_in_feed(self):
+        """Посты, написанные, пока автор был популярным, попадают в ленту,
+        когда он перестаёт им быть.
+        """
+        user_temp = User.objects.create(username='Петр')
+        other = User.objects.create(username='Мария')
+        Follow.objects.create(user=self.user, author=user_temp)
+        Follow.objects.create(user=other, author=user_temp)
+        with self.settings(TIMELINE_FANOUT_LIMIT=2):
+            test_post = Post.objects.create(text='fan-in', author=user_temp)
+            self.assertFalse(
+                TimelineEntry.objects.filter(post=test_post).exists())
+            Follow.objects.filter(user=other, author=user_temp).delete()
+        self.assertTrue(
+            TimelineEntry.objects.filter(
+                user=self.user, post=test_post).exists())
+
+    def test_profile_counters(self):
+        """Счётчики автора меняются при публикации и подписке."""
+        user_temp = User.objects.create(username='Петр')
+        response = self.guest_client.get(
+            reverse('posts:profile', args=[user_temp.username]))
+        self.assertEqual(response.context['number_of_posts'], 0)
+        Post.objects.create(text='counter', author=user_temp)
+        Follow.objects.create(user=self.user, author=user_temp)
+        response = self.guest_client.get(
+            reverse('posts:profile', args=[user_temp.username]))
+        self.assertEqual(response.context['number_of_posts'], 1)
+        self.assertEqual(
+            response.context['author_stats'].followers_count, 1)
+        Follow.objects.filter(user=self.user, author=user_temp).delete()
+        self.assertEqual(
+            ProfileStats.objects.get(user=user_temp).followers_count, 0)
+
+    def test_recount_stats_repairs_drift(self):
+        """Команда recount_stats исправляет расхождение счётчиков."""
+        ProfileStats.objects.filter(user=self.user).delete()
+        ProfileStats.objects.create(user=self.user, posts_count=100)
+        Post.objects.filter(pk=self.post.pk).update(comments_count=7)
+        call_command('recount_stats', chunk_size=1, stdout=StringIO())
+        self.assertEqual(
+            ProfileStats.objects.get(user=self.user).posts_count,
+            Post.objects.filter(author=self.user).count()
+        )
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comments_count, 1)
+
+    def test_follow_unique_constraint(self):
+        """Повторная подписка запрещена ограничением в базе."""
+        user_temp = User.objects.create(username='Петр')
+        Follow.objects.create(user=self.user, author=user_temp)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Follow.objects.create(user=self.user, author=user_temp)
+
+    def test_feed_query_plans_use_indexes(self):
+        """Запросы лент не читают таблицы целиком и не сортируют."""
+        call_command('check_query_plans', stdout=StringIO())
+
+    def test_query_plan_check_rejects_index_scan_after_cursor(self):
+        """Проход индекса без границы после курсора — ошибка."""
+        scan = ['SCAN posts_post USING INDEX post_date_idx']
+        search = ['SEARCH posts_post USING INDEX post_date_idx (pub_date<?)']
+        self.assertTrue(check_query_plans.problems('posts:index [next]', scan))
+        self.assertFalse(
+            check_query_plans.problems('posts:index [next]', search)
+        )
+        self.assertTrue(
+            check_query_plans.problems('posts:index [previous]', search)
+        )
+        self.assertFalse(
+            check_query_plans.problems('posts:index [page]', scan)
+        )
+
+    def test_search_ranks_matching_posts(self):
+        """Поиск находит посты по словам и ранжирует по BM25."""
+        relevant = Post.objects.create(
+            text='редкое слово редкое слово', author=self.user)
+        other = Post.objects.create(
+            text='редкое слово и ещё много других разных слов',
+            author=self.user)
+        Post.objects.create(text='совсем про другое', author=self.user)
+        for backend in ('fts5', 'inverted'):
+            with self.subTest(backend=backend), override_settings(
+                    SEARCH_BACKEND=backend):
+                call_command('rebuild_search_index', stdout=StringIO())
+                response = self.guest_client.get(
+                    reverse('posts:search'), {'q': 'Редкое слово'})
+                self.assertEqual(
+                    list(response.context['page_obj']), [relevant, other])
+
+    def test_search_index_follows_post_changes(self):
+        """Индекс обновляется при изменении и удалении поста."""
+        post = Post.objects.create(text='исходный текст', author=self.user)
+        post.text = 'изменённый текст'
+        post.save()
+        response = self.guest_client.get(
+            reverse('posts:search'), {'q': 'изменённый'})
+        self.assertEqual(list(response.context['page_obj']), [post])
+        post.delete()
+        response = self.guest_client.get(
+            reverse('posts:search'), {'q': 'изменённый'})
+        self.assertEqual(list(response.context['page_obj']), [])
+
+    @override_settings(SEARCH_ADMIN_LIMIT=1)
+    def test_admin_search_warns_when_truncated(self):
+        """Админка предупреждает, что совпадений больше лимита."""
+        Post.objects.create(text='админский поиск', author=self.user)
+        Post.objects.create(text='ещё админский поиск', author=self.user)
+        admin = User.objects.create_superuser(
+            'admin', 'admin@example.com', 'password')
+        client = Client()
+        client.force_login(admin)
+        response = client.get(
+            reverse('admin:posts_post_changelist'), {'q': 'админский'})
+        self.assertEqual(response.context['cl'].result_count, 1)
+        self.assertIn('уточните запрос', response.content.decode())
+
+    def test_feed_cache_invalidated_by_changes(self):
+        """Кэш ленты обновляется сразу при изменении поста."""
+        cache.clear()
+        url = reverse('posts:index')
+        self.guest_client.get(url)
+        post = Post.objects.create(text='свежий пост', author=self.user)
+        self.assertIn(
+            'свежий пост', self.guest_client.get(url).content.decode())
+        post.text = 'исправленный пост'
+        post.save()
+        content = self.guest_client.get(url).content.decode()
+        self.assertIn('исправленный пост', content)
+        self.assertNotIn('свежий пост', content)
+        post.delete()
+        self.assertNotIn(
+            'исправленный пост', self.guest_client.get(url).content.decode())
+
+    def test_follow_feed_cache_is_per_user(self):
+        """Лента подписок из кэша не показывается другому читателю."""
+        cache.clear()
+        first_author = User.objects.create(username='Первый')
+        second_author = User.objects.create(username='Второй')
+        reader = User.objects.create(username='Читатель')
+        reader_client = Client()
+        reader_client.force_login(reader)
+        Follow.objects.create(user=self.user, author=first_author)
+        Follow.objects.create(user=reader, author=second_author)
+        Post.objects.create(text='пост первого автора', author=first_author)
+        Post.objects.create(text='пост второго автора', author=second_author)
+        url = reverse('posts:follow_index')
+        own = self.authorized_client.get(url).content.decode()
+        other = reader_client.get(url).content.decode()
+        self.assertIn('пост первого автора', own)
+        self.assertNotIn('пост второго автора', own)
+        self.assertIn('пост второго автора', other)
+        self.assertNotIn('пост первого автора', other)
+
+    def test_follow_feed_cache_counts_hits(self):
+        """Фрагмент ленты подписок считает попадания и промахи."""
+        cache_stats.reset()
+        url = reverse('posts:follow_index')
+        self.authorized_client.get(url)
+        self.authorized_client.get(url)
+        self.assertEqual(cache_stats.snapshot()['follow_index'], (1, 1))
+
+    def test_index_thumbnails_loaded_in_one_batch(self):
+        """Миниатюры страницы читаются из хранилища одним запросом."""
+        url = reverse('posts:index')
+        # LRU живёт в процессе дольше, чем данные теста в базе
+        thumbnail_default.kvstore.local.clear()
+        cache.clear()
+        self.guest_client.get(url)
+        cache.clear()
+        thumbnail_default.kvstore.local.clear()
+        with CaptureQueriesContext(connection) as queries:
+            self.guest_client.get(url)
+        kvstore_queries = [
+            query for query in queries.captured_queries
+            if 'thumbnail_kvstore' in query['sql']
+        ]
+        self.assertEqual(len(kvstore_queries), 1)
+
+    @override_settings(IMAGE_VARIANT_WORKERS=0)
+    def test_image_variants_rendered_as_srcset(self):
+        """Готовые варианты картинки выводятся через srcset."""
+        images.process(self.post.pk, self.post.image.name)
+        variants = ImageVariant.objects.filter(post=self.post)
+        self.assertEqual(
+            variants.count(),
+            len(settings.IMAGE_VARIANT_WIDTHS) * len(
+                images.supported_formats()),
+        )
+        largest = variants.last()
+        self.assertEqual((largest.width, largest.height), (678, 339))
+        response = self.guest_client.get(
+            reverse('posts:post_detail', args=[self.post.pk])
+        )
+        self.assertContains(response, f'{largest.file.url} 678w')
+        self.assertContains(response, 'width="678" height="339"')
+
+    @override_settings(COMMENTS_PER_PAGE=2)
+    def test_comments_paginated_newest_first(self):
+        """Комментарии листаются курсором, новые первыми, с авторами."""
+        comments = [self.comment] + [
+            Comment.objects.create(
+                author=self.user, post=self.post, text=f'Комментарий {num}'
+            )
+            for num in range(3)
+        ]
+        response = self.guest_client.get(
+            reverse('posts:post_detail', args=[self.post.pk])
+        )
+        first_page = response.context['comments']
+        self.assertEqual(list(first_page), [comments[3], comments[2]])
+        with self.assertNumQueries(2):
+            response = self.guest_client.get(
+                reverse('posts:post_comments', args=[self.post.pk]),
+                {'cursor': first_page.next_cursor},
+            )
+        self.assertEqual(
+            list(response.context['comments']), [comments[1], comments[0]]
+        )
+        self.assertFalse(response.context['comments'].has_next())
+
+    @override_settings(PAGE_CACHE=False)
+    def test_feed_pages_answer_not_modified(self):
+        """Страница без изменений отдаёт 304 до запросов ленты."""
+        # Сколько запросов стоит проверка версии страницы
+        urls = {
+            reverse('posts:index'): 1,
+            reverse('posts:group_list', args=[self.group.slug]): 2,
+            reverse('posts:profile', args=[self.user.username]): 2,
+            reverse('posts:post_detail', args=[self.post.pk]): 2,
+        }
+        for url, queries in urls.items():
+            with self.subTest(url=url):
+                etag = self.guest_client.get(url)['ETag']
+                with self.assertNumQueries(queries):
+                    response = self.guest_client.get(
+                        url, HTTP_IF_NONE_MATCH=etag
+                    )
+                self.assertEqual(response.status_code, 304)
+                response = self.author_client.get(
+                    url, HTTP_IF_NONE_MATCH=etag
+                )
+                self.assertEqual(response.status_code, 200)
+
+    @override_settings(PAGE_CACHE=False)
+    def test_if_modified_since_does_not_hide_edits(self):
+        """Страницы без Last-Modified: If-Modified-Since не даёт 304
+        после правки поста.
+        """
+        url = reverse('posts:post_detail', args=[self.post.pk])
+        response = self.guest_client.get(url)
+        self.assertFalse(response.has_header('Last-Modified'))
+        post = Post.objects.get(pk=self.post.pk)
+        post.text = 'Исправленный текст'
+        post.save()
+        response = self.guest_client.get(
+            url, HTTP_IF_MODIFIED_SINCE=http_date(time.time() + 60)
+        )
+        self.assertEqual(response.status_code, 200)
+
+    @override_settings(PAGE_CACHE=False)
+    def test_follow_changes_follower_profile(self):
+        """Подписка меняет ETag профиля подписчика: на нём число
+        подписок.
+        """
+        follower = User.objects.create_user(username='Мария')
+        url = reverse('posts:profile', args=[follower.username])
+        etag = self.guest_client.get(url)['ETag']
+        Follow.objects.create(user=follower, author=self.user)
+        response = self.guest_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.context['author_stats'].following_count, 1
+        )
+
+    def test_not_modified_ends_after_changes(self):
+        """Новый комментарий и подписка меняют ETag страниц."""
+        post_url = reverse('posts:post_detail', args=[self.post.pk])
+        etag = self.guest_client.get(post_url)['ETag']
+        Comment.objects.create(
+            author=self.user, post=self.post, text='Новый комментарий'
+        )
+        response = self.guest_client.get(post_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        follower = User.objects.create_user(username='follower')
+        follower_client = Client()
+        follower_client.force_login(follower)
+        profile_url = reverse('posts:profile', args=[self.user.username])
+        etag = follower_client.get(profile_url)['ETag']
+        Follow.objects.create(user=follower, author=self.user)
+        response = follower_client.get(profile_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_post_cards_reused_between_page_renders(self):
+        """Новая версия ленты собирается из закэшированных карточек."""
+        url = reverse('posts:index')
+        self.guest_client.get(url)
+        cache_stats.reset()
+        Post.objects.create(author=self.user, text='Свежий пост')
+        content = self.guest_client.get(url).content.decode()
+        self.assertIn('Свежий пост', content)
+        hits, misses = cache_stats.snapshot()['post_card']
+        self.assertEqual(misses, 1)
+        self.assertEqual(hits, settings.PAGES - 1)
+
+    def test_post_card_changes_with_post(self):
+        """Изменённый пост получает новую карточку."""
+        url = reverse('posts:profile', args=[self.user.username])
+        self.guest_client.get(url)
+        post = Post.objects.filter(author=self.user).first()
+        post.text = 'Исправленный текст'
+        post.save()
+        content = self.guest_client.get(url).content.decode()
+        self.assertIn('Исправленный текст', content)
+
+
+class RenameInvalidationTests(TestCase):
+    """Новые имена авторов и групп видны на всех закэшированных лентах."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(
+            username='author', first_name='Старое', last_name='Имя'
+        )
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Старая группа', slug='old-group', description='Описание'
+        )
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        cls.post = Post.objects.create(
+            author=cls.author, group=cls.group, text='Пост'
+        )
+        Comment.objects.create(
+            author=cls.reader, post=cls.post, text='Комментарий'
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    def pages(self, group_slug='old-group'):
+        """Ответы всех страниц, где виден пост; заодно заполняют кэши."""
+        urls = [
+            reverse('posts:index'),
+            reverse('posts:group_list', args=[group_slug]),
+            reverse('posts:profile', args=[self.author.username]),
+            reverse('posts:post_detail', args=[self.post.pk]),
+        ]
+        responses = {url: self.guest_client.get(url) for url in urls}
+        follow = reverse('posts:follow_index')
+        responses[follow] = self.reader_client.get(follow)
+        return responses
+
+    def test_author_rename_reaches_all_feeds(self):
+        self.pages()
+        self.author.first_name = 'Новое'
+        self.author.save()
+        for url, response in self.pages().items():
+            with self.subTest(url=url):
+                self.assertContains(response, 'Новое Имя')
+
+    def test_commenter_rename_reaches_post_page(self):
+        url = reverse('posts:post_detail', args=[self.post.pk])
+        self.guest_client.get(url)
+        self.reader.username = 'new-reader'
+        self.reader.save()
+        self.assertContains(self.guest_client.get(url), 'new-reader')
+
+    def test_group_change_reaches_all_feeds(self):
+        self.pages()
+        self.group.title = 'Новая группа'
+        self.group.slug = 'new-group'
+        self.group.save()
+        for url, response in self.pages('new-group').items():
+            if url == reverse('posts:post_detail', args=[self.post.pk]):
+                continue
+            with self.subTest(url=url):
+                self.assertContains(response, 'Новая группа')
+                self.assertNotContains(response, 'Старая группа')
+        response = self.guest_client.get(
+            reverse('posts:group_list', args=['old-group'])
+        )
+        self.assertEqual(response.status_code, 404)
+
+    def test_group_delete_removes_links(self):
+        pages = self.pages()
+        link = reverse('posts:group_list', args=['old-group'])
+        self.assertContains(pages[reverse('posts:index')], link)
+        self.group.delete()
+        for url in (
+            reverse('posts:index'),
+            reverse('posts:profile', args=[self.author.username]),
+            reverse('posts:follow_index'),
+        ):
+            with self.subTest(url=url):
+                client = (self.reader_client if 'follow' in url
+                          else self.guest_client)
+                self.assertNotContains(client.get(url), link)
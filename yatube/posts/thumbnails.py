@@ -0,0 +1,163 @@
+"""Пакетное чтение хранилища ключей sorl-thumbnail.
+
+Тег {% thumbnail %} ищет миниатюру в хранилище ключей по одной: запрос в
+кэш (и при промахе в базу) на каждую картинку страницы. Здесь перед
+хранилищем стоит LRU в памяти процесса, а ``prefetch_thumbnails``
+заполняет его для всей страницы одним get_many и одним запросом к базе.
+"""
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+from sorl.thumbnail import default
+from sorl.thumbnail.base import ThumbnailBackend as BaseThumbnailBackend
+from sorl.thumbnail.conf import defaults as sorl_defaults
+from sorl.thumbnail.conf import settings as sorl_settings
+from sorl.thumbnail.images import ImageFile
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.kvstores.cached_db_kvstore import EMPTY_VALUE
+from sorl.thumbnail.kvstores.cached_db_kvstore import KVStore as CachedDBStore
+from sorl.thumbnail.models import KVStore as KVStoreModel
+
+from core import timing
+
+
+class LRUCache:
+    """LRU-словарь с ограничением суммарного размера значений в байтах."""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _sizeof(key, value):
+        value_size = len(value) if isinstance(value, str) else 1
+        return len(key) + value_size
+
+    def get(self, key):
+        with self._lock:
+            value = self._data.get(key)
+            if value is not None:
+                self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        size = self._sizeof(key, value)
+        with self._lock:
+            if key in self._data:
+                self.size -= self._sizeof(key, self._data.pop(key))
+            if size > self.max_bytes:
+                return
+            self._data[key] = value
+            self.size += size
+            while self.size > self.max_bytes:
+                old_key, old_value = self._data.popitem(last=False)
+                self.size -= self._sizeof(old_key, old_value)
+
+    def delete(self, key):
+        with self._lock:
+            if key in self._data:
+                self.size -= self._sizeof(key, self._data.pop(key))
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.size = 0
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._data
+
+
+class KVStore(CachedDBStore):
+    """cached_db хранилище sorl с LRU в памяти процесса перед кэшем."""
+
+    def __init__(self):
+        super().__init__()
+        self.local = LRUCache(settings.THUMBNAIL_LRU_BYTES)
+
+    def _get_raw(self, key):
+        value = self.local.get(key)
+        if value is None:
+            value = self.cache.get(key)
+            if value is None:
+                self.prefetch_raw([key])
+                value = self.local.get(key)
+            else:
+                self.local.set(key, value)
+        if value == EMPTY_VALUE:
+            return None
+        return value
+
+    def _set_raw(self, key, value):
+        super()._set_raw(key, value)
+        self.local.set(key, value)
+
+    def _delete_raw(self, *keys):
+        super()._delete_raw(*keys)
+        for key in keys:
+            self.local.delete(key)
+
+    def clear(self, delete_thumbnails=False):
+        super().clear(delete_thumbnails)
+        self.local.clear()
+
+    def prefetch_raw(self, keys):
+        """Загружает ключи в LRU: один get_many и один запрос к базе."""
+        missing = [key for key in set(keys) if key not in self.local]
+        if not missing:
+            return
+        found = self.cache.get_many(missing)
+        missing = [key for key in missing if key not in found]
+        if missing:
+            from_db = dict(
+                KVStoreModel.objects.filter(key__in=missing)
+                .values_list('key', 'value')
+            )
+            # Отсутствие записи тоже запоминаем, как и сам sorl
+            loaded = {key: from_db.get(key, EMPTY_VALUE) for key in missing}
+            self.cache.set_many(
+                loaded, sorl_settings.THUMBNAIL_CACHE_TIMEOUT
+            )
+            found.update(loaded)
+        for key, value in found.items():
+            self.local.set(key, value)
+
+
+class ThumbnailBackend(BaseThumbnailBackend):
+    """Бэкенд sorl, время которого видно в Server-Timing."""
+
+    def get_thumbnail(self, file_, geometry_string, **options):
+        with timing.measure('thumbnail'):
+            return super().get_thumbnail(file_, geometry_string, **options)
+
+
+def thumbnail_key(file_, geometry_string, **options):
+    """Ключ миниатюры в хранилище, как его вычисляет get_thumbnail."""
+    backend = default.backend
+    source = ImageFile(file_)
+    if sorl_settings.THUMBNAIL_PRESERVE_FORMAT:
+        options.setdefault('format', backend._get_format(source))
+    for key, value in backend.default_options.items():
+        options.setdefault(key, value)
+    for key, attr in backend.extra_options:
+        value = getattr(sorl_settings, attr)
+        if value != getattr(sorl_defaults, attr):
+            options.setdefault(key, value)
+    name = backend._get_thumbnail_filename(source, geometry_string, options)
+    return add_prefix(ImageFile(name, default.storage).key)
+
+
+def prefetch_thumbnails(posts, geometry_string, **options):
+    """Готовит миниатюры картинок постов страницы одним пакетом."""
+    store = default.kvstore
+    if not hasattr(store, 'prefetch_raw'):
+        return
+    keys = [
+        thumbnail_key(post.image, geometry_string, **options)
+        for post in posts if post.image
+    ]
+    if keys:
+        store.prefetch_raw(keys)
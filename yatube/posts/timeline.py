@@ -0,0 +1,290 @@
+"""Материализованная лента подписок (fan-out on write).
+
+При публикации пост раскладывается в ленты подписчиков автора, поэтому
+чтение ленты — один диапазонный проход по индексу (user, pub_date).
+Посты авторов с огромным числом подписчиков не рассылаются, а
+подмешиваются при чтении (fan-out on read).
+"""
+import heapq
+from itertools import islice
+from operator import attrgetter
+
+from django.conf import settings
+from django.db.models import Count, F
+
+from . import generations, stats
+from .models import Follow, Post, TimelineEntry
+
+BATCH_SIZE = 500
+FEED_KEY = ('feed_date', 'feed_post')
+
+
+def is_celebrity(author_id):
+    limit = settings.TIMELINE_FANOUT_LIMIT
+    return stats.followers_count(author_id) >= limit
+
+
+def celebrity_ids(user):
+    """Авторы из подписок пользователя, которые читаются при чтении."""
+    limit = settings.TIMELINE_FANOUT_LIMIT
+    return list(
+        Follow.objects.filter(
+            user=user, author__stats__followers_count__gte=limit
+        ).values_list('author_id', flat=True)
+    )
+
+
+def _entries(post, user_ids):
+    for user_id in user_ids:
+        yield TimelineEntry(
+            user_id=user_id,
+            post_id=post.pk,
+            author_id=post.author_id,
+            pub_date=post.pub_date,
+        )
+
+
+def _insert(batch):
+    TimelineEntry.objects.bulk_create(batch, ignore_conflicts=True)
+    user_ids = {entry.user_id for entry in batch}
+    generations.invalidate_many('timeline', user_ids)
+    trim_overfull(user_ids)
+
+
+def _bulk_insert(entries):
+    batch = []
+    for entry in entries:
+        batch.append(entry)
+        if len(batch) >= BATCH_SIZE:
+            _insert(batch)
+            batch = []
+    if batch:
+        _insert(batch)
+
+
+def fan_out_post(post):
+    """Раскладывает новый пост по лентам подписчиков автора."""
+    if is_celebrity(post.author_id):
+        return
+    user_ids = (
+        Follow.objects.filter(author_id=post.author_id)
+        .values_list('user_id', flat=True)
+        .iterator()
+    )
+    _bulk_insert(_entries(post, user_ids))
+
+
+def recent_posts(author_id):
+    return list(
+        Post.objects.filter(author_id=author_id)
+        .only('pk', 'author_id', 'pub_date')
+        .order_by('-pub_date')[:settings.TIMELINE_BACKFILL]
+    )
+
+
+def backfill(user_id, author_id, posts=None):
+    """Добавляет в ленту последние посты автора после подписки."""
+    if is_celebrity(author_id):
+        return
+    if posts is None:
+        posts = recent_posts(author_id)
+    _bulk_insert(
+        TimelineEntry(
+            user_id=user_id,
+            post_id=post.pk,
+            author_id=author_id,
+            pub_date=post.pub_date,
+        )
+        for post in posts
+    )
+
+
+def follower_lost(author_id):
+    """Отписка от автора; если он перестал быть популярным, его посты
+    раскладываются по лентам подписчиков.
+
+    Пока автор был популярным, его посты не рассылались, а подмешивались
+    при чтении. Без раскладки они пропали бы из лент, как только чтение
+    перестанет их подмешивать.
+    """
+    limit = settings.TIMELINE_FANOUT_LIMIT
+    if stats.followers_count(author_id) != limit - 1:
+        return
+    posts = recent_posts(author_id)
+    followers = Follow.objects.filter(author_id=author_id).values_list(
+        'user_id', flat=True
+    )
+    for user_id in followers.iterator():
+        backfill(user_id, author_id, posts)
+
+
+def remove_author(user_id, author_id):
+    """Убирает из ленты посты автора после отписки."""
+    TimelineEntry.objects.filter(user_id=user_id, author_id=author_id).delete()
+    generations.invalidate_many('timeline', [user_id])
+
+
+def touch_followers(author_id):
+    """Сбрасывает версии лент подписчиков после правки поста автора.
+
+    Для популярных авторов это не нужно: их поколение и так входит
+    в версию ленты каждого подписчика.
+    """
+    if is_celebrity(author_id):
+        return
+    followers = Follow.objects.filter(author_id=author_id).values_list(
+        'user_id', flat=True
+    )
+    generations.invalidate_many('timeline', followers.iterator())
+
+
+def feed_version(user, celebrities):
+    """Версия ленты подписок для ключа кэша фрагмента."""
+    version = [str(generations.get('timeline', user.pk))]
+    authors = generations.get_many('author', sorted(celebrities))
+    version.extend(f'{pk}.{value}' for pk, value in authors.items())
+    return '-'.join(version)
+
+
+def trim_overfull(user_ids):
+    """Обрезает ленты, которые выросли больше TIMELINE_LENGTH на
+    TIMELINE_TRIM_SLACK записей: удаление идёт не на каждый пост, а
+    лента не длиннее TIMELINE_LENGTH + TIMELINE_TRIM_SLACK.
+    """
+    limit = settings.TIMELINE_LENGTH + settings.TIMELINE_TRIM_SLACK
+    overfull = (
+        TimelineEntry.objects.filter(user_id__in=user_ids).order_by()
+        .values('user_id').annotate(total=Count('pk'))
+        .filter(total__gt=limit).values_list('user_id', flat=True)
+    )
+    for user_id in list(overfull):
+        trim(user_id)
+
+
+def trim(user_id):
+    """Обрезает ленту пользователя до settings.TIMELINE_LENGTH записей."""
+    oldest_kept = (
+        TimelineEntry.objects.filter(user_id=user_id)
+        .order_by('-pub_date')
+        .values_list('pub_date', flat=True)[
+            settings.TIMELINE_LENGTH - 1:settings.TIMELINE_LENGTH]
+    )
+    oldest_kept = list(oldest_kept)
+    if oldest_kept:
+        TimelineEntry.objects.filter(
+            user_id=user_id, pub_date__lt=oldest_kept[0]
+        ).delete()
+
+
+class MergedFeed:
+    """Слияние уже отсортированных выборок ленты.
+
+    Ведёт себя как queryset для пагинаторов: order_by, filter и reverse
+    применяются к каждой выборке, срез [:n] ограничивает каждую n
+    строками, а строки сливаются в Python. Так каждая выборка читает
+    диапазон своего индекса не дальше страницы и сортировать весь
+    результат не нужно. Выборки не должны пересекаться.
+    """
+
+    def __init__(self, sources, ordering=(), window=slice(None)):
+        self.sources = sources
+        self.ordering = ordering
+        self.window = window
+        self._result = None
+
+    @property
+    def ordered(self):
+        return bool(self.ordering)
+
+    def _each(self, method, *args, **kwargs):
+        return [
+            getattr(source, method)(*args, **kwargs)
+            for source in self.sources
+        ]
+
+    def order_by(self, *fields):
+        return MergedFeed(self._each('order_by', *fields), fields)
+
+    def filter(self, *args, **kwargs):
+        return MergedFeed(self._each('filter', *args, **kwargs), self.ordering)
+
+    def reverse(self):
+        ordering = tuple(
+            field[1:] if field.startswith('-') else f'-{field}'
+            for field in self.ordering
+        )
+        return MergedFeed(self._each('reverse'), ordering)
+
+    def count(self):
+        return sum(source.count() for source in self.sources)
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return list(self[index:index + 1])[0]
+        start, stop = index.start or 0, index.stop
+        sources = self.sources
+        if stop is not None:
+            sources = [source[:stop] for source in sources]
+        return MergedFeed(sources, self.ordering, slice(start, stop))
+
+    def _fetch(self):
+        if self._result is None:
+            fields = [field.lstrip('-') for field in self.ordering]
+            rows = heapq.merge(
+                *self.sources,
+                key=attrgetter(*fields),
+                reverse=self.ordering[0].startswith('-'),
+            )
+            self._result = list(
+                islice(rows, self.window.start, self.window.stop)
+            )
+        return self._result
+
+    def __iter__(self):
+        return iter(self._fetch())
+
+    def __len__(self):
+        return len(self._fetch())
+
+
+def timeline_feed(user):
+    """Посты из материализованной ленты пользователя."""
+    posts = Post.objects.select_related('author', 'group')
+    # Сортировка только по колонкам ленты: тогда весь запрос — обратный
+    # проход по индексу (user, pub_date, post) без временной сортировки
+    return (
+        posts.filter(timeline_entries__user=user)
+        .annotate(
+            feed_date=F('timeline_entries__pub_date'),
+            feed_post=F('timeline_entries__post_id'),
+        )
+        .order_by('-feed_date', '-feed_post')
+    )
+
+
+def merged_feed(user, celebrities):
+    """Лента из материализованных записей и постов популярных авторов.
+
+    Посты каждого популярного автора — отдельная выборка по индексу
+    (author, pub_date); записи этих авторов, попавшие в ленту до того,
+    как они стали популярными, из ленты исключаются, чтобы не
+    повторяться.
+    """
+    posts = Post.objects.select_related('author', 'group')
+    sources = [timeline_feed(user).exclude(author_id__in=celebrities)]
+    sources.extend(
+        posts.filter(author_id=author_id)
+        .annotate(feed_date=F('pub_date'), feed_post=F('pk'))
+        for author_id in celebrities
+    )
+    return MergedFeed(sources).order_by('-feed_date', '-feed_post')
+
+
+def follow_feed(user, celebrities):
+    """Возвращает ленту подписок и ключ сортировки для пагинации.
+
+    celebrities — результат celebrity_ids(user).
+    """
+    if celebrities:
+        return merged_feed(user, celebrities), FEED_KEY
+    return timeline_feed(user), FEED_KEY
@@ -0,0 +1,273 @@
+"""Потоковая выгрузка и загрузка групп, постов, комментариев и подписок.
+
+Строки читаются итератором пачками и сразу пишутся в файл, поэтому
+память не зависит от размера таблиц. Формат — JSON Lines (одна запись
+на строку, тип в поле ``type``) или CSV (по файлу на тип в каталоге).
+Пользователи и группы связываются по username и slug, посты и
+комментарии сохраняют свои id: если id из файла уже занят в базе,
+загрузка прерывается, а не привязывает комментарии к чужому посту.
+"""
+import csv
+import json
+import os
+import time
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.utils.dateparse import parse_datetime
+
+from . import generations, timeline
+from .models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+CHUNK_SIZE = 2000
+# Порядок важен: записи ссылаются только на типы, выгруженные раньше
+TYPES = {
+    'group': (Group, ('slug', 'title', 'description')),
+    'post': (
+        Post, ('id', 'author', 'group', 'text', 'pub_date', 'image')
+    ),
+    'comment': (Comment, ('id', 'post', 'author', 'text', 'created')),
+    'follow': (Follow, ('user', 'author')),
+}
+# Поля выгрузки, которые в базе хранятся иначе
+EXPORT_LOOKUPS = {
+    'post': {'author': 'author__username', 'group': 'group__slug'},
+    'comment': {'post': 'post_id', 'author': 'author__username'},
+    'follow': {'user': 'user__username', 'author': 'author__username'},
+}
+DATE_FIELDS = {'pub_date', 'created'}
+# Поля с auto_now_add: bulk_create заменяет их текущим временем
+AUTO_DATES = {'post': 'pub_date', 'comment': 'created'}
+# Уже существующие подписки пропускаются, остальные конфликты — ошибка
+IGNORE_CONFLICTS = {'follow'}
+
+
+def export_rows(kind):
+    """Записи одного типа словарями, пачками по CHUNK_SIZE строк."""
+    model, fields = TYPES[kind]
+    lookups = EXPORT_LOOKUPS.get(kind, {})
+    columns = [lookups.get(field, field) for field in fields]
+    rows = model.objects.order_by('pk').values_list(*columns)
+    for values in rows.iterator(chunk_size=CHUNK_SIZE):
+        row = dict(zip(fields, values))
+        for field in DATE_FIELDS & row.keys():
+            row[field] = row[field].isoformat()
+        yield row
+
+
+class JsonLinesWriter:
+    def __init__(self, stream):
+        self.stream = stream
+
+    def write(self, kind, row):
+        record = {'type': kind, **row}
+        self.stream.write(json.dumps(record, ensure_ascii=False) + '\n')
+
+
+def read_json_lines(stream, name='-'):
+    """Записи (тип, поля, место в файле) из JSON Lines."""
+    for number, line in enumerate(stream, 1):
+        if line.strip():
+            record = json.loads(line)
+            yield record.pop('type'), record, f'{name}:{number}'
+
+
+def csv_path(directory, kind):
+    return os.path.join(directory, f'{kind}s.csv')
+
+
+def read_csv_dir(directory):
+    """Записи (тип, поля, место в файле) из CSV-файлов каталога."""
+    for kind in TYPES:
+        path = csv_path(directory, kind)
+        if not os.path.exists(path):
+            continue
+        with open(path, newline='', encoding='utf-8') as stream:
+            reader = csv.DictReader(stream)
+            for row in reader:
+                # В CSV нет NULL: пустая ячейка означает «нет значения»
+                yield kind, {
+                    key: value if value != '' else None
+                    for key, value in row.items()
+                }, f'{path}:{reader.line_num}'
+
+
+def check_free_ids(model, objects):
+    """ValueError, если id из файла уже заняты в базе."""
+    taken = list(
+        model.objects.filter(pk__in=[obj.pk for obj in objects])
+        .order_by('pk').values_list('pk', flat=True)[:10]
+    )
+    if taken:
+        raise ValueError(
+            f'{model._meta.model_name}: id '
+            f'{", ".join(map(str, taken))} уже заняты в базе'
+        )
+
+
+def bulk_create_dated(model, objects, field, **kwargs):
+    """bulk_create, сохраняющий даты объектов в поле с auto_now_add.
+
+    При вставке auto_now_add подставляет текущее время и в сами объекты,
+    поэтому даты возвращаются следом одним bulk_update: id у объектов
+    должны быть заданы заранее.
+    """
+    dates = [getattr(obj, field) for obj in objects]
+    model.objects.bulk_create(objects, **kwargs)
+    for obj, date in zip(objects, dates):
+        setattr(obj, field, date)
+    model.objects.bulk_update(objects, [field])
+
+
+def reset_sequences(*models):
+    """Счётчики автоинкремента продолжаются после id, заданных явно."""
+    sequences = connection.ops.sequence_reset_sql(no_style(), models)
+    with connection.cursor() as cursor:
+        for sql in sequences:
+            cursor.execute(sql)
+
+
+class Importer:
+    """Загружает записи пачками через bulk_create.
+
+    Пользователи и группы ищутся в словарях username → id и slug → id,
+    которые дополняются по ходу загрузки; недостающих пользователей
+    importer создаёт без пароля. Сигналы при bulk_create не срабатывают:
+    ленты подписок дополняются после каждой пачки подписок, а счётчики и
+    поисковый индекс команда пересчитывает в конце.
+    """
+
+    def __init__(self, batch_size=CHUNK_SIZE, fill_timelines=True):
+        self.batch_size = batch_size
+        self.fill_timelines = fill_timelines
+        self.users = {}
+        self.groups = dict(Group.objects.values_list('slug', 'pk'))
+        self.followers = set()
+        self.counts = dict.fromkeys(TYPES, 0)
+        self.elapsed = dict.fromkeys(TYPES, 0.0)
+        self._kind = None
+        self._batch = []
+        # Места в файле первой и последней записи текущей пачки
+        self.batch_places = (None, None)
+
+    def add(self, kind, row, place=None):
+        if kind not in TYPES:
+            raise ValueError(f'Неизвестный тип записи: {kind}')
+        if kind != self._kind or len(self._batch) >= self.batch_size:
+            self.flush()
+            self._kind = kind
+            self.batch_places = (place, place)
+        self._batch.append(row)
+        self.batch_places = (self.batch_places[0], place)
+
+    def flush(self):
+        if not self._batch:
+            return
+        kind, batch = self._kind, self._batch
+        self._batch = []
+        started = time.perf_counter()
+        model, fields = TYPES[kind]
+        with transaction.atomic():
+            objects = getattr(self, f'_build_{kind}s')(batch)
+            if 'id' in fields:
+                check_free_ids(model, objects)
+            if kind in AUTO_DATES:
+                bulk_create_dated(model, objects, AUTO_DATES[kind])
+            else:
+                model.objects.bulk_create(
+                    objects, ignore_conflicts=kind in IGNORE_CONFLICTS
+                )
+        after = getattr(self, f'_after_{kind}s', None)
+        if after:
+            after(objects)
+        self.elapsed[kind] += time.perf_counter() - started
+        self.counts[kind] += len(batch)
+
+    def finish(self):
+        self.flush()
+        # id постов и комментариев пришли из файла
+        reset_sequences(Post, Comment)
+        # Ключи фрагментов всех затронутых страниц
+        generations.invalidate(('feed',))
+        generations.invalidate_many('group', self.groups.values())
+        generations.invalidate_many('author', self.users.values())
+        # Графы подписок в памяти процессов сверяются с этими поколениями
+        generations.invalidate_many('following', self.followers)
+
+    def _user_ids(self, usernames):
+        missing = set(usernames) - self.users.keys() - {None}
+        if missing:
+            self.users.update(
+                User.objects.filter(username__in=missing)
+                .values_list('username', 'pk')
+            )
+            missing -= self.users.keys()
+        if missing:
+            password = make_password(None)
+            User.objects.bulk_create(
+                User(username=username, password=password)
+                for username in missing
+            )
+            self.users.update(
+                User.objects.filter(username__in=missing)
+                .values_list('username', 'pk')
+            )
+        return self.users
+
+    def _build_groups(self, batch):
+        return [
+            Group(**row) for row in batch if row['slug'] not in self.groups
+        ]
+
+    def _after_groups(self, groups):
+        self.groups.update(
+            Group.objects.filter(slug__in=[group.slug for group in groups])
+            .values_list('slug', 'pk')
+        )
+
+    def _build_posts(self, batch):
+        users = self._user_ids(row['author'] for row in batch)
+        return [
+            Post(
+                id=row['id'],
+                author_id=users[row['author']],
+                group_id=self.groups.get(row['group']),
+                text=row['text'],
+                pub_date=parse_datetime(row['pub_date']),
+                image=row['image'] or '',
+            )
+            for row in batch
+        ]
+
+    def _build_comments(self, batch):
+        users = self._user_ids(row['author'] for row in batch)
+        return [
+            Comment(
+                id=row['id'],
+                post_id=row['post'],
+                author_id=users[row['author']],
+                text=row['text'],
+                created=parse_datetime(row['created']),
+            )
+            for row in batch
+        ]
+
+    def _build_follows(self, batch):
+        users = self._user_ids(
+            name for row in batch for name in (row['user'], row['author'])
+        )
+        return [
+            Follow(user_id=users[row['user']], author_id=users[row['author']])
+            for row in batch
+        ]
+
+    def _after_follows(self, follows):
+        self.followers.update(follow.user_id for follow in follows)
+        if not self.fill_timelines:
+            return
+        for follow in follows:
+            timeline.backfill(follow.user_id, follow.author_id)
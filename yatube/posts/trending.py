@@ -0,0 +1,136 @@
+"""Рейтинг «горячих» постов, который поддерживается при записи.
+
+Публикация поста и каждый комментарий прибавляют к оценке поста вес
+из настроек — в той же транзакции, что и сама запись. Команда
+decay_trending по расписанию умножает все оценки на 0.5 в степени
+(интервал / TRENDING_HALF_LIFE): старые комментарии весят всё меньше,
+а оценки ниже TRENDING_MIN_SCORE удаляются. Чтение вкладки — проход по
+индексу оценки сверху вниз, без обращения к комментариям.
+"""
+import math
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from core.transactions import write_transaction
+
+from .models import Comment, Post, TrendingScore
+
+BATCH_SIZE = 1000
+
+
+def bump(post_id, group_id, weight):
+    """Прибавляет вес к оценке поста, создавая её при необходимости."""
+    scores = TrendingScore.objects.filter(post_id=post_id)
+    if scores.update(score=F('score') + weight):
+        return
+    try:
+        with transaction.atomic():
+            TrendingScore.objects.create(
+                post_id=post_id, group_id=group_id, score=weight
+            )
+    except IntegrityError:
+        # Оценку успел создать параллельный запрос
+        scores.update(score=F('score') + weight)
+
+
+def move(post_id, group_id):
+    """Пост перенесён в другую группу."""
+    TrendingScore.objects.filter(post_id=post_id).update(group_id=group_id)
+
+
+def decay_factor(seconds):
+    """Множитель затухания за seconds секунд."""
+    return 0.5 ** (seconds / settings.TRENDING_HALF_LIFE)
+
+
+def horizon():
+    """Возраст записи в секундах, после которого её вес ниже
+    TRENDING_MIN_SCORE: более старые записи rebuild может не читать.
+    """
+    weight = max(
+        settings.TRENDING_POST_WEIGHT, settings.TRENDING_COMMENT_WEIGHT
+    )
+    return settings.TRENDING_HALF_LIFE * math.log2(
+        weight / settings.TRENDING_MIN_SCORE
+    )
+
+
+def decay(factor):
+    """Умножает оценки на factor пачками по id поста.
+
+    Каждая пачка — отдельная короткая транзакция: запись комментариев
+    не ждёт, пока пройдёт вся таблица.
+    """
+    last_pk = 0
+    while True:
+        # order_by('pk') у OneToOne-ключа сортировал бы по полям Post
+        batch = list(
+            TrendingScore.objects.filter(post_id__gt=last_pk)
+            .order_by('post_id').values_list('post_id', flat=True)
+            [:BATCH_SIZE]
+        )
+        if not batch:
+            break
+        with write_transaction():
+            TrendingScore.objects.filter(post_id__in=batch).update(
+                score=F('score') * factor
+            )
+        last_pk = batch[-1]
+    with write_transaction():
+        deleted, _ = TrendingScore.objects.filter(
+            score__lt=settings.TRENDING_MIN_SCORE
+        ).delete()
+    return deleted
+
+
+def rebuild(seconds):
+    """Считает оценки заново по постам и комментариям за seconds секунд.
+
+    Нужна один раз после миграции и после массовой загрузки постов,
+    которая идёт в обход сигналов.
+    """
+    now = timezone.now()
+    since = now - timedelta(seconds=seconds)
+
+    def weight(value, created):
+        return value * decay_factor((now - created).total_seconds())
+
+    scores = {}
+    groups = {}
+    posts = Post.objects.filter(pub_date__gte=since).values_list(
+        'pk', 'group_id', 'pub_date'
+    )
+    for post_id, group_id, pub_date in posts.iterator():
+        groups[post_id] = group_id
+        scores[post_id] = weight(settings.TRENDING_POST_WEIGHT, pub_date)
+    comments = Comment.objects.filter(created__gte=since).values_list(
+        'post_id', 'post__group_id', 'created'
+    )
+    for post_id, group_id, created in comments.iterator():
+        groups[post_id] = group_id
+        scores[post_id] = scores.get(post_id, 0) + weight(
+            settings.TRENDING_COMMENT_WEIGHT, created
+        )
+    rows = [
+        TrendingScore(post_id=post_id, group_id=groups[post_id], score=score)
+        for post_id, score in scores.items()
+        if score >= settings.TRENDING_MIN_SCORE
+    ]
+    with write_transaction():
+        TrendingScore.objects.all().delete()
+        TrendingScore.objects.bulk_create(rows, batch_size=BATCH_SIZE)
+    return len(rows)
+
+
+def hot(group=None):
+    """Лучшие посты по оценке: срез индекса (group,) score по убыванию."""
+    scores = TrendingScore.objects.order_by('-score', '-post_id')
+    if group is not None:
+        scores = scores.filter(group=group)
+    return scores.select_related(
+        'post__author', 'post__group'
+    )[:settings.TRENDING_LIMIT]
@@ -1,8 +1,153 @@
+import base64
+import binascii
+import json
+from collections.abc import Sequence
+
 from django.conf import settings
 from django.core.paginator import Paginator
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+CURSOR_PARAM = 'cursor'
+DEFAULT_KEY = ('pub_date', 'pk')
+
+
+def encode_cursor(values, backwards=False):
+    """Упаковывает ключ строки в непрозрачный токен для URL."""
+    data = {'k': [str(value) for value in values], 'b': int(backwards)}
+    raw = json.dumps(data, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """Распаковывает токен курсора. Для битого токена возвращает None."""
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        data = json.loads(raw.decode())
+        values, backwards = data['k'], bool(data['b'])
+    except (ValueError, TypeError, KeyError, binascii.Error):
+        return None
+    if not isinstance(values, list):
+        return None
+    return values, backwards
+
+
+class CursorPage(Sequence):
+    """Страница ленты без COUNT(*) и OFFSET.
+
+    Ключ сортировки — пара (дата, id), поэтому следующая страница
+    выбирается условием по индексу, а не смещением от начала таблицы.
+    """
+
+    cursor_mode = True
+
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __repr__(self):
+        # repr попадает в ключ фрагментного кэша ленты, поэтому
+        # должен различать страницы
+        return '<CursorPage {} {}>'.format(
+            self.previous_cursor, self.next_cursor
+        )
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class CursorPaginator:
+    """Keyset-пагинация по паре полей (дата, id) в порядке убывания."""
+
+    def __init__(self, object_list, per_page, key=DEFAULT_KEY):
+        self.object_list = object_list
+        self.per_page = per_page
+        self.date_field, self.id_field = key
+
+    def _parse_key(self, values):
+        if len(values) != 2:
+            return None
+        date = parse_datetime(values[0])
+        if date is None or not values[1].isdigit():
+            return None
+        return date, int(values[1])
+
+    def _key(self, obj):
+        return getattr(obj, self.date_field), getattr(obj, self.id_field)
+
+    def window(self, key=None, backwards=False):
+        """Queryset одной страницы (плюс одна строка) после ключа key."""
+        field, id_field = self.date_field, self.id_field
+        queryset = self.object_list.order_by(f'-{field}', f'-{id_field}')
+        if key:
+            date, pk = key
+            # Условие по одной дате даёт SQLite границу диапазона в
+            # индексе: без него OR читается от начала индекса до ключа
+            if backwards:
+                condition = Q(**{f'{field}__gte': date}) & (
+                    Q(**{f'{field}__gt': date})
+                    | Q(**{field: date, f'{id_field}__gt': pk})
+                )
+                queryset = queryset.reverse()
+            else:
+                condition = Q(**{f'{field}__lte': date}) & (
+                    Q(**{f'{field}__lt': date})
+                    | Q(**{field: date, f'{id_field}__lt': pk})
+                )
+            queryset = queryset.filter(condition)
+        return queryset[:self.per_page + 1]
+
+    def get_page(self, token=None):
+        decoded = decode_cursor(token) if token else None
+        key = self._parse_key(decoded[0]) if decoded else None
+        backwards = bool(key) and decoded[1]
+        rows = list(self.window(key, backwards))
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if backwards:
+            rows.reverse()
+        has_next = bool(rows) and (has_more or backwards)
+        has_previous = bool(rows) and (has_more if backwards else bool(key))
+        next_cursor = previous_cursor = None
+        if has_next:
+            next_cursor = encode_cursor(self._key(rows[-1]))
+        if has_previous:
+            previous_cursor = encode_cursor(self._key(rows[0]), True)
+        return CursorPage(rows, next_cursor, previous_cursor)
+
+
+def newest(queryset, field):
+    """Значение поля у самой новой строки: один проход по индексу."""
+    return (
+        queryset.order_by(f'-{field}')
+        .values_list(field, flat=True).first()
+    )
+
 
+def page(request, posts, key=DEFAULT_KEY):
+    """Возвращает страницу ленты.
 
-def page(request, posts):
+    По умолчанию используется обычный Paginator с номерами страниц.
+    Если в запросе передан параметр ``cursor`` (или включён
+    ``settings.CURSOR_PAGINATION``), лента листается курсором.
+    """
+    cursor = request.GET.get(CURSOR_PARAM)
+    if cursor is not None or settings.CURSOR_PAGINATION:
+        paginator = CursorPaginator(posts, settings.PAGES, key)
+        return paginator.get_page(cursor)
     paginator = Paginator(posts, settings.PAGES)
     page_number = request.GET.get('page')
     return paginator.get_page(page_number)
@@ -1,13 +1,94 @@
+from urllib.parse import urlencode
+
+from django.conf import settings
 from django.contrib.auth.decorators import login_required
+from django.core.paginator import Paginator
+from django.http import Http404
 from django.shortcuts import get_object_or_404, redirect, render
 
+from core.http import conditional_view
+from core.transactions import write_transaction
+
+from . import follow_graph, generations, trending
 from .forms import CommentForm, PostForm
-from .models import Follow, Group, Post, User
-from .utils import page
+from .models import Comment, Follow, Group, Post, User
+from .search import load_posts, search_ids
+from .stats import stats_for
+from .suggestions import suggestions_for
+from .timeline import celebrity_ids, feed_version, follow_feed
+from .utils import CURSOR_PARAM, CursorPaginator, newest, page
+
+COMMENTS_KEY = ('created', 'pk')
+
+
+def index_posts():
+    """Посты общей ленты; те же querysets читает JSON API."""
+    return Post.objects.select_related('author', 'group')
+
+
+def group_feed(group):
+    return group.posts.select_related('author')
+
+
+def profile_feed(author):
+    return author.posts.select_related('group')
+
+
+def index_version(request):
+    return generations.get('feed'), newest(Post.objects.all(), 'pub_date')
+
+
+def group_version(request, slug):
+    group_id = Group.objects.filter(slug=slug).values_list(
+        'pk', flat=True
+    ).first()
+    if group_id is None:
+        raise Http404
+    return generations.get('group', group_id), newest(
+        Post.objects.filter(group_id=group_id), 'pub_date'
+    )
 
 
+def profile_version(request, username):
+    author_id = User.objects.filter(username=username).values_list(
+        'pk', flat=True
+    ).first()
+    if author_id is None:
+        raise Http404
+    # Поколение автора сдвигается и при подписке на него, поэтому
+    # кнопка «Подписаться» в закэшированной странице не устаревает
+    version = [generations.get('author', author_id)]
+    if request.user.is_authenticated:
+        # Подсказки зависят от подписок зрителя и от их пересчёта
+        version += [
+            generations.get('following', request.user.pk),
+            generations.get('suggestions'),
+        ]
+    return version, newest(
+        Post.objects.filter(author_id=author_id), 'pub_date'
+    )
+
+
+def post_version(request, post_id):
+    post = Post.objects.filter(pk=post_id).values_list(
+        'pub_date', 'author_id', 'group_id'
+    ).first()
+    if post is None:
+        raise Http404
+    pub_date, author_id, group_id = post
+    version = [
+        generations.get('post', post_id),
+        generations.get('author', author_id),
+    ]
+    if group_id:
+        version.append(generations.get('group', group_id))
+    commented = newest(Comment.objects.filter(post_id=post_id), 'created')
+    return version, max(filter(None, [pub_date, commented]))
+
+
+@conditional_view(index_version)
 def index(request):
-    post_list = Post.objects.select_related('author', 'group')
+    post_list = index_posts()
     page_obj = page(request, post_list)
     context = {
         'page_obj': page_obj,
@@ -15,10 +96,11 @@ def index(request):
     return render(request, 'posts/index.html', context)
 
 
+@conditional_view(group_version)
 def group_posts(request, slug):
     """Возращает 10 постов указанной темы."""
     group = get_object_or_404(Group, slug=slug)
-    posts = group.posts.select_related('author')
+    posts = group_feed(group)
     page_obj = page(request, posts)
     context = {
         'group': group,
@@ -28,30 +110,65 @@ def group_posts(request, slug):
     return render(request, 'posts/group_list.html', context)
 
 
+def hot_page(request, group=None):
+    """Страница вкладки «Популярное» из среза индекса оценок."""
+    paginator = Paginator(trending.hot(group), settings.PAGES)
+    page_obj = paginator.get_page(request.GET.get('page'))
+    page_obj.object_list = [score.post for score in page_obj.object_list]
+    return page_obj
+
+
+def hot_index(request):
+    context = {
+        'page_obj': hot_page(request),
+        'hot': True,
+    }
+    return render(request, 'posts/hot.html', context)
+
+
+def group_hot(request, slug):
+    group = get_object_or_404(Group, slug=slug)
+    context = {
+        'group': group,
+        'page_obj': hot_page(request, group),
+        'hot': True,
+    }
+    return render(request, 'posts/hot.html', context)
+
+
+@conditional_view(profile_version)
 def profile(request, username):
     author = get_object_or_404(User, username=username)
-    post_list = author.posts.all()
+    post_list = profile_feed(author)
     page_obj = page(request, post_list)
-    number_of_posts = post_list.count()
+    author_stats = stats_for(author)
     context = {
         'page_obj': page_obj,
         'author': author,
         'post_list': post_list,
-        'number_of_posts': number_of_posts
+        'number_of_posts': author_stats.posts_count,
+        'author_stats': author_stats,
     }
     if request.user.is_authenticated:
-        following = author.following.filter(user=request.user)
-        context['following'] = following
+        following = follow_graph.is_following(request.user, [author.pk])
+        context['following'] = following[author.pk]
+        context['suggestions'] = [
+            suggested for suggested in suggestions_for(request.user)
+            if suggested != author
+        ]
     return render(request, 'posts/profile.html', context)
 
 
+@conditional_view(post_version)
 def post_detail(request, post_id):
     """Показывает пост."""
-    post = get_object_or_404(Post, pk=post_id)
+    post = get_object_or_404(
+        Post.objects.select_related('author', 'group'), pk=post_id
+    )
     form = CommentForm(request.POST or None)
-    comments = post.comments.all()
+    comments = comments_page(request, post.pk)
 
-    posts_count = post.author.posts.count()
+    posts_count = stats_for(post.author).posts_count
     context = {
         'post': post,
         'form': form,
@@ -61,6 +178,70 @@ def post_detail(request, post_id):
     return render(request, 'posts/post_detail.html', context)
 
 
+def post_comment_list(post_id):
+    """Комментарии поста вместе с авторами."""
+    return Comment.objects.filter(post_id=post_id).select_related('author')
+
+
+def comments_page(request, post_id):
+    """Страница комментариев поста, новые первыми, вместе с авторами."""
+    paginator = CursorPaginator(
+        post_comment_list(post_id),
+        settings.COMMENTS_PER_PAGE,
+        COMMENTS_KEY,
+    )
+    return paginator.get_page(request.GET.get(CURSOR_PARAM))
+
+
+def post_comments(request, post_id):
+    """HTML-фрагмент со следующей страницей комментариев."""
+    post = Post.objects.filter(pk=post_id).only('pk').first()
+    if post is None:
+        raise Http404
+    context = {
+        'post': post,
+        'comments': comments_page(request, post_id),
+    }
+    return render(request, 'posts/includes/comment_list.html', context)
+
+
+def search(request):
+    """Ищет посты по тексту, самые релевантные — первыми."""
+    query = request.GET.get('q', '').strip()
+    paginator = Paginator(search_ids(query), settings.PAGES)
+    page_obj = paginator.get_page(request.GET.get('page'))
+    page_obj.object_list = load_posts(page_obj.object_list)
+    context = {
+        'page_obj': page_obj,
+        'query': query,
+        'extra_query': urlencode({'q': query}),
+    }
+    return render(request, 'posts/search.html', context)
+
+
+# Поля, которые меняет правка поста. Счётчики меняются атомарными
+# UPDATE в сигналах, и полное сохранение вернуло бы им значение,
+# прочитанное при открытии формы
+EDITED_FIELDS = (*PostForm._meta.fields, 'updated_at')
+
+
+def save_post(post, update_fields=None):
+    """Сохраняет пост: новый файл картинки пишется до транзакции,
+    чтобы блокировка записи держалась только на время запросов.
+    """
+    image = post.image
+    new_file = bool(image) and not image._committed
+    if new_file:
+        image.save(image.name, image.file, save=False)
+    try:
+        with write_transaction():
+            post.save(update_fields=update_fields)
+    except Exception:
+        if new_file:
+            image.delete(save=False)
+        raise
+
+
 @login_required
 def post_create(request):
     """Создаёт новый пост."""
@@ -73,7 +254,7 @@ def post_create(request):
 
     temp_form = form.save(commit=False)
     temp_form.author = request.user
-    temp_form.save()
+    save_post(temp_form)
     return redirect(
         'posts:profile', temp_form.author
     )
@@ -92,7 +273,7 @@ def post_edit(request, post_id):
         instance=post
     )
     if form.is_valid():
-        form.save()
+        save_post(form.save(commit=False), EDITED_FIELDS)
         return redirect('posts:post_detail', post_id=post_id)
     context = {
         'post': post,
@@ -111,16 +292,20 @@ def add_comment(request, post_id):
         comment = form.save(commit=False)
         comment.author = request.user
         comment.post = post
-        comment.save()
+        with write_transaction():
+            comment.save()
     return redirect('posts:post_detail', post_id=post_id)
 
 
 @login_required
 def follow_index(request):
-    post_list = Post.objects.filter(author__following__user=request.user)
-    page_obj = page(request, post_list)
+    celebrities = celebrity_ids(request.user)
+    post_list, key = follow_feed(request.user, celebrities)
+    page_obj = page(request, post_list, key)
     context = {
         'page_obj': page_obj,
+        'feed_version': feed_version(request.user, celebrities),
+        'suggestions': suggestions_for(request.user),
     }
     return render(request, 'posts/follow.html', context)
 
@@ -129,15 +314,11 @@ def follow_index(request):
 def profile_follow(request, username):
     user = request.user
     author = get_object_or_404(User, username=username)
-    follower_count = Follow.objects.filter(
-        user=user,
-        author=author
-    ).exists()
-    if user != author and follower_count == 0:
-        Follow.objects.create(
-            user=user,
-            author=author
-        )
+    if user != author:
+        # Решает база, а не граф в памяти: он может отставать, а
+        # повторная отправка формы не должна заканчиваться ошибкой
+        with write_transaction():
+            Follow.objects.get_or_create(user=user, author=author)
     return redirect('posts:profile', username=author)
 
 
@@ -145,8 +326,9 @@ def profile_follow(request, username):
 def profile_unfollow(request, username):
     author = get_object_or_404(User, username=username)
     if request.user != author:
-        Follow.objects.filter(
-            user=request.user,
-            author=author
-        ).delete()
+        with write_transaction():
+            Follow.objects.filter(
+                user=request.user,
+                author=author
+            ).delete()
     return redirect('posts:profile', username=username)
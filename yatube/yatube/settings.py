@@ -1,4 +1,8 @@
+import atexit
 import os
+import shutil
+import sys
+import tempfile
 
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -34,15 +38,22 @@ INSTALLED_APPS = [
     'users.apps.UsersConfig',
     'core.apps.CoreConfig',
     'about.apps.AboutConfig',
+    'api.apps.ApiConfig',
     'sorl.thumbnail',
 ]
 
 MIDDLEWARE = [
+    # Первым, чтобы замер охватывал все остальные; см. REQUEST_TIMING
+    'core.middleware.RequestTimingMiddleware',
+    'core.middleware.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    # До сессий: попадание в кэш страниц обходится без них
+    'core.middleware.AnonymousPageCacheMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'core.middleware.ReplicaMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -52,7 +63,8 @@ STATICFILES_DIRS = [os.path.join(BASE_DIR, 'static')]
 TEMPLATES_DIR = os.path.join(BASE_DIR, 'templates')
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # Тот же DjangoTemplates, но сообщает время рендера в core.timing
+        'BACKEND': 'core.template_backend.DjangoTemplates',
         # Добавлено: Искать шаблоны на уровне проекта
         'DIRS': [TEMPLATES_DIR],
         'APP_DIRS': True,
@@ -74,12 +86,57 @@ WSGI_APPLICATION = 'yatube.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/2.2/ref/settings/#databases
 
+# SQLite под нагрузкой: WAL (читатели не ждут писателя), ожидание
+# блокировки вместо немедленной ошибки, NORMAL — fsync только при
+# контрольной точке WAL, mmap и кэш страниц (отрицательное — в КиБ)
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'busy_timeout': 5000,
+    'synchronous': 'NORMAL',
+    'mmap_size': 256 * 1024 * 1024,
+    'cache_size': -64 * 1024,
+    'temp_store': 'MEMORY',
+}
+# Потоки процесса пишут через core.transactions.write_transaction
+# по очереди, а не соревнуются за блокировку SQLite
+SQLITE_SERIALIZE_WRITES = True
+
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
+        # Тот же бэкенд sqlite3 с PRAGMA и режимом BEGIN из OPTIONS
+        'ENGINE': 'core.sqlite_backend',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
-    }
+        'OPTIONS': {
+            'pragmas': SQLITE_PRAGMAS,
+            'transaction_mode': 'IMMEDIATE',
+        },
+    },
+    # Локальная копия основной базы вместо реплики, обновляется командой
+    # sync_replica. В тестах указывает на тестовую основную базу
+    'replica': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.path.join(BASE_DIR, 'db-replica.sqlite3'),
+        'TEST': {'MIRROR': 'default'},
+    },
 }
+DATABASE_ROUTERS = ['core.db_routers.ReplicaRouter']
+# Псевдонимы реплик для чтения; пустой список — всё из основной базы
+DATABASE_REPLICAS = []
+# Страницы, которые читают с реплик, и приложения, чьи модели там читаются
+# (сессии остаются в основной базе: вход виден сразу)
+REPLICA_VIEWS = (
+    'posts:index', 'posts:group_list', 'posts:profile',
+    'posts:post_detail', 'posts:follow_index', 'posts:hot_index',
+    'posts:group_hot',
+)
+REPLICA_APPS = ('posts', 'auth')
+# После записи пользователь столько секунд читает из основной базы
+REPLICA_STICKY_SECONDS = 10
+REPLICA_STICKY_COOKIE = 'read_primary'
+# Наибольшее отставание реплик в секундах (для sync_replica — больше
+# интервала --every). Столько времени после изменения содержимого ленты
+# читаются из основной базы, чтобы кэши не заполнялись старыми данными
+REPLICA_MAX_LAG = 10
 
 
 # Password validation
@@ -113,7 +170,45 @@ USE_L10N = True
 
 USE_TZ = True
 
+# Замер запросов: заголовок Server-Timing (SQL, шаблоны, миниатюры)
+# и журнал yatube.slow_requests для запросов дольше SLOW_REQUEST_MS
+REQUEST_TIMING = False
+SLOW_REQUEST_MS = 500
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'message': {'format': '%(asctime)s %(message)s'},
+    },
+    'handlers': {
+        'slow_requests': {
+            'class': 'logging.StreamHandler',
+            'formatter': 'message',
+        },
+    },
+    'loggers': {
+        'yatube.slow_requests': {
+            'handlers': ['slow_requests'],
+            'level': 'WARNING',
+            'propagate': False,
+        },
+    },
+}
+
+# /metrics: адреса этих приложений получают свою метку, остальные —
+# общую 'other'. При нескольких процессах счётчики складываются через
+# файлы в METRICS_DIR, которые каждый поток обновляет раз в
+# METRICS_FLUSH_INTERVAL секунд; None — только этот процесс
+METRICS_NAMESPACES = ('posts', 'users', 'about', 'api')
+METRICS_DIR = None
+METRICS_FLUSH_INTERVAL = 5
+
 PAGES = 10
+# Комментариев на странице поста; остальные подгружаются по кнопке
+COMMENTS_PER_PAGE = 20
+# Листать ленты курсором (без COUNT и OFFSET) по умолчанию
+CURSOR_PAGINATION = False
 
 # Static files (CSS, JavaScript, Images)
 # https://docs.djangoproject.com/en/2.2/howto/static-files/
@@ -128,9 +223,117 @@ CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+# Файлы хранятся по хэшу содержимого в каталогах ab/cd/, одинаковые
+# загрузки — один раз; старые файлы переносит migrate_media_storage
+DEFAULT_FILE_STORAGE = 'posts.storage.ContentAddressedStorage'
 
+# Общий для всех воркеров кэш в файле SQLite: поколения, страницы и
+# карточки видны каждому процессу сервера. Объём ограничен MAX_BYTES,
+# лишнее вытесняется по давности чтения. После migrate кэш очищается
+CACHE_DIR = os.environ.get(
+    'YATUBE_CACHE_DIR', os.path.join(BASE_DIR, 'cache')
+)
+# Тесты создают свою базу и очищают кэш: у них свой временный каталог,
+# иначе они стирали бы кэш работающего сервера
+TESTING = 'test' in sys.argv[1:2] or 'pytest' in sys.modules
+if TESTING:
+    CACHE_DIR = tempfile.mkdtemp(prefix='yatube-cache-')
+    atexit.register(shutil.rmtree, CACHE_DIR, True)
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-    }
+        'BACKEND': 'core.sqlite_cache.SQLiteCache',
+        'LOCATION': os.path.join(CACHE_DIR, 'default.sqlite3'),
+        'OPTIONS': {
+            'MAX_BYTES': 256 * 1024 * 1024,
+        },
+    },
+    # Фрагменты ленты подписок хранятся отдельно для каждого читателя:
+    # ограничиваем объём, давно не читанные вытесняются первыми
+    'follow_fragments': {
+        'BACKEND': 'core.sqlite_cache.SQLiteCache',
+        'LOCATION': os.path.join(CACHE_DIR, 'follow-fragments.sqlite3'),
+        'OPTIONS': {
+            'MAX_BYTES': 64 * 1024 * 1024,
+        },
+    },
 }
+
+# Лента подписок: авторы, у которых подписчиков не меньше этого числа,
+# не рассылаются по лентам при записи, а подмешиваются при чтении
+TIMELINE_FANOUT_LIMIT = 5000
+# Сколько последних постов автора добавляется в ленту при подписке
+TIMELINE_BACKFILL = 200
+# Максимальная длина материализованной ленты одного пользователя
+TIMELINE_LENGTH = 1000
+# На сколько записей лента может перерасти TIMELINE_LENGTH, прежде чем
+# её обрежут: удаление выполняется пачкой, а не на каждый пост
+TIMELINE_TRIM_SLACK = 50
+# Граф подписок в памяти процесса: сколько пользователей держать в LRU
+FOLLOW_GRAPH_MAX_USERS = 100000
+# Подсказки подписок (команда build_suggestions): сколько лучших
+# авторов хранить на пользователя, сколько показывать и за сколько
+# дней считать активность автора
+SUGGESTIONS_TOP = 20
+SUGGESTIONS_SHOWN = 5
+SUGGESTIONS_ACTIVITY_DAYS = 30
+# Вкладка «Популярное»: вес публикации и комментария в оценке поста,
+# период полураспада оценки (decay_trending), порог, ниже которого
+# оценка удаляется, и сколько лучших постов показывать
+TRENDING_POST_WEIGHT = 1.0
+TRENDING_COMMENT_WEIGHT = 1.0
+TRENDING_HALF_LIFE = 60 * 60 * 6
+TRENDING_MIN_SCORE = 0.01
+TRENDING_LIMIT = 100
+TRENDING_DECAY_INTERVAL = 60 * 10
+
+# Поиск по постам: 'auto' — FTS5, если есть, иначе встроенный индекс;
+# можно явно указать 'fts5' или 'inverted'
+SEARCH_BACKEND = 'auto'
+# Сколько самых релевантных постов показывать в выдаче
+SEARCH_LIMIT = 1000
+# То же для поиска в админке; если совпадений больше, админка
+# предупреждает, что список обрезан
+SEARCH_ADMIN_LIMIT = 10000
+
+# Время жизни фрагментов лент в кэше: ключ содержит поколение ленты,
+# поэтому фрагменты обновляются сразу при изменении, а не по таймауту
+FEED_CACHE_TIMEOUT = 60 * 60 * 24
+# Кэш целых страниц для анонимных читателей (без cookie сессии и
+# сообщений). Страница свежая PAGE_CACHE_TIMEOUT секунд или до записи,
+# которая её меняет; после этого ещё PAGE_CACHE_STALE_TIMEOUT секунд
+# отдаётся старая копия, пока один запрос рисует новую
+PAGE_CACHE = True
+PAGE_CACHE_ALIAS = 'default'
+PAGE_CACHE_VIEWS = (
+    'posts:index', 'posts:group_list', 'posts:profile', 'posts:post_detail',
+)
+# Параметры запроса, от которых зависит страница; остальные не важны
+PAGE_CACHE_PARAMS = ('page', 'cursor')
+PAGE_CACHE_BYPASS_COOKIES = ('sessionid', 'messages', REPLICA_STICKY_COOKIE)
+PAGE_CACHE_TIMEOUT = 60 * 5
+PAGE_CACHE_STALE_TIMEOUT = 60
+PAGE_CACHE_LOCK_TIMEOUT = 30
+
+# Отрендеренные карточки постов: ключ меняется вместе с постом, поэтому
+# их можно держать долго и собирать из них страницы при смене поколения
+POST_CARD_CACHE = 'default'
+POST_CARD_TIMEOUT = FEED_CACHE_TIMEOUT
+
+# sorl-thumbnail: хранилище ключей с LRU в памяти процесса и пакетной
+# подгрузкой миниатюр для всей страницы
+THUMBNAIL_KVSTORE = 'posts.thumbnails.KVStore'
+# Бэкенд sorl, который сообщает время нарезки миниатюр в core.timing
+THUMBNAIL_BACKEND = 'posts.thumbnails.ThumbnailBackend'
+# Имена миниатюр sorl вычисляет сам, им адресация по хэшу не подходит
+THUMBNAIL_STORAGE = 'django.core.files.storage.FileSystemStorage'
+THUMBNAIL_LRU_BYTES = 4 * 1024 * 1024
+
+# Варианты картинок постов для srcset: нарезаются в пуле процессов после
+# загрузки. Ширины вписываются в ту же рамку, что и миниатюра 960x339.
+# IMAGE_VARIANT_WORKERS = 0 — нарезать сразу, в том же процессе
+IMAGE_VARIANT_WIDTHS = (320, 640, 960)
+IMAGE_VARIANT_BOX = (960, 339)
+IMAGE_VARIANT_FORMATS = ('WEBP', 'JPEG')
+IMAGE_VARIANT_QUALITY = 85
+IMAGE_VARIANT_SIZES = '(max-width: 960px) 100vw, 960px'
+IMAGE_VARIANT_WORKERS = 2